@@ -0,0 +1,302 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.extras import DictCursor
+
+from connection_pool import PoolTimeoutError
+
+
+async def wait_ready(conn: extensions.connection) -> None:
+    """
+    Дожидается завершения операции на асинхронном соединении psycopg2,
+    не блокируя цикл событий: сокет соединения регистрируется в asyncio.
+    Ошибка запроса пробрасывается из conn.poll().
+    """
+    loop = asyncio.get_running_loop()
+    while True:
+        state = conn.poll()
+        if state == extensions.POLL_OK:
+            return
+
+        fd = conn.fileno()
+        ready = loop.create_future()
+
+        def wake():
+            if not ready.done():
+                ready.set_result(None)
+
+        if state == extensions.POLL_READ:
+            loop.add_reader(fd, wake)
+            remove = loop.remove_reader
+        elif state == extensions.POLL_WRITE:
+            loop.add_writer(fd, wake)
+            remove = loop.remove_writer
+        else:
+            raise psycopg2.OperationalError(f"Неожиданное состояние poll(): {state}")
+
+        try:
+            await ready
+        finally:
+            remove(fd)
+
+
+class AsyncConnectionPool:
+    """
+    Пул асинхронных соединений psycopg2 для asyncio. Повторяет параметры и
+    статистику ConnectionPool, но ожидание свободного соединения не занимает поток:
+    тысячи задач могут стоять в очереди к пулу из нескольких десятков соединений.
+
+    Асинхронные соединения psycopg2 всегда работают в режиме autocommit.
+    """
+
+    def __init__(
+        self,
+        config: dict,
+        name: str = "db",
+        min_size: int = 1,
+        max_size: int = 20,
+        idle_timeout: float = 300.0,
+        acquire_timeout: float = 30.0,
+        validate_after: float = 30.0,
+        connect_timeout: float | None = None
+    ):
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Некорректные размеры пула: min={min_size}, max={max_size}")
+
+        self.config = config
+        self.name = name
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self.validate_after = validate_after
+        self.connect_timeout = connect_timeout
+
+        self._idle: list[tuple[extensions.connection, float]] = []
+        # Ожидающие задачи: им передаётся (соединение, время возврата)
+        # или None — право открыть новое соединение
+        self._waiters: deque[asyncio.Future] = deque()
+        self._size = 0
+        self._closed = False
+
+        self._stats = {
+            "connections_created": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "wait_timeouts": 0,
+            "validation_failures": 0,
+            "cancelled_queries": 0,
+            "total_wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+        }
+
+    async def warmup(self) -> int:
+        """Открывает соединения до min_size. Возвращает число открытых соединений"""
+        missing = max(self.min_size - self._size, 0)
+        self._size += missing
+        results = await asyncio.gather(
+            *(self._connect() for _ in range(missing)), return_exceptions=True
+        )
+        opened = 0
+        for result in results:
+            if isinstance(result, BaseException):
+                self._size -= 1
+            else:
+                self._idle.insert(0, (result, time.monotonic()))
+                opened += 1
+        return opened
+
+    async def acquire(self, timeout: float | None = None) -> extensions.connection:
+        """
+        Берёт соединение из пула, при необходимости открывая новое.
+
+        :raises PoolTimeoutError: если свободное соединение не появилось за timeout
+        """
+        timeout = self.acquire_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        while True:
+            slot = await self._acquire_slot(deadline)
+            if slot is None:
+                try:
+                    conn = await self._connect()
+                except BaseException:
+                    self._give_slot_back()
+                    raise
+            else:
+                conn, last_used = slot
+                if not await self._is_usable(conn, last_used):
+                    self._stats["validation_failures"] += 1
+                    self.release(conn, discard=True)
+                    continue
+
+            waited_ms = (time.monotonic() - start) * 1000
+            self._stats["checkouts"] += 1
+            self._stats["total_wait_ms"] += waited_ms
+            self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], waited_ms)
+            return conn
+
+    def release(self, conn: extensions.connection, discard: bool = False) -> None:
+        """
+        Возвращает соединение в пул. Соединение с незавершённой транзакцией
+        или выполняющимся запросом закрывается.
+        """
+        if not discard and not conn.closed:
+            discard = (
+                conn.isexecuting()
+                or conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE
+            )
+
+        if discard or conn.closed or self._closed:
+            self._close(conn)
+            self._give_slot_back()
+            return
+
+        item = (conn, time.monotonic())
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(item)
+                return
+        self._idle.append(item)
+
+    @asynccontextmanager
+    async def connection(self, timeout: float | None = None):
+        """
+        Выдаёт соединение и гарантированно возвращает его в пул. Если задачу отменили
+        посреди запроса, запрос отменяется на сервере, а соединение закрывается.
+        """
+        conn = await self.acquire(timeout)
+        try:
+            yield conn
+        except BaseException:
+            if not conn.closed and conn.isexecuting():
+                self._stats["cancelled_queries"] += 1
+                try:
+                    conn.cancel()
+                except psycopg2.Error:
+                    pass
+                self.release(conn, discard=True)
+            else:
+                self.release(conn)
+            raise
+        else:
+            self.release(conn)
+
+    def close(self) -> None:
+        """Закрывает свободные соединения и будит ожидающих (они получат ошибку)"""
+        self._closed = True
+        idle, self._idle = self._idle, []
+        for conn, _ in idle:
+            self._close(conn)
+            self._size -= 1
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_exception(psycopg2.InterfaceError(f"Пул {self.name} закрыт"))
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "size": self._size,
+            "idle": len(self._idle),
+            "in_use": self._size - len(self._idle),
+            "waiting": sum(1 for waiter in self._waiters if not waiter.done()),
+            "min_size": self.min_size,
+            "max_size": self.max_size,
+            **self._stats,
+            "total_wait_ms": round(self._stats["total_wait_ms"], 2),
+            "max_wait_ms": round(self._stats["max_wait_ms"], 2),
+        }
+
+    async def _acquire_slot(self, deadline: float) -> tuple[extensions.connection, float] | None:
+        """Возвращает свободное соединение либо None — право открыть новое"""
+        if self._closed:
+            raise psycopg2.InterfaceError(f"Пул {self.name} закрыт")
+
+        self._reap_idle()
+        if self._idle:
+            return self._idle.pop()
+        if self._size < self.max_size:
+            self._size += 1
+            return None
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            return await asyncio.wait_for(waiter, max(deadline - time.monotonic(), 0))
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled() and waiter.exception() is None:
+                # Соединение уже передали нам, но задачу отменили — отдаём его следующему
+                slot = waiter.result()
+                if slot is None:
+                    self._give_slot_back()
+                else:
+                    self.release(slot[0])
+            if isinstance(e, asyncio.TimeoutError):
+                self._stats["wait_timeouts"] += 1
+                raise PoolTimeoutError(
+                    f"Нет свободных соединений в пуле {self.name} (max_size={self.max_size})"
+                ) from None
+            raise
+
+    def _give_slot_back(self) -> None:
+        """Освобождает место в пуле: передаёт его ожидающей задаче или уменьшает размер"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._size -= 1
+
+    def _reap_idle(self) -> None:
+        now = time.monotonic()
+        while (
+            self._idle
+            and self._size > self.min_size
+            and now - self._idle[0][1] > self.idle_timeout
+        ):
+            conn, _ = self._idle.pop(0)
+            self._size -= 1
+            self._close(conn)
+
+    async def _is_usable(self, conn: extensions.connection, last_used: float) -> bool:
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.validate_after:
+            return True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT 1")
+            await wait_ready(conn)
+            return True
+        except psycopg2.Error:
+            return False
+
+    async def _connect(self) -> extensions.connection:
+        conn = psycopg2.connect(**self.config, async_=True, cursor_factory=DictCursor)
+        try:
+            # Асинхронное подключение libpq не учитывает connect_timeout
+            await asyncio.wait_for(wait_ready(conn), self.connect_timeout)
+        except asyncio.TimeoutError:
+            conn.close()
+            raise psycopg2.OperationalError(
+                f"Нет ответа от узла {self.name} за {self.connect_timeout} с"
+            ) from None
+        except BaseException:
+            conn.close()
+            raise
+        self._stats["connections_created"] += 1
+        return conn
+
+    def _close(self, conn: extensions.connection) -> None:
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        self._stats["connections_closed"] += 1
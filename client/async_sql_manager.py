@@ -0,0 +1,222 @@
+import itertools
+import time
+from typing import AsyncIterator
+
+import psycopg2
+from psycopg2 import extensions
+
+from async_connection_pool import AsyncConnectionPool, wait_ready
+from config import (
+    MASTER_CONFIG,
+    REPLICA_CONFIGS,
+    POOL_CONFIG,
+    READ_BALANCING_POLICY,
+    BREAKER_CONFIG,
+)
+from load_balancer import BalancingPolicy, LoadBalancer, Node, is_node_failure
+from sql_parser import classify
+
+
+class AsyncPostgreSQLManager:
+    """
+    Асинхронный аналог PostgreSQLManager для asyncio с той же маршрутизацией:
+    читающие запросы идут на реплики (с балансировкой и выводом отказавших из ротации),
+    а если доступных реплик нет — на мастер; остальные запросы — на мастер.
+
+    Отмена задачи (task.cancel(), asyncio.wait_for) отменяет запрос на сервере.
+    Соединения работают в autocommit: каждый запрос — отдельная транзакция.
+    """
+
+    _cursor_names = itertools.count()
+
+    def __init__(
+        self,
+        pool_config: dict | None = None,
+        replica_configs: list[dict] | None = None,
+        balancing_policy: str | BalancingPolicy | None = None
+    ):
+        """
+        :param pool_config: параметры пулов соединений (по умолчанию POOL_CONFIG)
+        :param replica_configs: список реплик для чтения (по умолчанию REPLICA_CONFIGS)
+        :param balancing_policy: политика балансировки чтения или её имя
+        """
+        pool_config = POOL_CONFIG if pool_config is None else pool_config
+        replica_configs = REPLICA_CONFIGS if replica_configs is None else replica_configs
+
+        # Пулы привязаны к циклу событий, поэтому у каждого менеджера свои
+        self.master_node = Node(
+            "master", MASTER_CONFIG, pool_config,
+            pool_factory=AsyncConnectionPool, breaker_config=BREAKER_CONFIG
+        )
+
+        self.replica_nodes = []
+        for i, replica_config in enumerate(replica_configs, start=1):
+            config = dict(replica_config)
+            weight = config.pop("weight", 1)
+            name = config.pop("name", "replica" if len(replica_configs) == 1 else f"replica-{i}")
+            self.replica_nodes.append(
+                Node(
+                    name, config, pool_config, weight=weight,
+                    pool_factory=AsyncConnectionPool, breaker_config=BREAKER_CONFIG
+                )
+            )
+
+        self.balancer = LoadBalancer(
+            self.replica_nodes,
+            policy=balancing_policy or READ_BALANCING_POLICY
+        )
+
+    async def __aenter__(self) -> "AsyncPostgreSQLManager":
+        return self
+
+    async def __aexit__(self, *exc_info) -> None:
+        self.close()
+
+    async def execute_query(
+        self,
+        query: str,
+        use_replica: bool = False,
+        params: tuple | dict | None = None,
+        fetch: bool = False
+    ) -> list[dict] | int | None:
+        """
+        Выполняет SQL запрос. Читающие запросы (см. sql_parser.classify) автоматически идут на реплику.
+
+        :param query: SQL запрос
+        :param use_replica: принудительно использовать реплику
+        :param params: параметры для запроса
+        :param fetch: возвращать результат (только для SELECT)
+        :return: результаты запроса или количество изменённых строк
+        """
+        query = query.strip()
+        if not use_replica and classify(query).read_only:
+            use_replica = True
+
+        try:
+            if use_replica:
+                return await self._execute_on_replica(query, params, fetch)
+            with self.balancer.track(self.master_node):
+                return await self._execute(self.master_node, query, params, fetch)
+        except psycopg2.Error as e:
+            print(f"Error executing query: {e}")
+            raise
+
+    async def execute(
+        self,
+        query: str,
+        params: tuple | dict | None = None,
+        use_replica: bool = False
+    ) -> int:
+        """Выполняет запрос на изменение и возвращает количество изменённых строк"""
+        return await self.execute_query(query, use_replica=use_replica, params=params)
+
+    async def fetch(
+        self,
+        query: str,
+        params: tuple | dict | None = None,
+        use_replica: bool = False
+    ) -> list[dict]:
+        """Выполняет запрос и возвращает все строки"""
+        return await self.execute_query(query, use_replica=use_replica, params=params, fetch=True)
+
+    async def stream(
+        self,
+        query: str,
+        params: tuple | dict | None = None,
+        use_replica: bool | None = None,
+        fetch_size: int = 1000
+    ) -> AsyncIterator[dict]:
+        """
+        Отдаёт строки результата по мере чтения через серверный курсор (DECLARE/FETCH),
+        не загружая весь результат в память.
+
+        :param use_replica: по умолчанию читающие запросы выполняются на реплике
+        :param fetch_size: сколько строк забирать с сервера за один FETCH
+        """
+        query = query.strip()
+        if use_replica is None:
+            use_replica = classify(query).read_only
+        node = (self.balancer.choose() or self.master_node) if use_replica else self.master_node
+        name = f"async_stream_{next(self._cursor_names)}"
+
+        with self.balancer.track(node):
+            async with node.pool.connection() as conn:
+                cursor = conn.cursor()
+                await self._run(cursor, "BEGIN")
+                await self._run(cursor, f"DECLARE {name} NO SCROLL CURSOR FOR {query}", params)
+                while True:
+                    await self._run(cursor, f"FETCH FORWARD {int(fetch_size)} FROM {name}")
+                    rows = cursor.fetchall()
+                    if not rows:
+                        break
+                    for row in rows:
+                        yield dict(row)
+                await self._run(cursor, "COMMIT")
+
+    async def check_connection(self, use_replica: bool = False) -> tuple[bool, float | None]:
+        """Проверяет доступность базы данных и возвращает (success, ping_time)"""
+        node = self.balancer.choose() if use_replica else self.master_node
+        if node is None:
+            return False, None
+        try:
+            with self.balancer.track(node):
+                start = time.time()
+                async with node.pool.connection() as conn:
+                    await self._run(conn.cursor(), "SELECT 1")
+            return True, round((time.time() - start) * 1000, 2)
+        except Exception:
+            return False, None
+
+    async def warmup(self) -> None:
+        """Открывает min_size соединений на каждом узле"""
+        for node in [self.master_node, *self.replica_nodes]:
+            await node.pool.warmup()
+
+    def pool_stats(self) -> dict[str, dict]:
+        """Возвращает статистику пулов соединений по узлам"""
+        return {node.name: node.pool.stats() for node in [self.master_node, *self.replica_nodes]}
+
+    def node_stats(self) -> list[dict]:
+        """Возвращает метрики балансировки по узлам: нагрузку, задержку, отказы"""
+        return [node.stats() for node in [self.master_node, *self.replica_nodes]]
+
+    def close(self) -> None:
+        for node in [self.master_node, *self.replica_nodes]:
+            node.pool.close()
+
+    async def _execute_on_replica(
+        self,
+        query: str,
+        params: tuple | dict | None,
+        fetch: bool
+    ) -> list[dict] | int | None:
+        tried = []
+        while True:
+            node = self.balancer.choose(exclude=tried) or self.master_node
+            try:
+                with self.balancer.track(node):
+                    return await self._execute(node, query, params, fetch)
+            except Exception as e:
+                # Узел не отвечает — повторяем на другой реплике или на мастере
+                if not is_node_failure(e) or node is self.master_node:
+                    raise
+                tried.append(node)
+
+    async def _execute(
+        self,
+        node: Node,
+        query: str,
+        params: tuple | dict | None,
+        fetch: bool
+    ) -> list[dict] | int | None:
+        async with node.pool.connection() as conn:
+            cursor = conn.cursor()
+            await self._run(cursor, query, params)
+            if fetch or classify(query).returns_rows:
+                return [dict(row) for row in cursor.fetchall()]
+            return cursor.rowcount
+
+    @staticmethod
+    async def _run(cursor: extensions.cursor, query: str, params: tuple | dict | None = None) -> None:
+        cursor.execute(query, params)
+        await wait_ready(cursor.connection)
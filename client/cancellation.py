@@ -0,0 +1,231 @@
+import heapq
+import itertools
+import threading
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Callable
+
+import psycopg2
+from psycopg2 import errors, extensions
+
+from connection_pool import PoolTimeoutError
+
+
+# Минимальный интервал пробуждения потока таймеров (секунды)
+TIMER_TICK = 0.001
+# С какого числа отменённых таймеров очередь планировщика пересобирается
+COMPACT_THRESHOLD = 1024
+
+
+class QueryTimeoutError(extensions.QueryCanceledError):
+    """Запрос не уложился в срок вызова и был отменён"""
+
+
+def is_timeout(error: BaseException | None) -> bool:
+    """Ошибка — истечение срока запроса или ожидания блокировки (lock_timeout)"""
+    return isinstance(error, (QueryTimeoutError, errors.LockNotAvailable))
+
+
+class Deadline:
+    """
+    Крайний срок вызова. Один срок можно передать нескольким запросам подряд
+    (например, всем запросам загрузки окна) — каждый получит только оставшееся время.
+    """
+
+    __slots__ = ("timeout", "expires_at")
+
+    def __init__(self, timeout: float):
+        """
+        :param timeout: сколько секунд отводится начиная с текущего момента
+        """
+        if timeout <= 0:
+            raise ValueError(f"Срок должен быть положительным: {timeout}")
+        self.timeout = timeout
+        self.expires_at = time.monotonic() + timeout
+
+    @classmethod
+    def coerce(cls, value: "float | Deadline | None") -> "Deadline | None":
+        """Срок из числа секунд; Deadline возвращается как есть, None — без срока"""
+        if value is None or isinstance(value, Deadline):
+            return value
+        return cls(value)
+
+    def remaining(self) -> float:
+        return self.expires_at - time.monotonic()
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def check(self, what: str = "Запрос") -> float:
+        """
+        :return: оставшееся время в секундах
+        :raises QueryTimeoutError: если срок уже истёк
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise QueryTimeoutError(f"{what} не уложился в {self.timeout:g} с")
+        return remaining
+
+    def __repr__(self) -> str:
+        return f"Deadline({self.timeout:g}, remaining={self.remaining():.3f})"
+
+
+def timeout_error(error: BaseException, deadline: Deadline | None) -> BaseException:
+    """
+    Отмена запроса или ожидание соединения, прерванные истёкшим сроком (statement_timeout,
+    отмена по таймеру), превращаются в QueryTimeoutError; остальные ошибки возвращаются как есть.
+    """
+    if (
+        deadline is not None and deadline.expired
+        and isinstance(error, (extensions.QueryCanceledError, PoolTimeoutError))
+        and not isinstance(error, QueryTimeoutError)
+    ):
+        return QueryTimeoutError(f"Запрос не уложился в {deadline.timeout:g} с: {error}".strip())
+    return error
+
+
+class CancelScope:
+    """
+    Отмена запроса из другого потока. Запрос привязывает к области соединение,
+    на котором выполняется (attach), и cancel() отправляет серверу отмену именно
+    этого запроса. После выхода из attach соединение отвязывается до возврата в пул,
+    поэтому отмена не может попасть в чужой запрос на том же соединении.
+    """
+
+    def __init__(self):
+        self._conn: extensions.connection | None = None
+        self._cancelled = False
+        self._lock = threading.Lock()
+
+    @property
+    def cancelled(self) -> bool:
+        return self._cancelled
+
+    @contextmanager
+    def attach(self, conn: extensions.connection):
+        """
+        :raises QueryCanceledError: если область отменили до начала запроса
+        """
+        with self._lock:
+            if self._cancelled:
+                raise extensions.QueryCanceledError("Запрос отменён до отправки на сервер")
+            self._conn = conn
+        try:
+            yield conn
+        finally:
+            with self._lock:
+                self._conn = None
+
+    def cancel(self) -> bool:
+        """
+        Отменяет запрос: выполняющийся — на сервере, ещё не начатый — до отправки.
+
+        :return: True, если серверу была отправлена отмена
+        """
+        with self._lock:
+            self._cancelled = True
+            if self._conn is None:
+                return False
+            try:
+                self._conn.cancel()
+                return True
+            except psycopg2.Error:
+                return False
+
+
+class Timer:
+    """Отложенный вызов планировщика; cancel() — вызов больше не нужен"""
+
+    __slots__ = ("due", "callback", "executor", "cancelled", "scheduler")
+
+    def __init__(
+        self,
+        due: float,
+        callback: Callable[[], object],
+        executor: Executor | None,
+        scheduler: "Scheduler"
+    ):
+        self.due = due
+        self.callback = callback
+        self.executor = executor
+        self.cancelled = False
+        self.scheduler = scheduler
+
+    def cancel(self) -> None:
+        if not self.cancelled:
+            self.cancelled = True
+            # Счётчик приблизительный: он только подсказывает, когда пересобрать очередь
+            self.scheduler._cancelled += 1
+
+
+class Scheduler:
+    """
+    Общий поток таймеров: хеджирование чтения, отмена запросов по сроку.
+    Таймеры почти всегда отменяются до срабатывания (запрос успел), поэтому
+    отмена — только флаг, а поток будится, лишь когда новый таймер раньше всех.
+    Отменённые таймеры удаляются, когда доходят до начала очереди, а если их
+    накопилось больше половины (длинные сроки при большом потоке запросов) —
+    очередь пересобирается. Сработавшие вызовы выполняются в executor, а не в потоке таймеров.
+    """
+
+    _shared: "Scheduler | None" = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_workers: int = 8):
+        """
+        :param max_workers: потоки для вызовов, если при планировании не указан свой executor
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="timer")
+        self._timers: list[tuple[float, int, Timer]] = []
+        self._ids = itertools.count()
+        self._cancelled = 0
+        self._cond = threading.Condition()
+        self._thread: threading.Thread | None = None
+
+    @classmethod
+    def shared(cls) -> "Scheduler":
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def schedule(
+        self,
+        delay: float,
+        callback: Callable[[], object],
+        executor: Executor | None = None
+    ) -> Timer:
+        """Выполняет callback в executor через delay секунд, если таймер не отменят раньше"""
+        timer = Timer(time.monotonic() + delay, callback, executor, self)
+        with self._cond:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="timers", daemon=True)
+                self._thread.start()
+            if self._cancelled > COMPACT_THRESHOLD and self._cancelled * 2 > len(self._timers):
+                self._timers = [entry for entry in self._timers if not entry[2].cancelled]
+                heapq.heapify(self._timers)
+                self._cancelled = 0
+            heapq.heappush(self._timers, (timer.due, next(self._ids), timer))
+            if self._timers[0][2] is timer:
+                self._cond.notify()
+        return timer
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                due = []
+                now = time.monotonic()
+                while self._timers and (self._timers[0][2].cancelled or self._timers[0][0] <= now):
+                    timer = heapq.heappop(self._timers)[2]
+                    if timer.cancelled:
+                        self._cancelled -= 1
+                    else:
+                        due.append(timer)
+                if not due:
+                    timeout = max(self._timers[0][0] - now, TIMER_TICK) if self._timers else None
+                    self._cond.wait(timeout)
+                    continue
+            for timer in due:
+                (timer.executor or self.executor).submit(timer.callback)
@@ -0,0 +1,172 @@
+import select
+import threading
+from typing import Callable
+
+import psycopg2
+from psycopg2 import extensions
+
+from load_balancer import Node
+from query_cache import QueryCache
+
+
+# Подписчик получает имя изменённой таблицы (None — "могло измениться всё")
+# и имя узла, приславшего уведомление
+ChangeCallback = Callable[[str | None, str], None]
+
+
+class ChangeListener:
+    """
+    Фоновый поток, который слушает уведомления NOTIFY от триггеров notify_table_change
+    (replica/init.sql), сбрасывает записи кэша по изменённой таблице
+    и оповещает подписчиков, например открытые окна.
+
+    Слушаются реплики: уведомление приходит, когда изменение уже применено
+    и видно при чтении. На мастере триггеров нет: его уведомления опережали бы
+    реплики. После переподключения весь кэш сбрасывается, так как уведомления
+    за время разрыва потеряны.
+    """
+
+    _shared: dict[tuple, "ChangeListener"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(
+        self,
+        nodes: list[Node],
+        channel: str = "table_changes",
+        cache: QueryCache | None = None,
+        reconnect_interval: float = 5.0
+    ):
+        """
+        :param nodes: узлы, уведомления которых нужно слушать
+        :param channel: канал LISTEN
+        :param cache: кэш, записи которого сбрасываются по уведомлениям
+        :param reconnect_interval: пауза перед повторным подключением к узлу
+        """
+        self.nodes = nodes
+        self.channel = channel
+        self.cache = cache
+        self.reconnect_interval = reconnect_interval
+
+        self._subscribers: list[ChangeCallback] = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+        self._stats = {"notifications": 0, "reconnects": 0, "errors": 0}
+
+    @classmethod
+    def shared(cls, nodes: list[Node], **options) -> "ChangeListener":
+        """Общий для процесса слушатель для данного набора узлов"""
+        key = tuple(sorted(tuple(sorted(node.config.items())) for node in nodes))
+        with cls._shared_lock:
+            listener = cls._shared.get(key)
+            if listener is None:
+                listener = cls(nodes, **options)
+                cls._shared[key] = listener
+            elif listener.cache is None:
+                listener.cache = options.get("cache")
+            return listener
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="change-listener", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def subscribe(self, callback: ChangeCallback) -> None:
+        """
+        Подписывает на изменения. Колбэк вызывается из фонового потока,
+        поэтому окна Tk должны лишь запоминать событие и обрабатывать его в after().
+        """
+        with self._lock:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback: ChangeCallback) -> None:
+        with self._lock:
+            if callback in self._subscribers:
+                self._subscribers.remove(callback)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {**self._stats, "subscribers": len(self._subscribers)}
+
+    def _run(self) -> None:
+        connections: dict[str, extensions.connection] = {}
+        ever_connected: set[str] = set()
+
+        try:
+            while not self._stop.is_set():
+                for node in self.nodes:
+                    if node.name not in connections:
+                        conn = self._connect(node)
+                        if conn is None:
+                            continue
+                        connections[node.name] = conn
+                        if node.name in ever_connected:
+                            self._count("reconnects")
+                            self._dispatch(None, node.name)
+                        ever_connected.add(node.name)
+
+                if not connections:
+                    self._stop.wait(self.reconnect_interval)
+                    continue
+
+                by_fd = {conn.fileno(): (name, conn) for name, conn in connections.items()}
+                timeout = 1.0 if len(connections) == len(self.nodes) else self.reconnect_interval
+                try:
+                    ready, _, _ = select.select(list(by_fd), [], [], timeout)
+                except (OSError, ValueError):
+                    ready = list(by_fd)
+
+                for fd in ready:
+                    name, conn = by_fd[fd]
+                    try:
+                        conn.poll()
+                    except psycopg2.Error:
+                        self._count("errors")
+                        connections.pop(name).close()
+                        continue
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        self._count("notifications")
+                        self._dispatch(notify.payload or None, name)
+        finally:
+            for conn in connections.values():
+                conn.close()
+
+    def _connect(self, node: Node) -> extensions.connection | None:
+        try:
+            conn = psycopg2.connect(**node.config)
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute(f"LISTEN {self.channel}")
+            return conn
+        except psycopg2.Error:
+            self._count("errors")
+            return None
+
+    def _dispatch(self, table: str | None, node_name: str) -> None:
+        if self.cache is not None:
+            self.cache.invalidate(None if table is None else {table})
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for callback in subscribers:
+            try:
+                callback(table, node_name)
+            except Exception as e:
+                print(f"Error in change subscriber: {e}")
+
+    def _count(self, name: str) -> None:
+        with self._lock:
+            self._stats[name] += 1
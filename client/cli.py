@@ -1,5 +1,10 @@
+import json
+
 import click
 from sql_manager import PostgreSQLManager
+from config import QUERY_STATS_FILE, QUERY_TIMEOUT
+from query_stats import load_exports, to_prometheus
+from sql_parser import classify, statement_preview
 
 @click.group()
 def cli():
@@ -8,21 +13,74 @@ def cli():
 
 @cli.command()
 @click.option('--replica', is_flag=True, help='Использовать реплику вместо мастера')
+@click.option('--single-transaction', is_flag=True, help='Выполнить весь скрипт в одной транзакции')
+@click.option('--batch-size', type=int, default=1, help='Запросов за один обмен с сервером')
+@click.option('--timings', is_flag=True, help='Показать время выполнения каждого запроса')
 @click.argument('script_path', type=click.Path(exists=True))
-def run_script(script_path: str, replica: bool):
+def run_script(script_path: str, replica: bool, single_transaction: bool, batch_size: int, timings: bool):
     """Выполнить SQL скрипт из файла"""
     db = PostgreSQLManager()
-    db.execute_script(script_path, use_replica=replica)
+    report = db.execute_script(
+        script_path, use_replica=replica, single_transaction=single_transaction, batch_size=batch_size
+    )
+    if timings:
+        for entry in report:
+            count = f" (+{entry['statements'] - 1})" if entry['statements'] > 1 else ""
+            click.echo(f"{entry['ms']:>10.2f} ms  {entry['statement']}{count}")
 
 @cli.command()
 @click.option('--replica', is_flag=True, help='Использовать реплику вместо мастера')
+@click.option('--fetch-size', type=int, default=None, help='Строк за одно чтение с сервера (потоковый вывод)')
+@click.option('--timeout', type=float, default=QUERY_TIMEOUT,
+              help='Срок выполнения запроса в секундах (по умолчанию и 0 — без ограничения)')
 @click.argument('query')
-def run_query(query: str, replica: bool):
+def run_query(query: str, replica: bool, fetch_size: int | None, timeout: float | None):
     """Выполнить SQL запрос"""
     db = PostgreSQLManager()
-    result = db.execute_query(query, use_replica=replica, fetch=True)
+    timeout = timeout or None
+    if classify(query.strip()).read_only:
+        # Строки выводятся по мере чтения, весь результат в памяти не держится
+        options = {} if fetch_size is None else {"fetch_size": fetch_size}
+        click.echo("Query result:")
+        for row in db.stream_query(query, use_replica=replica or None, timeout=timeout, **options):
+            click.echo(row)
+        return
+    result = db.execute_query(query, use_replica=replica, fetch=True, timeout=timeout)
     click.echo("Query result:")
     click.echo(result)
 
+@cli.command()
+@click.option('--path', default=QUERY_STATS_FILE, show_default=True,
+              help='Файлы снимков статистики ({pid} — любой процесс)')
+@click.option('--format', 'output_format', type=click.Choice(['table', 'json', 'prometheus']), default='table')
+@click.option('--sort', type=click.Choice(['total', 'calls', 'p99', 'errors', 'timeouts']), default='total')
+@click.option('--limit', type=int, default=20, help='Сколько запросов показать в таблице')
+def stats(path: str, output_format: str, sort: str, limit: int):
+    """Статистика запросов по отпечаткам и узлам (процессы с QUERY_STATS=1)"""
+    entries = load_exports(path)
+    if output_format == 'prometheus':
+        click.echo(to_prometheus(entries), nl=False)
+        return
+
+    keys = {'total': 'total_ms', 'calls': 'calls', 'p99': 'p99_ms', 'errors': 'errors', 'timeouts': 'timeouts'}
+    summaries = sorted(
+        (entry.summary() for entry in entries), key=lambda item: item[keys[sort]] or 0, reverse=True
+    )
+    if output_format == 'json':
+        click.echo(json.dumps(summaries, ensure_ascii=False, indent=2))
+        return
+
+    if not summaries:
+        click.echo(f"Нет данных: запустите клиент с QUERY_STATS=1 (снимки: {path})")
+        return
+    click.echo(f"{'calls':>8} {'errors':>6} {'tmout':>6} {'rows':>9} {'total ms':>10} "
+               f"{'p50':>8} {'p95':>8} {'p99':>8} {'max':>8}  {'node':<10} query")
+    for item in summaries[:limit]:
+        click.echo(
+            f"{item['calls']:>8} {item['errors']:>6} {item['timeouts']:>6} {item['rows']:>9} "
+            f"{item['total_ms']:>10.1f} {item['p50_ms']:>8.2f} {item['p95_ms']:>8.2f} {item['p99_ms']:>8.2f} {item['max_ms']:>8.2f}  "
+            f"{item['node']:<10} {statement_preview(item['fingerprint'], 80)}"
+        )
+
 if __name__ == "__main__":
     cli()
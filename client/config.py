@@ -1,5 +1,6 @@
 from dotenv import load_dotenv
 import os
+import tempfile
 
 # Константы с credentials
 MASTER_CONFIG = {
@@ -37,4 +38,120 @@ REPLICA_CONFIG = {
     'user': os.getenv('REPLICA_USER'),
     'password': os.getenv('REPLICA_PASSWORD'),
     'dbname': os.getenv('REPLICA_DB'),
-}
\ No newline at end of file
+}
+
+
+def parse_replicas(value: str) -> list[dict]:
+    """
+    Разбирает список реплик вида "host1:5433,host2:5434:2" (хост, порт, необязательный вес).
+    Логин, пароль и имя базы берутся из REPLICA_CONFIG.
+    """
+    replicas = []
+    for entry in filter(None, (part.strip() for part in value.split(','))):
+        host, _, rest = entry.partition(':')
+        port, _, weight = rest.partition(':')
+        replicas.append({
+            **REPLICA_CONFIG,
+            'host': host,
+            'port': int(port or REPLICA_CONFIG['port']),
+            'weight': int(weight or 1),
+        })
+    return replicas
+
+
+# Все реплики для балансировки чтения. Без REPLICAS используется одна REPLICA_CONFIG
+REPLICA_CONFIGS = parse_replicas(os.getenv('REPLICAS', '')) or [REPLICA_CONFIG]
+
+# Политика балансировки чтения: round_robin, weighted, least_outstanding, lowest_latency
+READ_BALANCING_POLICY = os.getenv('READ_BALANCING_POLICY', 'round_robin')
+
+# Через сколько секунд отказавшая реплика возвращается в ротацию
+NODE_RETRY_INTERVAL = float(os.getenv('NODE_RETRY_INTERVAL', '5'))
+
+# Автоматические выключатели узлов: после NODE_FAILURE_THRESHOLD отказов подряд запросы
+# к узлу сразу получают отказ; через NODE_RETRY_INTERVAL секунд пропускаются пробные запросы,
+# после неудачной пробы срок удваивается до NODE_RETRY_MAX_INTERVAL
+BREAKER_CONFIG = {
+    'failure_threshold': int(os.getenv('NODE_FAILURE_THRESHOLD', '1')),
+    'reset_timeout': NODE_RETRY_INTERVAL,
+    'max_reset_timeout': float(os.getenv('NODE_RETRY_MAX_INTERVAL', '60')),
+    'half_open_probes': int(os.getenv('NODE_HALF_OPEN_PROBES', '1')),
+}
+
+# Настройки пулов соединений (общие для мастера и реплики)
+POOL_CONFIG = {
+    'min_size': int(os.getenv('POOL_MIN_SIZE', '1')),
+    'max_size': int(os.getenv('POOL_MAX_SIZE', '20')),
+    'idle_timeout': float(os.getenv('POOL_IDLE_TIMEOUT', '300')),
+    'acquire_timeout': float(os.getenv('POOL_ACQUIRE_TIMEOUT', '30')),
+    'validate_after': float(os.getenv('POOL_VALIDATE_AFTER', '30')),
+    'connect_timeout': float(os.getenv('POOL_CONNECT_TIMEOUT', '5')),
+}
+
+# Период записи heartbeat на мастер и измерения отставания реплик (секунды)
+HEARTBEAT_INTERVAL = float(os.getenv('HEARTBEAT_INTERVAL', '1'))
+
+# Допустимое устаревание данных на реплике по умолчанию (секунды); пусто — без ограничения
+MAX_STALENESS = float(os.environ['MAX_STALENESS']) if os.getenv('MAX_STALENESS') else None
+
+# Режим read-your-writes: чтение после записи ждёт, пока реплика применит эту запись
+READ_YOUR_WRITES = os.getenv('READ_YOUR_WRITES', 'false').lower() in ('1', 'true', 'yes')
+
+# Сколько секунд чтение ждёт реплику, прежде чем уйти на мастер
+LSN_WAIT_TIMEOUT = float(os.getenv('LSN_WAIT_TIMEOUT', '0.5'))
+
+# Имя логической подписки на репликах (scripts/create_subscription.sql)
+SUBSCRIPTION_NAME = os.getenv('SUBSCRIPTION_NAME', 'my_subscription')
+
+# Кэш результатов чтения (выключен по умолчанию): размер, лимит строк и время жизни записи
+QUERY_CACHE_ENABLED = os.getenv('QUERY_CACHE', 'false').lower() in ('1', 'true', 'yes')
+QUERY_CACHE_CONFIG = {
+    'max_entries': int(os.getenv('QUERY_CACHE_SIZE', '1000')),
+    'max_rows': int(os.getenv('QUERY_CACHE_MAX_ROWS', '100000')),
+    'ttl': float(os.getenv('QUERY_CACHE_TTL', '30')),
+}
+
+# Слушать уведомления об изменениях таблиц (LISTEN) на репликах: сброс кэша
+# и обновление открытых окон при записях из других процессов
+LISTEN_CHANGES = os.getenv('LISTEN_CHANGES', 'false').lower() in ('1', 'true', 'yes')
+CHANGE_CHANNEL = os.getenv('CHANGE_CHANNEL', 'table_changes')
+
+# Сколько строк за раз забирает потоковое чтение через серверный курсор
+STREAM_FETCH_SIZE = int(os.getenv('STREAM_FETCH_SIZE', '2000'))
+
+# Сколько строк отправляется за один обмен с сервером в execute_batch
+BATCH_PAGE_SIZE = int(os.getenv('BATCH_PAGE_SIZE', '1000'))
+
+# Инструментирование запросов: приёмники событий через запятую — log, ring[:размер],
+# file:путь (JSON Lines). Пусто — выключено
+QUERY_LOG = os.getenv('QUERY_LOG', '')
+# Доля запросов, попадающих в журнал; статистика QUERY_STATS считает все запросы
+QUERY_LOG_SAMPLE_RATE = float(os.getenv('QUERY_LOG_SAMPLE_RATE', '1.0'))
+QUERY_LOG_PARAMS = os.getenv('QUERY_LOG_PARAMS', 'false').lower() in ('1', 'true', 'yes')
+
+# Статистика запросов по отпечаткам (гистограммы задержек по узлам). Снимок периодически
+# сохраняется в QUERY_STATS_FILE ({pid} — номер процесса) и читается командой cli.py stats
+QUERY_STATS = os.getenv('QUERY_STATS', 'false').lower() in ('1', 'true', 'yes')
+QUERY_STATS_FILE = os.getenv('QUERY_STATS_FILE', os.path.join(tempfile.gettempdir(), 'query_stats.{pid}.json'))
+QUERY_STATS_INTERVAL = float(os.getenv('QUERY_STATS_INTERVAL', '10'))
+
+# Хеджирование чтения (выключено по умолчанию): если реплика не ответила за HEDGE_PERCENTILE-й
+# перцентиль недавних задержек запроса, он отправляется второй реплике и берётся первый ответ.
+# HEDGE_BUDGET — доля чтений, которую разрешено хеджировать
+HEDGE_READS = os.getenv('HEDGE_READS', 'false').lower() in ('1', 'true', 'yes')
+HEDGE_CONFIG = {
+    'percentile': float(os.getenv('HEDGE_PERCENTILE', '95')),
+    'min_delay_ms': float(os.getenv('HEDGE_MIN_DELAY_MS', '2')),
+    'max_delay_ms': float(os.getenv('HEDGE_MAX_DELAY_MS', '500')),
+    'budget': float(os.getenv('HEDGE_BUDGET', '0.1')),
+    'max_workers': int(os.getenv('HEDGE_MAX_WORKERS', '128')),
+}
+
+# Срок запросов execute_query по умолчанию (секунды; по умолчанию не задан — без ограничения,
+# срок включается для отдельных вызовов через timeout/Deadline или cli.py --timeout).
+# Передаётся серверу как statement_timeout, а если сервер не отменил запрос сам,
+# клиент отменяет его через QUERY_CANCEL_GRACE секунд после срока
+QUERY_TIMEOUT = float(os.getenv('QUERY_TIMEOUT') or 0) or None
+QUERY_CANCEL_GRACE = float(os.getenv('QUERY_CANCEL_GRACE', '1'))
+# Сколько секунд запрос с ограниченным сроком ждёт блокировку строки или таблицы (lock_timeout)
+LOCK_TIMEOUT = float(os.getenv('LOCK_TIMEOUT', '0')) or None
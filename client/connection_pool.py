@@ -0,0 +1,282 @@
+import math
+import threading
+import time
+from contextlib import contextmanager
+
+import psycopg2
+from psycopg2 import extensions
+from psycopg2.extras import DictCursor
+
+
+class PoolTimeoutError(psycopg2.OperationalError):
+    """Не удалось получить соединение из пула за отведённое время"""
+
+
+class ConnectionPool:
+    """
+    Потокобезопасный пул соединений к одному узлу PostgreSQL.
+
+    Соединения выдаются по принципу LIFO, чтобы "горячие" соединения
+    переиспользовались, а лишние простаивающие закрывались по idle_timeout.
+    Соединение, простоявшее дольше validate_after секунд, перед выдачей
+    проверяется запросом SELECT 1.
+    """
+
+    _shared: dict[tuple, "ConnectionPool"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(
+        self,
+        config: dict,
+        name: str = "db",
+        min_size: int = 1,
+        max_size: int = 20,
+        idle_timeout: float = 300.0,
+        acquire_timeout: float = 30.0,
+        validate_after: float = 30.0,
+        connect_timeout: float | None = None
+    ):
+        """
+        :param config: параметры подключения (host, port, user, password, dbname)
+        :param name: имя узла для статистики (master/replica)
+        :param min_size: сколько соединений держать открытыми даже при простое
+        :param max_size: максимальное число открытых соединений
+        :param idle_timeout: через сколько секунд простоя закрывать лишние соединения
+        :param acquire_timeout: сколько секунд ждать свободного соединения
+        :param validate_after: после скольких секунд простоя проверять соединение
+        :param connect_timeout: сколько секунд ждать подключения к узлу (None — без ограничения)
+        """
+        if min_size < 0 or max_size < 1 or min_size > max_size:
+            raise ValueError(f"Некорректные размеры пула: min={min_size}, max={max_size}")
+
+        self.config = config
+        self.name = name
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.acquire_timeout = acquire_timeout
+        self.validate_after = validate_after
+        self.connect_timeout = connect_timeout
+
+        self._cond = threading.Condition()
+        self._idle: list[tuple[extensions.connection, float]] = []  # (соединение, время возврата)
+        self._size = 0  # открытые соединения: свободные + выданные
+        self._waiting = 0
+        self._closed = False
+
+        self._stats = {
+            "connections_created": 0,
+            "connections_closed": 0,
+            "checkouts": 0,
+            "wait_timeouts": 0,
+            "validation_failures": 0,
+            "total_wait_ms": 0.0,
+            "max_wait_ms": 0.0,
+        }
+
+    @classmethod
+    def shared(cls, config: dict, name: str = "db", **options) -> "ConnectionPool":
+        """Возвращает общий для процесса пул для данной конфигурации"""
+        key = tuple(sorted(config.items()))
+        with cls._shared_lock:
+            pool = cls._shared.get(key)
+            if pool is None or pool._closed:
+                pool = cls(config, name=name, **options)
+                cls._shared[key] = pool
+            return pool
+
+    @classmethod
+    def close_shared(cls) -> None:
+        """Закрывает все общие пулы процесса"""
+        with cls._shared_lock:
+            pools = list(cls._shared.values())
+            cls._shared.clear()
+        for pool in pools:
+            pool.close()
+
+    def warmup(self) -> int:
+        """Открывает соединения до min_size. Возвращает число открытых соединений"""
+        opened = 0
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return opened
+                self._size += 1
+            try:
+                conn = self._connect()
+            except psycopg2.Error:
+                with self._cond:
+                    self._size -= 1
+                return opened
+            with self._cond:
+                self._idle.insert(0, (conn, time.monotonic()))
+                self._cond.notify()
+            opened += 1
+
+    def getconn(self, timeout: float | None = None) -> extensions.connection:
+        """
+        Берёт соединение из пула, при необходимости открывая новое.
+
+        :param timeout: сколько секунд ждать свободного соединения (по умолчанию acquire_timeout)
+        :raises PoolTimeoutError: если свободное соединение не появилось за timeout
+        """
+        timeout = self.acquire_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+
+        while True:
+            conn, last_used = self._acquire_slot(deadline)
+
+            if conn is None:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._cond:
+                        self._size -= 1
+                        self._cond.notify()
+                    raise
+            elif not self._is_usable(conn, last_used):
+                with self._cond:
+                    self._stats["validation_failures"] += 1
+                self._discard(conn)
+                continue
+
+            waited_ms = (time.monotonic() - start) * 1000
+            with self._cond:
+                self._stats["checkouts"] += 1
+                self._stats["total_wait_ms"] += waited_ms
+                self._stats["max_wait_ms"] = max(self._stats["max_wait_ms"], waited_ms)
+            return conn
+
+    def putconn(self, conn: extensions.connection, discard: bool = False) -> None:
+        """
+        Возвращает соединение в пул. Незавершённая транзакция откатывается,
+        сломанное соединение закрывается.
+        """
+        if not conn.closed and not discard:
+            status = conn.info.transaction_status
+            if status == extensions.TRANSACTION_STATUS_UNKNOWN:
+                discard = True
+            elif status != extensions.TRANSACTION_STATUS_IDLE:
+                try:
+                    conn.rollback()
+                except psycopg2.Error:
+                    discard = True
+
+        with self._cond:
+            if not (discard or conn.closed or self._closed):
+                self._idle.append((conn, time.monotonic()))
+                self._cond.notify()
+                return
+
+        self._discard(conn)
+
+    @contextmanager
+    def connection(self, timeout: float | None = None):
+        """Контекстный менеджер: выдаёт соединение и гарантированно возвращает его в пул"""
+        conn = self.getconn(timeout)
+        try:
+            yield conn
+        finally:
+            self.putconn(conn)
+
+    def close(self) -> None:
+        """Закрывает все свободные соединения; выданные закроются при возврате"""
+        with self._cond:
+            self._closed = True
+            idle, self._idle = self._idle, []
+            self._cond.notify_all()
+        for conn, _ in idle:
+            self._discard(conn)
+
+    def stats(self) -> dict:
+        """Возвращает снимок статистики пула"""
+        with self._cond:
+            return {
+                "name": self.name,
+                "size": self._size,
+                "idle": len(self._idle),
+                "in_use": self._size - len(self._idle),
+                "waiting": self._waiting,
+                "min_size": self.min_size,
+                "max_size": self.max_size,
+                **self._stats,
+                "total_wait_ms": round(self._stats["total_wait_ms"], 2),
+                "max_wait_ms": round(self._stats["max_wait_ms"], 2),
+            }
+
+    def _acquire_slot(self, deadline: float) -> tuple[extensions.connection | None, float]:
+        """
+        Ждёт свободное соединение или право открыть новое.
+        Возвращает (соединение, время возврата) либо (None, 0), если нужно открыть новое.
+        """
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise psycopg2.InterfaceError(f"Пул {self.name} закрыт")
+
+                self._reap_idle()
+                if self._idle:
+                    return self._idle.pop()
+                if self._size < self.max_size:
+                    self._size += 1
+                    return None, 0.0
+
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["wait_timeouts"] += 1
+                    raise PoolTimeoutError(
+                        f"Нет свободных соединений в пуле {self.name} (max_size={self.max_size})"
+                    )
+                self._waiting += 1
+                try:
+                    self._cond.wait(remaining)
+                finally:
+                    self._waiting -= 1
+
+    def _reap_idle(self) -> None:
+        """Закрывает самые старые простаивающие соединения сверх min_size. Вызывается под блокировкой"""
+        now = time.monotonic()
+        while (
+            self._idle
+            and self._size > self.min_size
+            and now - self._idle[0][1] > self.idle_timeout
+        ):
+            conn, _ = self._idle.pop(0)
+            self._size -= 1
+            self._stats["connections_closed"] += 1
+            conn.close()
+
+    def _is_usable(self, conn: extensions.connection, last_used: float) -> bool:
+        """Проверяет, что соединение живо. Долго простоявшие соединения пингуются"""
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.validate_after:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except psycopg2.Error:
+            return False
+
+    def _connect(self) -> extensions.connection:
+        options = {}
+        if self.connect_timeout is not None:
+            # libpq принимает целые секунды, значения меньше 2 округляет до 2
+            options["connect_timeout"] = max(math.ceil(self.connect_timeout), 1)
+        conn = psycopg2.connect(**self.config, **options, cursor_factory=DictCursor)
+        with self._cond:
+            self._stats["connections_created"] += 1
+        return conn
+
+    def _discard(self, conn: extensions.connection) -> None:
+        try:
+            conn.close()
+        except psycopg2.Error:
+            pass
+        with self._cond:
+            self._size -= 1
+            self._stats["connections_closed"] += 1
+            self._cond.notify()
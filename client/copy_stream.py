@@ -0,0 +1,62 @@
+import json
+from typing import Any, Iterable, Iterator, Sequence
+
+from cancellation import Deadline
+
+
+# Спецсимволы текстового формата COPY
+_COPY_ESCAPES = str.maketrans({
+    "\\": "\\\\",
+    "\t": "\\t",
+    "\n": "\\n",
+    "\r": "\\r",
+})
+
+
+def copy_value(value: Any) -> str:
+    """Значение в текстовом формате COPY (NULL — \\N, словари и списки — JSON)"""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return "\\\\x" + bytes(value).hex()
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False)
+    return str(value).translate(_COPY_ESCAPES)
+
+
+def copy_line(row: Sequence[Any]) -> str:
+    return "\t".join(map(copy_value, row)) + "\n"
+
+
+class CopyStream:
+    """
+    Файлоподобный объект для cursor.copy_expert(): кодирует строки в формат COPY
+    по мере чтения, поэтому генератор строк не собирается в память целиком.
+    """
+
+    def __init__(self, rows: Iterable[Sequence[Any]], deadline: Deadline | None = None):
+        """
+        :param deadline: срок загрузки; после него чтение прерывается QueryTimeoutError
+            (copy_expert сообщает об ошибке сервера, только дочитав поток)
+        """
+        self._lines: Iterator[str] = map(copy_line, rows)
+        self._buffer = b""
+        self.rows = 0
+        self.deadline = deadline
+
+    def read(self, size: int = -1) -> bytes:
+        if self.deadline is not None:
+            self.deadline.check("Загрузка COPY")
+        while size < 0 or len(self._buffer) < size:
+            line = next(self._lines, None)
+            if line is None:
+                break
+            self._buffer += line.encode("utf-8")
+            self.rows += 1
+
+        if size < 0:
+            size = len(self._buffer)
+        chunk, self._buffer = self._buffer[:size], self._buffer[size:]
+        return chunk
@@ -0,0 +1,168 @@
+import threading
+import time
+
+import psycopg2
+
+from load_balancer import Node, is_node_failure
+
+
+HEARTBEAT_ID = 1
+
+WRITE_HEARTBEAT = """
+INSERT INTO replication_heartbeat (id, written_at) VALUES (%s, clock_timestamp())
+ON CONFLICT (id) DO UPDATE SET written_at = EXCLUDED.written_at
+"""
+
+# Отставание считается часами реплики относительно времени записи на мастере,
+# поэтому часы узлов должны быть синхронизированы (в docker-compose они общие)
+READ_HEARTBEAT = """
+SELECT EXTRACT(EPOCH FROM clock_timestamp() - written_at) AS lag
+FROM replication_heartbeat WHERE id = %s
+"""
+
+
+class HeartbeatMonitor:
+    """
+    Раз в interval секунд пишет отметку времени в replication_heartbeat на мастере
+    и читает её на каждой реплике. Разница — отставание реплики: реплика содержит
+    все изменения, закоммиченные на мастере раньше прочитанной отметки.
+
+    Заодно это проверка здоровья узлов: результат каждого обращения передаётся
+    выключателю узла, так что поднявшийся узел возвращается в работу, не дожидаясь
+    пробного запроса, а упавший выводится из неё до того, как на него попадут запросы.
+    """
+
+    _shared: dict[tuple, "HeartbeatMonitor"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(self, master: Node, replicas: list[Node], interval: float = 1.0, write: bool = True):
+        """
+        :param master: узел, на который пишется heartbeat
+        :param replicas: реплики, отставание которых измеряется
+        :param interval: период записи и измерения в секундах
+        :param write: писать heartbeat самому (False — если его пишет другой процесс)
+        """
+        self.master = master
+        self.replicas = replicas
+        self.interval = interval
+        self.write = write
+
+        self._lags: dict[str, tuple[float, float]] = {}  # имя узла -> (отставание, время измерения)
+        self._errors: dict[str, str] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @classmethod
+    def shared(cls, master: Node, replicas: list[Node], **options) -> "HeartbeatMonitor":
+        """Возвращает общий для процесса монитор для данного набора узлов"""
+        key = tuple(id(node.pool) for node in [master, *replicas])
+        with cls._shared_lock:
+            monitor = cls._shared.get(key)
+            if monitor is None:
+                monitor = cls(master, replicas, **options)
+                cls._shared[key] = monitor
+            return monitor
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self) -> None:
+        """Делает первое измерение синхронно и запускает фоновый поток"""
+        with self._lock:
+            if self.running:
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="heartbeat", daemon=True)
+        self.run_once()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def run_once(self) -> None:
+        """Пишет heartbeat на мастер и измеряет отставание всех реплик"""
+        if self.write:
+            self.beat()
+        for node in self.replicas:
+            self.measure(node)
+
+    def beat(self) -> None:
+        try:
+            with self.master.pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(WRITE_HEARTBEAT, (HEARTBEAT_ID,))
+                conn.commit()
+            self._set_error(self.master.name, None)
+            self.master.mark_up()
+        except psycopg2.Error as e:
+            self._set_error(self.master.name, str(e))
+            if is_node_failure(e):
+                self.master.mark_down()
+
+    def measure(self, node: Node) -> float | None:
+        """Измеряет отставание реплики в секундах; None, если узел недоступен"""
+        try:
+            with node.pool.connection() as conn:
+                with conn.cursor() as cursor:
+                    cursor.execute(READ_HEARTBEAT, (HEARTBEAT_ID,))
+                    row = cursor.fetchone()
+        except psycopg2.Error as e:
+            self._set_error(node.name, str(e))
+            if is_node_failure(e):
+                node.mark_down()
+            return None
+        node.mark_up()
+
+        if row is None or row["lag"] is None:
+            self._set_error(node.name, "heartbeat ещё не реплицирован")
+            return None
+
+        lag = max(float(row["lag"]), 0.0)
+        with self._lock:
+            self._lags[node.name] = (lag, time.monotonic())
+            self._errors.pop(node.name, None)
+        return lag
+
+    def staleness(self, node: Node) -> float | None:
+        """
+        Верхняя оценка устаревания данных на реплике в текущий момент:
+        измеренное отставание плюс время, прошедшее с измерения.
+        None, если отставание ещё не измерялось.
+        """
+        with self._lock:
+            measured = self._lags.get(node.name)
+        if measured is None:
+            return None
+        lag, measured_at = measured
+        return lag + (time.monotonic() - measured_at)
+
+    def stats(self) -> dict[str, dict]:
+        with self._lock:
+            result = {self.master.name: {"error": self._errors.get(self.master.name)}}
+        for node in self.replicas:
+            staleness = self.staleness(node)
+            with self._lock:
+                measured = self._lags.get(node.name)
+                error = self._errors.get(node.name)
+            result[node.name] = {
+                "lag_seconds": None if measured is None else round(measured[0], 3),
+                "staleness_seconds": None if staleness is None else round(staleness, 3),
+                "error": error,
+            }
+        return result
+
+    def _set_error(self, name: str, error: str | None) -> None:
+        with self._lock:
+            if error is None:
+                self._errors.pop(name, None)
+            else:
+                self._errors[name] = error
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            self.run_once()
@@ -0,0 +1,227 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from cancellation import CancelScope, Scheduler, Timer
+from query_stats import LatencyHistogram, fingerprint
+
+
+class _LatencyWindow:
+    """
+    Задержки последних запросов: текущее и предыдущее окно по window значений.
+    Перцентиль пересчитывается не чаще, чем раз в REFRESH новых замеров.
+    """
+
+    __slots__ = ("current", "previous", "window", "_cached", "_cached_at", "_records")
+
+    REFRESH = 16
+
+    def __init__(self, window: int):
+        self.window = window
+        self.current = LatencyHistogram()
+        self.previous = LatencyHistogram()
+        self._cached: tuple[float, float | None] | None = None  # (перцентиль, значение)
+        self._cached_at = 0
+        self._records = 0
+
+    @property
+    def count(self) -> int:
+        return self.current.count + self.previous.count
+
+    def record(self, value_ms: float) -> None:
+        if self.current.count >= self.window:
+            self.previous, self.current = self.current, LatencyHistogram()
+        self.current.record(value_ms)
+        self._records += 1
+
+    def percentile(self, percent: float) -> float | None:
+        cached = self._cached
+        if cached is not None and cached[0] == percent and self._records - self._cached_at < self.REFRESH:
+            return cached[1]
+        merged = LatencyHistogram()
+        merged.merge(self.previous)
+        merged.merge(self.current)
+        value = merged.percentile(percent)
+        self._cached, self._cached_at = (percent, value), self._records
+        return value
+
+
+class HedgeRace:
+    """
+    Гонка основного и хеджирующего запросов одного чтения: побеждает первый
+    успешный ответ, остальные участники отменяются через свои CancelScope.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._scopes: list[CancelScope] = []
+        self._closed = False    # основной запрос завершился: новый хедж не нужен
+        self._hedging = False   # хедж запущен
+        self.winner: CancelScope | None = None
+        self.result = None
+        self.hedge_done = threading.Event()
+
+    def enter(self) -> CancelScope | None:
+        """Область отмены нового участника; None — победитель уже есть"""
+        with self._lock:
+            if self.winner is not None:
+                return None
+            scope = CancelScope()
+            self._scopes.append(scope)
+            return scope
+
+    def start_hedge(self) -> bool:
+        with self._lock:
+            if self._closed or self.winner is not None:
+                return False
+            self._hedging = True
+            return True
+
+    def close(self) -> bool:
+        """Запрещает новые хеджи. True — хедж уже выполняется"""
+        with self._lock:
+            self._closed = True
+            return self._hedging
+
+    def finish(self, scope: CancelScope, result) -> int | None:
+        """
+        Объявляет участника победителем и отменяет остальных.
+
+        :return: число отменённых участников или None, если победитель уже был
+        """
+        with self._lock:
+            if self.winner is not None:
+                return None
+            self.winner, self.result = scope, result
+            losers = [other for other in self._scopes if other is not scope]
+        for other in losers:
+            other.cancel()
+        return len(losers)
+
+
+class HedgePolicy:
+    """
+    Политика хеджирования чтения. Если первая реплика не ответила за задержку,
+    равную percentile-му перцентилю недавних задержек этого запроса (по отпечатку,
+    а пока замеров мало — по всем запросам), тот же запрос отправляется второй реплике,
+    и берётся первый ответ.
+
+    Дополнительная нагрузка ограничена бюджетом: хеджируется не больше доли budget
+    чтений (маркерная корзина с запасом burst), поэтому при общей деградации кластера
+    хеджирование не удваивает нагрузку.
+    """
+
+    _shared: "HedgePolicy | None" = None
+    _shared_lock = threading.Lock()
+
+    def __init__(
+        self,
+        percentile: float = 95.0,
+        min_delay_ms: float = 2.0,
+        max_delay_ms: float = 500.0,
+        budget: float = 0.1,
+        burst: float = 10.0,
+        window: int = 1000,
+        min_samples: int = 20,
+        max_fingerprints: int = 1000,
+        max_workers: int = 64
+    ):
+        """
+        :param percentile: перцентиль задержки, после которого отправляется второй запрос
+        :param min_delay_ms: нижняя граница задержки перед хеджированием
+        :param max_delay_ms: верхняя граница (и задержка, пока замеров мало)
+        :param budget: доля чтений, которую разрешено хеджировать
+        :param burst: сколько хеджей подряд можно отправить из накопленного бюджета
+        :param window: по скольким последним запросам считается перцентиль
+        :param min_samples: сколько замеров нужно, чтобы доверять перцентилю отпечатка
+        :param max_fingerprints: для скольких отпечатков хранить задержки
+        :param max_workers: потоки, выполняющие хеджирующие запросы
+        """
+        if not 0 < percentile < 100 or budget < 0:
+            raise ValueError(f"Некорректные параметры хеджирования: percentile={percentile}, budget={budget}")
+        self.percentile = percentile
+        self.min_delay_ms = min_delay_ms
+        self.max_delay_ms = max(max_delay_ms, min_delay_ms)
+        self.budget = budget
+        self.burst = max(burst, 1.0)
+        self.window = window
+        self.min_samples = min_samples
+        self.max_fingerprints = max_fingerprints
+
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="hedge")
+        self._overall = _LatencyWindow(window)
+        self._windows: dict[str, _LatencyWindow] = {}
+        self._tokens = self.burst
+        self._lock = threading.Lock()
+        self._stats = {
+            "reads": 0,          # чтения в режиме хеджирования
+            "hedged": 0,         # отправлен второй запрос
+            "hedge_wins": 0,     # второй запрос ответил первым
+            "cancelled": 0,      # отменены проигравшие запросы
+            "limited": 0,        # хедж не отправлен: исчерпан бюджет
+            "no_candidate": 0,   # хедж не отправлен: нет второй подходящей реплики
+        }
+
+    @classmethod
+    def shared(cls, **options) -> "HedgePolicy":
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(**options)
+            return cls._shared
+
+    def delay(self, query: str) -> float:
+        """Сколько секунд ждать первую реплику, прежде чем отправить запрос второй"""
+        key = fingerprint(query)
+        with self._lock:
+            self._stats["reads"] += 1
+            self._tokens = min(self._tokens + self.budget, self.burst)
+            window = self._windows.get(key)
+            if window is None or window.count < self.min_samples:
+                window = self._overall
+            value = window.percentile(self.percentile) if window.count >= self.min_samples else None
+        if value is None:
+            value = self.max_delay_ms
+        return min(max(value, self.min_delay_ms), self.max_delay_ms) / 1000
+
+    def schedule(self, delay: float, callback) -> Timer:
+        """Запускает хедж callback в executor через delay секунд, если таймер не отменят раньше"""
+        return Scheduler.shared().schedule(delay, callback, self.executor)
+
+    def observe(self, query: str, latency_ms: float) -> None:
+        """Учитывает задержку завершившегося (не отменённого) запроса"""
+        key = fingerprint(query)
+        with self._lock:
+            window = self._windows.get(key)
+            if window is None:
+                if len(self._windows) >= self.max_fingerprints:
+                    # Вытесняем самый давно добавленный отпечаток
+                    self._windows.pop(next(iter(self._windows)))
+                window = self._windows[key] = _LatencyWindow(self.window)
+            window.record(latency_ms)
+            self._overall.record(latency_ms)
+
+    def try_hedge(self) -> bool:
+        """Берёт из бюджета право на второй запрос"""
+        with self._lock:
+            if self._tokens >= 1:
+                self._tokens -= 1
+                self._stats["hedged"] += 1
+                return True
+            self._stats["limited"] += 1
+            return False
+
+    def count(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._stats[name] += value
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        reads = stats["reads"]
+        stats["hedge_rate"] = round(stats["hedged"] / reads, 4) if reads else 0.0
+        stats["win_rate"] = round(stats["hedge_wins"] / stats["hedged"], 4) if stats["hedged"] else 0.0
+        return stats
+
+    def reset_stats(self) -> None:
+        with self._lock:
+            for name in self._stats:
+                self._stats[name] = 0
@@ -0,0 +1,213 @@
+import json
+import random
+import sys
+import threading
+import time
+from collections import deque
+from typing import TextIO
+
+from cancellation import is_timeout
+
+
+class QueryEvent:
+    """Один выполненный (или выполняемый) запрос, попавший в выборку"""
+
+    __slots__ = ("node", "query", "params", "sql", "started_at", "elapsed_ms", "rowcount", "error", "timed_out",
+                 "sinks", "_start")
+
+    def __init__(self, node: str, query: str, params: tuple | dict | None):
+        self.node = node
+        self.query = query
+        self.params = params
+        self.sql: str | None = None  # запрос с подставленными параметрами (capture_params)
+        self.started_at = time.time()
+        self.elapsed_ms: float | None = None
+        self.rowcount: int | None = None
+        self.error: str | None = None
+        self.timed_out = False  # запрос отменён по сроку или lock_timeout
+        self.sinks: list[Sink] = []  # приёмники, получающие это событие
+        self._start = time.perf_counter()
+
+    def as_dict(self) -> dict:
+        return {
+            "node": self.node,
+            "query": self.sql or self.query,
+            "started_at": self.started_at,
+            "elapsed_ms": self.elapsed_ms,
+            "rowcount": self.rowcount,
+            "error": self.error,
+            "timed_out": self.timed_out,
+        }
+
+
+class Sink:
+    """
+    Приёмник событий. before() вызывается перед отправкой запроса,
+    after() — после его завершения (успешного или с ошибкой).
+
+    Приёмник с sampled = False получает все запросы независимо от sample_rate:
+    счётчикам статистики выборка не нужна, она занижала бы их.
+    """
+
+    sampled = True
+
+    def before(self, event: QueryEvent) -> None:
+        pass
+
+    def after(self, event: QueryEvent) -> None:
+        pass
+
+
+class LogSink(Sink):
+    """Печатает запросы в поток вывода: [узел] запрос (время)"""
+
+    def __init__(self, stream: TextIO | None = None):
+        self.stream = stream
+
+    def after(self, event: QueryEvent) -> None:
+        status = f"error: {event.error}" if event.error else f"{event.rowcount} rows"
+        print(
+            f"[{event.node}] {event.sql or event.query} ({event.elapsed_ms:.2f} ms, {status})",
+            file=self.stream or sys.stdout
+        )
+
+
+class RingBufferSink(Sink):
+    """Хранит последние capacity событий в памяти"""
+
+    def __init__(self, capacity: int = 1000):
+        self._events: deque[QueryEvent] = deque(maxlen=capacity)
+
+    def after(self, event: QueryEvent) -> None:
+        self._events.append(event)
+
+    def events(self) -> list[QueryEvent]:
+        return list(self._events)
+
+    def clear(self) -> None:
+        self._events.clear()
+
+
+class FileSink(Sink):
+    """Дописывает события в файл в формате JSON Lines"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def after(self, event: QueryEvent) -> None:
+        line = json.dumps(event.as_dict(), ensure_ascii=False, default=str)
+        with self._lock:
+            self._file.write(line + "\n")
+            self._file.flush()
+
+    def close(self) -> None:
+        with self._lock:
+            self._file.close()
+
+
+def make_sinks(spec: str) -> list[Sink]:
+    """Приёмники по описанию из конфигурации: "log,ring,file:/tmp/queries.jsonl" """
+    sinks = []
+    for entry in filter(None, (part.strip() for part in spec.split(","))):
+        kind, _, argument = entry.partition(":")
+        if kind == "log":
+            sinks.append(LogSink())
+        elif kind == "ring":
+            sinks.append(RingBufferSink(int(argument or 1000)))
+        elif kind == "file":
+            sinks.append(FileSink(argument or "queries.jsonl"))
+        else:
+            raise ValueError(f"Неизвестный приёмник событий запросов: {kind}")
+    return sinks
+
+
+class Instrumentation:
+    """
+    Инструментирование запросов менеджера: для доли sample_rate запросов создаёт
+    QueryEvent с узлом, временем, числом строк и ошибкой и передаёт его приёмникам.
+    Приёмники без выборки (Sink.sampled = False) получают все запросы.
+
+    Когда инструментирование выключено, менеджер хранит None вместо объекта
+    и на пути выполнения запроса не делает ничего лишнего.
+    """
+
+    _shared: "Instrumentation | None" = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, sinks: list[Sink], sample_rate: float = 1.0, capture_params: bool = False):
+        """
+        :param sinks: приёмники событий
+        :param sample_rate: доля запросов, попадающих в выборку (0..1)
+        :param capture_params: подставлять параметры в текст запроса (cursor.mogrify)
+        """
+        self.sinks = list(sinks)
+        self.sample_rate = sample_rate
+        self.capture_params = capture_params
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, spec: str = "", **options) -> "Instrumentation":
+        """
+        Общее для процесса инструментирование: события всех окон в одних приёмниках.
+
+        :param spec: приёмники при первом создании, см. make_sinks()
+        """
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(make_sinks(spec), **options)
+            return cls._shared
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.sinks) and (self.sample_rate > 0 or any(not sink.sampled for sink in self.sinks))
+
+    def add_sink(self, sink: Sink) -> None:
+        with self._lock:
+            self.sinks = [*self.sinks, sink]
+
+    def remove_sink(self, sink: Sink) -> None:
+        with self._lock:
+            self.sinks = [item for item in self.sinks if item is not sink]
+
+    def sink(self, kind: type[Sink]) -> Sink | None:
+        """Первый приёмник указанного типа"""
+        return next((sink for sink in self.sinks if isinstance(sink, kind)), None)
+
+    def before(self, node: str, query: str, params: tuple | dict | None, cursor=None) -> QueryEvent | None:
+        """
+        Начинает событие запроса. None — запрос не попал в выборку и нет приёмников
+        без выборки (Sink.sampled).
+
+        :param cursor: курсор для подстановки параметров (нужен при capture_params)
+        """
+        sinks = self.sinks
+        if self.sample_rate < 1.0 and random.random() >= self.sample_rate:
+            sinks = [sink for sink in sinks if not sink.sampled]
+            if not sinks:
+                return None
+
+        event = QueryEvent(node, query, params)
+        event.sinks = sinks
+        if self.capture_params and params and cursor is not None:
+            try:
+                event.sql = cursor.mogrify(query, params).decode("utf-8")
+            except Exception:
+                event.sql = f"{query} -- params: {params}"
+        for sink in sinks:
+            sink.before(event)
+        return event
+
+    def after(self, event: QueryEvent, rowcount: int | None = None, error: BaseException | None = None) -> None:
+        """Завершает событие и передаёт его приёмникам"""
+        event.elapsed_ms = (time.perf_counter() - event._start) * 1000
+        event.rowcount = rowcount
+        if error is not None:
+            event.error = f"{type(error).__name__}: {error}".strip()
+            event.timed_out = is_timeout(error)
+        for sink in event.sinks:
+            try:
+                sink.after(event)
+            except Exception as e:
+                print(f"Error in query sink {type(sink).__name__}: {e}")
@@ -0,0 +1,437 @@
+import random
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable
+
+import psycopg2
+from psycopg2 import extensions
+
+from connection_pool import ConnectionPool, PoolTimeoutError
+
+
+class NodeUnavailableError(psycopg2.OperationalError):
+    """Узел выведен из работы автоматическим выключателем: запрос к нему не отправлялся"""
+
+
+class CircuitBreaker:
+    """
+    Автоматический выключатель узла. После failure_threshold отказов подряд узел
+    размыкается (open): запросы к нему сразу получают отказ, не дожидаясь таймаута
+    подключения. Через reset_timeout секунд выключатель переходит в half_open
+    и пропускает пробные запросы (не больше half_open_probes одновременно):
+    успех замыкает его, отказ снова размыкает на вдвое больший срок (до max_reset_timeout).
+
+    Выключатель общий для всех узлов процесса с одной конфигурацией подключения,
+    поэтому отказ, замеченный одним окном, сразу учитывают остальные.
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    _shared: dict[tuple, "CircuitBreaker"] = {}
+    _shared_lock = threading.Lock()
+
+    def __init__(
+        self,
+        name: str = "db",
+        failure_threshold: int = 1,
+        reset_timeout: float = 5.0,
+        max_reset_timeout: float = 60.0,
+        half_open_probes: int = 1
+    ):
+        """
+        :param name: имя узла для статистики
+        :param failure_threshold: сколько отказов подряд размыкают выключатель
+        :param reset_timeout: через сколько секунд пробовать узел снова
+        :param max_reset_timeout: предел для срока, удваивающегося при неудачных пробах
+        :param half_open_probes: сколько пробных запросов пропускать одновременно
+        """
+        if failure_threshold < 1 or half_open_probes < 1:
+            raise ValueError(
+                f"Некорректные параметры выключателя {name}: "
+                f"failure_threshold={failure_threshold}, half_open_probes={half_open_probes}"
+            )
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_reset_timeout = max(max_reset_timeout, reset_timeout)
+        self.half_open_probes = half_open_probes
+
+        self._state = self.CLOSED
+        self._consecutive_failures = 0
+        self._open_timeout = reset_timeout
+        self._opened_at = 0.0
+        self._probes = 0
+        self._trips = 0
+        self._rejected = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def shared(cls, config: dict, name: str = "db", **options) -> "CircuitBreaker":
+        """Возвращает общий для процесса выключатель узла с данной конфигурацией"""
+        key = tuple(sorted(config.items()))
+        with cls._shared_lock:
+            breaker = cls._shared.get(key)
+            if breaker is None:
+                breaker = cls(name=name, **options)
+                cls._shared[key] = breaker
+            return breaker
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            if self._state == self.OPEN and self._retry_due():
+                return self.HALF_OPEN
+            return self._state
+
+    @property
+    def available(self) -> bool:
+        """Можно ли сейчас отправить запрос на узел (без занятия места пробы)"""
+        with self._lock:
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.OPEN:
+                return self._retry_due()
+            return self._probes < self.half_open_probes
+
+    def allow(self) -> bool:
+        """
+        Разрешает запрос к узлу. В half_open занимает место пробы, которое
+        освобождается при record_success() или record_failure().
+        """
+        with self._lock:
+            if self._state == self.OPEN and self._retry_due():
+                self._state = self.HALF_OPEN
+                self._probes = 0
+            if self._state == self.CLOSED:
+                return True
+            if self._state == self.HALF_OPEN and self._probes < self.half_open_probes:
+                self._probes += 1
+                return True
+            self._rejected += 1
+            return False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self._state = self.CLOSED
+            self._consecutive_failures = 0
+            self._open_timeout = self.reset_timeout
+            self._probes = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self._consecutive_failures += 1
+            if self._state == self.HALF_OPEN:
+                # Проба не удалась: узел ещё не поднялся, ждём дольше
+                self._open(min(self._open_timeout * 2, self.max_reset_timeout))
+            elif self._state == self.CLOSED and self._consecutive_failures >= self.failure_threshold:
+                self._open(self.reset_timeout)
+
+    def trip(self, timeout: float | None = None) -> None:
+        """Принудительно размыкает выключатель на timeout секунд (по умолчанию reset_timeout)"""
+        with self._lock:
+            self._open(self.reset_timeout if timeout is None else timeout)
+
+    def retry_in(self) -> float:
+        """Через сколько секунд разомкнутый выключатель пропустит пробу (0 — уже пропускает)"""
+        with self._lock:
+            if self._state != self.OPEN:
+                return 0.0
+            return max(self._opened_at + self._open_timeout - time.monotonic(), 0.0)
+
+    def stats(self) -> dict:
+        state = self.state
+        with self._lock:
+            return {
+                "state": state,
+                "consecutive_failures": self._consecutive_failures,
+                "trips": self._trips,
+                "rejected": self._rejected,
+                "open_timeout": self._open_timeout,
+            }
+
+    def _open(self, timeout: float) -> None:
+        """Размыкает выключатель. Вызывается под блокировкой"""
+        if self._state != self.OPEN:
+            self._trips += 1
+        self._state = self.OPEN
+        self._open_timeout = timeout
+        self._opened_at = time.monotonic()
+        self._probes = 0
+
+    def _retry_due(self) -> bool:
+        return time.monotonic() >= self._opened_at + self._open_timeout
+
+
+class Node:
+    """Узел кластера (мастер или реплика) со своим пулом и метриками для балансировки"""
+
+    def __init__(
+        self,
+        name: str,
+        config: dict,
+        pool_config: dict,
+        weight: int = 1,
+        pool_factory: Callable[..., Any] = ConnectionPool.shared,
+        breaker_config: dict | None = None
+    ):
+        """
+        :param name: имя узла для статистики и логов
+        :param config: параметры подключения
+        :param pool_config: параметры пула соединений
+        :param weight: вес узла для взвешенной балансировки
+        :param pool_factory: фабрика пула (по умолчанию общий для процесса ConnectionPool)
+        :param breaker_config: параметры автоматического выключателя узла (см. CircuitBreaker)
+        """
+        if weight < 1:
+            raise ValueError(f"Вес узла {name} должен быть положительным: {weight}")
+
+        self.name = name
+        self.config = config
+        self.weight = weight
+        self.pool = pool_factory(config, name=name, **pool_config)
+        self.breaker = CircuitBreaker.shared(config, name=name, **(breaker_config or {}))
+
+        self.outstanding = 0  # запросы, выполняющиеся прямо сейчас
+        self.latency_ms: float | None = None  # экспоненциальное среднее задержки
+        self.requests = 0
+        self.failures = 0
+        self._lock = threading.Lock()
+
+    @property
+    def healthy(self) -> bool:
+        """Выключатель узла пропустит запрос (замкнут или ждёт пробу)"""
+        return self.breaker.available
+
+    def mark_down(self) -> None:
+        """Учитывает отказ узла; после нескольких отказов подряд узел выводится из ротации"""
+        with self._lock:
+            self.failures += 1
+        self.breaker.record_failure()
+
+    def mark_up(self) -> None:
+        self.breaker.record_success()
+
+    def stats(self) -> dict:
+        breaker = self.breaker.stats()
+        with self._lock:
+            return {
+                "name": self.name,
+                "weight": self.weight,
+                "healthy": breaker["state"] != CircuitBreaker.OPEN,
+                "state": breaker["state"],
+                "outstanding": self.outstanding,
+                "latency_ms": None if self.latency_ms is None else round(self.latency_ms, 2),
+                "requests": self.requests,
+                "failures": self.failures,
+                "rejected": breaker["rejected"],
+            }
+
+    def _begin(self) -> None:
+        with self._lock:
+            self.outstanding += 1
+            self.requests += 1
+
+    def _end(self, latency_ms: float | None, alpha: float) -> None:
+        with self._lock:
+            self.outstanding -= 1
+            if latency_ms is not None:
+                if self.latency_ms is None:
+                    self.latency_ms = latency_ms
+                else:
+                    self.latency_ms += alpha * (latency_ms - self.latency_ms)
+
+    def __repr__(self) -> str:
+        return f"Node({self.name!r})"
+
+
+class BalancingPolicy:
+    """Политика выбора узла из списка здоровых кандидатов"""
+
+    name = "base"
+
+    def choose(self, nodes: list[Node]) -> Node:
+        raise NotImplementedError("Метод choose() должен быть переопределён")
+
+
+class RoundRobinPolicy(BalancingPolicy):
+    """Узлы выбираются по очереди"""
+
+    name = "round_robin"
+
+    def __init__(self):
+        self._counter = 0
+        self._lock = threading.Lock()
+
+    def choose(self, nodes: list[Node]) -> Node:
+        with self._lock:
+            self._counter += 1
+            return nodes[self._counter % len(nodes)]
+
+
+class WeightedPolicy(BalancingPolicy):
+    """Плавный взвешенный round-robin (как в nginx): узел с весом 2 получает вдвое больше запросов"""
+
+    name = "weighted"
+
+    def __init__(self):
+        self._current: dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def choose(self, nodes: list[Node]) -> Node:
+        with self._lock:
+            total = 0
+            best = None
+            for node in nodes:
+                current = self._current.get(node.name, 0) + node.weight
+                self._current[node.name] = current
+                total += node.weight
+                if best is None or current > self._current[best.name]:
+                    best = node
+            self._current[best.name] -= total
+            return best
+
+
+class LeastOutstandingPolicy(BalancingPolicy):
+    """Выбирается узел с наименьшим числом выполняющихся запросов"""
+
+    name = "least_outstanding"
+
+    def choose(self, nodes: list[Node]) -> Node:
+        fewest = min(node.outstanding for node in nodes)
+        return random.choice([node for node in nodes if node.outstanding == fewest])
+
+
+class LowestLatencyPolicy(BalancingPolicy):
+    """
+    Выбирается узел с наименьшей средней задержкой за последнее время.
+    С вероятностью exploration выбирается случайный узел, чтобы оценки
+    задержки не устаревали у узлов, которые давно не получали запросов.
+    """
+
+    name = "lowest_latency"
+
+    def __init__(self, exploration: float = 0.05):
+        self.exploration = exploration
+
+    def choose(self, nodes: list[Node]) -> Node:
+        unmeasured = [node for node in nodes if node.latency_ms is None]
+        if unmeasured:
+            return random.choice(unmeasured)
+        if random.random() < self.exploration:
+            return random.choice(nodes)
+        return min(nodes, key=lambda node: node.latency_ms)
+
+
+POLICIES = {
+    policy.name: policy
+    for policy in (RoundRobinPolicy, WeightedPolicy, LeastOutstandingPolicy, LowestLatencyPolicy)
+}
+
+
+def make_policy(policy: str | BalancingPolicy) -> BalancingPolicy:
+    """Создаёт политику по имени (round_robin, weighted, least_outstanding, lowest_latency)"""
+    if isinstance(policy, BalancingPolicy):
+        return policy
+    try:
+        return POLICIES[policy]()
+    except KeyError:
+        raise ValueError(f"Неизвестная политика балансировки: {policy}") from None
+
+
+# SQLSTATE отказа узла, кроме класса 08 (ошибки соединения): сервер остановлен
+# администратором (57P01), аварийно (57P02) или ещё запускается (57P03)
+NODE_FAILURE_SQLSTATES = ("57P01", "57P02", "57P03")
+
+
+def is_node_failure(error: Exception) -> bool:
+    """
+    Отличает отказ узла от ошибок самого запроса по SQLSTATE. Отказ — ошибки соединения
+    (класс 08), остановка или запуск сервера (NODE_FAILURE_SQLSTATES) и ошибки соединения
+    без кода (обрыв, узел не отвечает, выключатель разомкнут). Всё остальное — ошибки запроса,
+    в том числе таймауты, lock_timeout и нехватка ресурсов под запрос (классы 53, 54),
+    а также нехватка соединений в пуле.
+    """
+    if not isinstance(error, psycopg2.OperationalError):
+        return False
+    if isinstance(error, (PoolTimeoutError, extensions.QueryCanceledError)):
+        return False
+    if error.pgcode is None:
+        return True
+    return error.pgcode.startswith("08") or error.pgcode in NODE_FAILURE_SQLSTATES
+
+
+class LoadBalancer:
+    """Распределяет запросы между узлами; узлы с разомкнутым выключателем пропускаются"""
+
+    def __init__(
+        self,
+        nodes: list[Node],
+        policy: str | BalancingPolicy = "round_robin",
+        latency_alpha: float = 0.2
+    ):
+        """
+        :param nodes: узлы, между которыми распределяется нагрузка
+        :param policy: политика балансировки или её имя
+        :param latency_alpha: коэффициент сглаживания средней задержки
+        """
+        if not nodes:
+            raise ValueError("Нужен хотя бы один узел")
+        self.nodes = nodes
+        self.policy = make_policy(policy)
+        self.latency_alpha = latency_alpha
+
+    def choose(
+        self,
+        exclude: list[Node] | tuple = (),
+        eligible: Callable[[Node], bool] | None = None
+    ) -> Node | None:
+        """
+        Выбирает узел среди доступных. Узлы с разомкнутым выключателем не выбираются,
+        чтобы запрос не ждал таймаута подключения к отказавшему узлу; вернуть такой узел
+        в работу — дело пробных запросов после reset_timeout.
+
+        :param exclude: узлы, которые уже пробовали
+        :param eligible: дополнительное условие отбора (например, свежесть данных)
+        :return: выбранный узел или None, если подходящих узлов нет
+        """
+        candidates = [
+            node for node in self.nodes
+            if node not in exclude and node.healthy and (eligible is None or eligible(node))
+        ]
+        if not candidates:
+            return None
+        return self.policy.choose(candidates)
+
+    @contextmanager
+    def track(self, node: Node):
+        """
+        Учитывает запрос к узлу: число выполняющихся запросов, задержку и отказы.
+
+        :raises NodeUnavailableError: если выключатель узла не пропускает запрос
+        """
+        if not node.breaker.allow():
+            raise NodeUnavailableError(
+                f"Узел {node.name} недоступен, повторная попытка через {node.breaker.retry_in():.1f} с"
+            )
+        node._begin()
+        start = time.perf_counter()
+        latency_ms = None
+        try:
+            yield node
+            latency_ms = (time.perf_counter() - start) * 1000
+            node.mark_up()
+        except BaseException as e:
+            if isinstance(e, Exception) and is_node_failure(e):
+                node.mark_down()
+            else:
+                # Ошибка самого запроса или отмена: узел отвечает
+                node.mark_up()
+            raise
+        finally:
+            node._end(latency_ms, self.latency_alpha)
+
+    def stats(self) -> list[dict]:
+        return [node.stats() for node in self.nodes]
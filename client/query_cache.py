@@ -0,0 +1,238 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+
+
+_WHITESPACE = re.compile(r"\s+")
+
+# Таблицы после FROM (в том числе перечисленные через запятую) и JOIN
+_FROM_LIST = re.compile(
+    r'\bfrom\s+((?:[\w."]+)(?:\s+(?:as\s+)?\w+)?(?:\s*,\s*[\w."]+(?:\s+(?:as\s+)?\w+)?)*)',
+    re.IGNORECASE
+)
+_JOIN = re.compile(r'\bjoin\s+([\w."]+)', re.IGNORECASE)
+
+# Целевая таблица запроса на изменение
+_WRITE_TARGET = re.compile(
+    r'^\s*(?:insert\s+into|update|delete\s+from|truncate(?:\s+table)?|merge\s+into)'
+    r'\s+(?:only\s+)?([\w."]+)',
+    re.IGNORECASE
+)
+
+
+def normalize_query(query: str) -> str:
+    """Приводит запрос к каноническому виду для ключа кэша: схлопывает пробелы"""
+    return _WHITESPACE.sub(" ", query).strip()
+
+
+def _table_name(name: str) -> str:
+    name = name.replace('"', '').lower()
+    return name[len("public."):] if name.startswith("public.") else name
+
+
+def tables_read(query: str) -> set[str]:
+    """Таблицы, из которых читает запрос (по FROM и JOIN)"""
+    tables = set()
+    for match in _FROM_LIST.finditer(query):
+        for entry in match.group(1).split(','):
+            tables.add(_table_name(entry.split()[0]))
+    for match in _JOIN.finditer(query):
+        tables.add(_table_name(match.group(1)))
+    return tables
+
+
+def tables_written(query: str) -> set[str] | None:
+    """
+    Таблица, которую изменяет запрос. None — если определить её не удалось
+    (DDL, вызов функции, CTE): такой запрос сбрасывает весь кэш.
+    """
+    match = _WRITE_TARGET.match(query)
+    if match is None:
+        return None
+    return {_table_name(match.group(1))}
+
+
+def _freeze(value):
+    """Делает параметры запроса хешируемыми для ключа кэша"""
+    if isinstance(value, dict):
+        return tuple(sorted((key, _freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(_freeze(item) for item in value)
+    return value
+
+
+class QueryCache:
+    """
+    LRU-кэш результатов чтения с TTL. Каждая запись помечена таблицами, из которых
+    читал запрос; запись в таблицу через менеджер удаляет все записи с её меткой.
+
+    Размер ограничен числом записей и суммарным числом строк. Результаты выдаются
+    копиями, чтобы вызывающий код мог их менять.
+
+    Кэш помнит, когда таблицы последний раз инвалидировались (changed_since):
+    реплика, ещё не применившая запись, отдаст строки до неё, и закэшированными
+    они прожили бы весь TTL.
+    """
+
+    _shared: "QueryCache | None" = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, max_entries: int = 1000, max_rows: int = 100_000, ttl: float = 30.0):
+        """
+        :param max_entries: максимальное число закэшированных запросов
+        :param max_rows: максимальное суммарное число строк во всех записях
+        :param ttl: время жизни записи в секундах
+        """
+        self.max_entries = max_entries
+        self.max_rows = max_rows
+        self.ttl = ttl
+
+        # ключ -> (строки, метки, момент устаревания)
+        self._entries: OrderedDict[tuple, tuple[list[dict], frozenset[str], float]] = OrderedDict()
+        self._by_table: dict[str, set[tuple]] = {}
+        self._rows = 0
+        # Версии таблиц: не даём сохранить результат, прочитанный до инвалидации
+        self._versions: dict[str, int] = {}
+        self._generation = 0
+        # Моменты последних инвалидаций (time.monotonic): таблиц и сброса всего кэша
+        self._changed_at: dict[str, float] = {}
+        self._flushed_at: float | None = None
+        self._lock = threading.Lock()
+
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0, "invalidations": 0}
+
+    @classmethod
+    def shared(cls, **options) -> "QueryCache":
+        """Общий кэш процесса: окна GUI видят инвалидации друг друга"""
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(**options)
+            return cls._shared
+
+    @staticmethod
+    def make_key(query: str, params: tuple | dict | None) -> tuple | None:
+        """Ключ кэша; None, если параметры нельзя захешировать"""
+        key = (normalize_query(query), _freeze(params))
+        try:
+            hash(key)
+        except TypeError:
+            return None
+        return key
+
+    def get(self, key: tuple, max_age: float | None = None) -> list[dict] | None:
+        """
+        Возвращает копию закэшированного результата или None.
+
+        :param max_age: не отдавать результат старше max_age секунд
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._stats["misses"] += 1
+                return None
+            rows, tags, expires_at = entry
+            now = time.monotonic()
+            if now >= expires_at:
+                self._remove(key)
+                self._stats["expirations"] += 1
+                self._stats["misses"] += 1
+                return None
+            if max_age is not None and now - (expires_at - self.ttl) > max_age:
+                self._stats["misses"] += 1
+                return None
+            self._entries.move_to_end(key)
+            self._stats["hits"] += 1
+        return [dict(row) for row in rows]
+
+    def version(self, tables: set[str]) -> tuple:
+        """Снимок версий таблиц; передаётся в put(), чтобы не закэшировать устаревший результат"""
+        with self._lock:
+            return (self._generation, tuple(self._versions.get(table, 0) for table in sorted(tables)))
+
+    def changed_since(self, tables: set[str]) -> float | None:
+        """
+        Сколько секунд назад инвалидировалась одна из таблиц (или весь кэш).
+        None — с создания кэша таблицы не менялись.
+        """
+        with self._lock:
+            moments = [self._changed_at[table] for table in tables if table in self._changed_at]
+            if self._flushed_at is not None:
+                moments.append(self._flushed_at)
+        if not moments:
+            return None
+        return time.monotonic() - max(moments)
+
+    def put(self, key: tuple, rows: list[dict], tables: set[str], version: tuple | None = None) -> None:
+        """
+        Сохраняет результат. Если с момента version таблицы менялись, результат
+        мог устареть ещё до сохранения — тогда он не кэшируется.
+        """
+        if len(rows) > self.max_rows:
+            return
+        tags = frozenset(tables)
+        with self._lock:
+            current = (self._generation, tuple(self._versions.get(table, 0) for table in sorted(tags)))
+            if version is not None and version != current:
+                return
+            if key in self._entries:
+                self._remove(key)
+
+            self._entries[key] = ([dict(row) for row in rows], tags, time.monotonic() + self.ttl)
+            self._rows += len(rows)
+            for table in tags:
+                self._by_table.setdefault(table, set()).add(key)
+
+            while self._entries and (len(self._entries) > self.max_entries or self._rows > self.max_rows):
+                self._remove(next(iter(self._entries)))
+                self._stats["evictions"] += 1
+
+    def invalidate(self, tables: set[str] | None) -> int:
+        """
+        Удаляет записи, читавшие из указанных таблиц. None — сбросить весь кэш.
+        Возвращает число удалённых записей.
+        """
+        with self._lock:
+            now = time.monotonic()
+            if tables is None:
+                removed = len(self._entries)
+                self._generation += 1
+                self._flushed_at = now
+                self._entries.clear()
+                self._by_table.clear()
+                self._rows = 0
+            else:
+                keys = set()
+                for table in tables:
+                    self._versions[table] = self._versions.get(table, 0) + 1
+                    self._changed_at[table] = now
+                    keys |= self._by_table.get(table, set())
+                for key in keys:
+                    self._remove(key)
+                removed = len(keys)
+            self._stats["invalidations"] += removed
+            return removed
+
+    def clear(self) -> None:
+        self.invalidate(None)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self._stats["hits"] + self._stats["misses"]
+            return {
+                "entries": len(self._entries),
+                "rows": self._rows,
+                **self._stats,
+                "hit_ratio": round(self._stats["hits"] / lookups, 3) if lookups else None,
+            }
+
+    def _remove(self, key: tuple) -> None:
+        """Удаляет запись. Вызывается под блокировкой"""
+        rows, tags, _ = self._entries.pop(key)
+        self._rows -= len(rows)
+        for table in tags:
+            keys = self._by_table.get(table)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._by_table[table]
@@ -0,0 +1,326 @@
+import atexit
+import glob
+import json
+import math
+import os
+import re
+import threading
+import time
+from functools import lru_cache
+
+from instrumentation import QueryEvent, Sink
+from sql_parser import IGNORED, tokenize
+
+
+# Повторяющиеся значения в списках: IN (?, ?, ?) и VALUES (?, ?), (?, ?)
+_VALUE_LIST = re.compile(r"\?(?:, \?)+")
+_ROW_LIST = re.compile(r"(\([^()]*\))(?:, \1)+")
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(query: str) -> str:
+    """
+    Нормализованный вид запроса: литералы и параметры заменены на ?, комментарии убраны,
+    слова в нижнем регистре, списки значений схлопнуты. Запросы, отличающиеся
+    только значениями, получают один отпечаток.
+    """
+    parts = []
+    for token in tokenize(query):
+        if token.kind in IGNORED:
+            continue
+        text = "?" if token.kind in ("string", "number", "param") else token.text
+        if token.kind == "word":
+            text = text.lower()
+        if parts and text not in (",", ")", ".", ";") and parts[-1] not in ("(", "."):
+            parts.append(" ")
+        parts.append(text)
+
+    result = "".join(parts).rstrip(";")
+    result = _VALUE_LIST.sub("?, ...", result)
+    return _ROW_LIST.sub(r"\1, ...", result)
+
+
+class LatencyHistogram:
+    """
+    Гистограмма задержек в духе HdrHistogram: на каждую степень двойки приходится
+    2**SUB_BITS линейных корзин, поэтому относительная погрешность не больше 1/2**SUB_BITS
+    при любом диапазоне значений. Значения хранятся в микросекундах, корзины — разреженно.
+    Гистограммы разных процессов складываются (merge).
+    """
+
+    SUB_BITS = 5
+    SUB = 1 << SUB_BITS
+
+    def __init__(self):
+        self.counts: dict[int, int] = {}
+        self.count = 0
+        self.total_us = 0
+        self.max_us = 0
+
+    @classmethod
+    def bucket(cls, value_us: int) -> int:
+        if value_us < cls.SUB:
+            return value_us
+        shift = value_us.bit_length() - cls.SUB_BITS - 1
+        return cls.SUB * shift + (value_us >> shift)
+
+    @classmethod
+    def bucket_range(cls, index: int) -> tuple[int, int]:
+        """Границы корзины [нижняя, верхняя) в микросекундах"""
+        if index < cls.SUB:
+            return index, index + 1
+        shift = index // cls.SUB - 1
+        mantissa = index - cls.SUB * shift
+        return mantissa << shift, (mantissa + 1) << shift
+
+    def record(self, value_ms: float) -> None:
+        value_us = max(int(value_ms * 1000), 0)
+        index = self.bucket(value_us)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total_us += value_us
+        self.max_us = max(self.max_us, value_us)
+
+    def percentile(self, percent: float) -> float | None:
+        """Значение перцентиля в миллисекундах (верхняя граница корзины)"""
+        if not self.count:
+            return None
+        target = max(math.ceil(percent / 100 * self.count), 1)
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= target:
+                return min(self.bucket_range(index)[1] - 1, self.max_us) / 1000
+        return self.max_us / 1000
+
+    def count_below(self, limit_ms: float) -> int:
+        """Число значений не больше limit_ms (для корзин le у Prometheus)"""
+        limit_us = limit_ms * 1000
+        return sum(count for index, count in self.counts.items() if self.bucket_range(index)[1] - 1 <= limit_us)
+
+    def merge(self, other: "LatencyHistogram") -> None:
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total_us += other.total_us
+        self.max_us = max(self.max_us, other.max_us)
+
+    def to_dict(self) -> dict:
+        return {
+            "counts": {str(index): count for index, count in self.counts.items()},
+            "count": self.count,
+            "total_us": self.total_us,
+            "max_us": self.max_us,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "LatencyHistogram":
+        histogram = cls()
+        histogram.counts = {int(index): count for index, count in data["counts"].items()}
+        histogram.count = data["count"]
+        histogram.total_us = data["total_us"]
+        histogram.max_us = data["max_us"]
+        return histogram
+
+
+class FingerprintStats:
+    """Счётчики одного отпечатка запроса на одном узле"""
+
+    __slots__ = ("fingerprint", "node", "calls", "errors", "timeouts", "rows", "latency")
+
+    def __init__(self, fingerprint: str, node: str):
+        self.fingerprint = fingerprint
+        self.node = node
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.rows = 0
+        self.latency = LatencyHistogram()
+
+    def summary(self) -> dict:
+        latency = self.latency
+        return {
+            "fingerprint": self.fingerprint,
+            "node": self.node,
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "rows": self.rows,
+            "total_ms": round(latency.total_us / 1000, 2),
+            "mean_ms": round(latency.total_us / 1000 / latency.count, 3) if latency.count else None,
+            "p50_ms": latency.percentile(50),
+            "p95_ms": latency.percentile(95),
+            "p99_ms": latency.percentile(99),
+            "max_ms": latency.max_us / 1000,
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "fingerprint": self.fingerprint,
+            "node": self.node,
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "rows": self.rows,
+            "latency": self.latency.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "FingerprintStats":
+        stats = cls(data["fingerprint"], data["node"])
+        stats.calls, stats.errors, stats.rows = data["calls"], data["errors"], data["rows"]
+        stats.timeouts = data.get("timeouts", 0)
+        stats.latency = LatencyHistogram.from_dict(data["latency"])
+        return stats
+
+
+# Границы корзин гистограммы для Prometheus, в секундах
+PROMETHEUS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class QueryStats(Sink):
+    """
+    Приёмник инструментирования: задержки, число вызовов, строк, ошибок и таймаутов
+    по отпечатку запроса и узлу. Снимок можно периодически сохранять в JSON-файл,
+    чтобы `cli.py stats` показал статистику работающих процессов.
+
+    Считает все запросы: QUERY_LOG_SAMPLE_RATE ограничивает только журнал.
+    """
+
+    sampled = False
+    _shared: "QueryStats | None" = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, export_path: str | None = None, export_interval: float = 10.0):
+        """
+        :param export_path: файл снимка; {pid} заменяется на номер процесса
+        :param export_interval: период сохранения снимка в секундах
+        """
+        self.export_path = export_path.replace("{pid}", str(os.getpid())) if export_path else None
+        self.export_interval = export_interval
+        self.started_at = time.time()
+        self._entries: dict[tuple[str, str], FingerprintStats] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: threading.Thread | None = None
+
+    @classmethod
+    def shared(cls, **options) -> "QueryStats":
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(**options)
+                if cls._shared.export_path:
+                    cls._shared.start_export()
+            return cls._shared
+
+    def after(self, event: QueryEvent) -> None:
+        key = (fingerprint(event.query), event.node)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._entries[key] = FingerprintStats(*key)
+            entry.calls += 1
+            if event.error is not None:
+                entry.errors += 1
+                if event.timed_out:
+                    entry.timeouts += 1
+            elif event.rowcount is not None and event.rowcount > 0:
+                entry.rows += event.rowcount
+            entry.latency.record(event.elapsed_ms)
+
+    def entries(self) -> list[FingerprintStats]:
+        with self._lock:
+            return [FingerprintStats.from_dict(entry.to_dict()) for entry in self._entries.values()]
+
+    def reset(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self.started_at = time.time()
+
+    def to_json(self) -> dict:
+        with self._lock:
+            entries = [entry.to_dict() for entry in self._entries.values()]
+        return {"pid": os.getpid(), "started_at": self.started_at, "exported_at": time.time(), "entries": entries}
+
+    def export(self) -> None:
+        """Атомарно записывает снимок в export_path"""
+        if not self.export_path:
+            return
+        tmp_path = f"{self.export_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.to_json(), f, ensure_ascii=False)
+        os.replace(tmp_path, self.export_path)
+
+    def start_export(self) -> None:
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._export_loop, name="query-stats-export", daemon=True)
+        self._thread.start()
+        atexit.register(self.export)
+
+    def _export_loop(self) -> None:
+        while not self._stop.wait(self.export_interval):
+            try:
+                self.export()
+            except OSError as e:
+                print(f"Error exporting query stats: {e}")
+
+
+def load_exports(pattern: str) -> list[FingerprintStats]:
+    """
+    Читает снимки всех процессов по шаблону пути ({pid} — любой процесс)
+    и складывает статистику одинаковых отпечатков на одном узле.
+    """
+    merged: dict[tuple[str, str], FingerprintStats] = {}
+    for path in sorted(glob.glob(pattern.replace("{pid}", "*"))):
+        try:
+            with open(path, encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            continue
+        for item in data["entries"]:
+            stats = FingerprintStats.from_dict(item)
+            key = (stats.fingerprint, stats.node)
+            if key not in merged:
+                merged[key] = stats
+                continue
+            target = merged[key]
+            target.calls += stats.calls
+            target.errors += stats.errors
+            target.timeouts += stats.timeouts
+            target.rows += stats.rows
+            target.latency.merge(stats.latency)
+    return list(merged.values())
+
+
+def _label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def to_prometheus(entries: list[FingerprintStats]) -> str:
+    """Статистика в текстовом формате Prometheus"""
+    lines = [
+        "# HELP pg_client_query_duration_seconds Query latency by fingerprint and node",
+        "# TYPE pg_client_query_duration_seconds histogram",
+    ]
+    for entry in entries:
+        labels = f'fingerprint="{_label(entry.fingerprint)}",node="{_label(entry.node)}"'
+        for limit in PROMETHEUS_BUCKETS:
+            count = entry.latency.count_below(limit * 1000)
+            lines.append(f'pg_client_query_duration_seconds_bucket{{{labels},le="{limit}"}} {count}')
+        lines.append(f'pg_client_query_duration_seconds_bucket{{{labels},le="+Inf"}} {entry.latency.count}')
+        lines.append(f"pg_client_query_duration_seconds_sum{{{labels}}} {entry.latency.total_us / 1e6}")
+        lines.append(f"pg_client_query_duration_seconds_count{{{labels}}} {entry.latency.count}")
+
+    for name, attribute, help_text in (
+        ("pg_client_query_calls_total", "calls", "Executed queries"),
+        ("pg_client_query_errors_total", "errors", "Failed queries"),
+        ("pg_client_query_timeouts_total", "timeouts", "Queries cancelled by deadline or lock timeout"),
+        ("pg_client_query_rows_total", "rows", "Rows returned or affected"),
+    ):
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} counter")
+        for entry in entries:
+            labels = f'fingerprint="{_label(entry.fingerprint)}",node="{_label(entry.node)}"'
+            lines.append(f"{name}{{{labels}}} {getattr(entry, attribute)}")
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,137 @@
+import keyword
+from functools import lru_cache
+from typing import Any, Callable, Sequence
+
+
+# dict     — список словарей (формат по умолчанию, совместим с окнами)
+# tuple    — список кортежей с общим индексом колонок (Rows)
+# record   — объекты класса со __slots__, один класс на набор колонок
+# columnar — словарь {колонка: список значений}
+ROW_FORMATS = ("dict", "tuple", "record", "columnar")
+
+
+def check_row_format(row_format: str) -> str:
+    if row_format not in ROW_FORMATS:
+        raise ValueError(f"Неизвестный формат строк: {row_format} (допустимы: {', '.join(ROW_FORMATS)})")
+    return row_format
+
+
+class Rows(list):
+    """
+    Результат в формате tuple: строки — обычные кортежи из драйвера,
+    имена колонок хранятся один раз на весь результат.
+    """
+
+    def __init__(self, rows: Sequence[tuple], columns: Sequence[str]):
+        super().__init__(rows)
+        self.columns = tuple(columns)
+        self.index = {name: i for i, name in enumerate(self.columns)}
+
+    def column(self, name: str) -> list:
+        """Значения одной колонки"""
+        i = self.index[name]
+        return [row[i] for row in self]
+
+    def as_dicts(self) -> list[dict]:
+        return [dict(zip(self.columns, row)) for row in self]
+
+
+class Record:
+    """
+    Базовый класс строк формата record. Атрибуты лежат в __slots__, поэтому
+    строка занимает меньше памяти, чем словарь, а доступ row.name не ищет по хешу.
+    Доступны также row["name"] и row[0].
+    """
+
+    __slots__ = ()
+    _fields: tuple[str, ...] = ()
+    _columns: tuple[str, ...] = ()
+
+    def __getitem__(self, key: int | str) -> Any:
+        if isinstance(key, int):
+            return getattr(self, self._fields[key])
+        return getattr(self, self._fields[self._columns.index(key)])
+
+    def __iter__(self):
+        return (getattr(self, name) for name in self._fields)
+
+    def __len__(self) -> int:
+        return len(self._fields)
+
+    def __eq__(self, other) -> bool:
+        if isinstance(other, Record):
+            return self._columns == other._columns and tuple(self) == tuple(other)
+        return NotImplemented
+
+    def __repr__(self) -> str:
+        values = ", ".join(f"{name}={value!r}" for name, value in zip(self._fields, self))
+        return f"{type(self).__name__}({values})"
+
+    def _asdict(self) -> dict:
+        return dict(zip(self._columns, self))
+
+
+def _field_names(columns: Sequence[str]) -> tuple[str, ...]:
+    """
+    Имена атрибутов для колонок. Колонки, имя которых не годится для атрибута
+    (?column?, ключевые слова, повторы при JOIN), получают имя _<номер>, как в namedtuple.
+    """
+    names, seen = [], set()
+    for i, name in enumerate(columns):
+        if not name.isidentifier() or keyword.iskeyword(name) or name.startswith("_") or name in seen:
+            name = f"_{i}"
+        seen.add(name)
+        names.append(name)
+    return tuple(names)
+
+
+@lru_cache(maxsize=256)
+def record_class(columns: tuple[str, ...]) -> type[Record]:
+    """Класс строки для набора колонок; для одинаковых запросов возвращается один и тот же класс"""
+    fields = _field_names(columns)
+    # Конструктор генерируется, чтобы заполнять слоты без цикла по полям
+    args = ", ".join(f"v{i}" for i in range(len(fields)))
+    body = "\n".join(f"    self.{name} = v{i}" for i, name in enumerate(fields)) or "    pass"
+    namespace: dict = {}
+    exec(f"def __init__(self, {args}):\n{body}", namespace)
+
+    return type("Row", (Record,), {
+        "__slots__": fields,
+        "__init__": namespace["__init__"],
+        "_fields": fields,
+        "_columns": columns,
+    })
+
+
+def row_factory(columns: Sequence[str], row_format: str) -> Callable[[tuple], Any]:
+    """Преобразование одного кортежа из драйвера в строку формата row_format (кроме columnar)"""
+    columns = tuple(columns)
+    if row_format == "dict":
+        return lambda row: dict(zip(columns, row))
+    if row_format == "tuple":
+        return tuple
+    if row_format == "record":
+        cls = record_class(columns)
+        return lambda row: cls(*row)
+    raise ValueError(f"Формат {row_format} не поддерживает построчную выдачу")
+
+
+def format_rows(rows: list[tuple], columns: Sequence[str], row_format: str = "dict"):
+    """
+    Собирает результат запроса в нужном формате.
+
+    :param rows: кортежи, полученные от обычного (не Dict) курсора
+    :param columns: имена колонок из cursor.description
+    """
+    if row_format == "tuple":
+        return Rows(rows, columns)
+    if row_format == "columnar":
+        if not rows:
+            return {name: [] for name in columns}
+        return dict(zip(columns, map(list, zip(*rows))))
+    make_row = row_factory(columns, row_format)
+    return [make_row(row) for row in rows]
+
+
+def column_names(cursor) -> tuple[str, ...]:
+    return tuple(column.name for column in cursor.description)
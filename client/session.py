@@ -0,0 +1,46 @@
+import threading
+
+
+def lsn_to_int(lsn: str) -> int:
+    """Переводит позицию WAL вида '16/B374D848' в число для сравнения"""
+    high, _, low = lsn.partition('/')
+    return (int(high, 16) << 32) + int(low, 16)
+
+
+class Session:
+    """
+    Токен сессии для режима read-your-writes: наибольшая позиция WAL мастера,
+    полученная после записей этой сессии. Чтение с реплики допустимо только
+    когда подписка реплики применила WAL до этой позиции.
+    """
+
+    _default: "Session | None" = None
+    _default_lock = threading.Lock()
+
+    def __init__(self):
+        self._lsn: str | None = None
+        self._lsn_value = 0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def default(cls) -> "Session":
+        """Общая сессия процесса: все окна GUI видят записи друг друга"""
+        with cls._default_lock:
+            if cls._default is None:
+                cls._default = cls()
+            return cls._default
+
+    @property
+    def lsn(self) -> str | None:
+        return self._lsn
+
+    def advance(self, lsn: str) -> None:
+        """Запоминает позицию WAL после записи, если она новее текущей"""
+        value = lsn_to_int(lsn)
+        with self._lock:
+            if value > self._lsn_value:
+                self._lsn, self._lsn_value = lsn, value
+
+    def reset(self) -> None:
+        with self._lock:
+            self._lsn, self._lsn_value = None, 0
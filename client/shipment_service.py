@@ -0,0 +1,100 @@
+from psycopg2 import errors
+
+from sql_manager import PostgreSQLManager
+
+
+# Сборка выдачи одним запросом: блокирует выдачу, блокирует товары в порядке id
+# (параллельные сборки ждут друг друга в одном порядке), проверяет остатки и, только если хватает
+# всех товаров, списывает их и переводит выдачу в PREPARED. Запрос выполняется
+# в одной транзакции, поэтому частичного списания не бывает.
+# Товары блокируются FOR UPDATE, а не FOR NO KEY UPDATE. Более слабая блокировка совместима
+# с FOR KEY SHARE, которую по внешнему ключу берут вставки в shipment_items, и тогда блокировку
+# строки держит мультитранзакция. Повторно блокируя такую строку в UPDATE, сборка не узнаёт
+# в ней свою блокировку и встаёт в очередь за сборкой, которая сама ждёт её, — взаимоблокировка,
+# от которой порядок по id не спасает. FOR UPDATE несовместима с FOR KEY SHARE: вставки
+# ждут сборку, а не делят с ней строку. Выдача блокируется FOR NO KEY UPDATE: её строки
+# в shipment_items к сборке уже вставлены.
+# Возвращает одну строку-сводку и по строке на каждый недостающий товар.
+PREPARE_SHIPMENT_QUERY = """
+WITH shipment AS (
+    SELECT id FROM shipments
+    WHERE id = %(shipment_id)s AND status = 'PENDING'
+    FOR NO KEY UPDATE
+),
+lines AS (
+    SELECT si.item_id, si.quantity
+    FROM shipment_items si
+    JOIN shipment s ON s.id = si.shipment_id
+),
+stock AS (
+    SELECT i.id, i.quantity FROM items i
+    WHERE i.id IN (SELECT item_id FROM lines)
+    ORDER BY i.id
+    FOR UPDATE
+),
+short AS (
+    SELECT l.item_id, l.quantity AS requested, COALESCE(st.quantity, 0) AS available
+    FROM lines l
+    LEFT JOIN stock st ON st.id = l.item_id
+    WHERE COALESCE(st.quantity, 0) < l.quantity
+),
+taken AS (
+    UPDATE items i SET quantity = i.quantity - l.quantity
+    FROM lines l
+    WHERE i.id = l.item_id AND i.quantity >= l.quantity
+      AND NOT EXISTS (SELECT 1 FROM short)
+    RETURNING i.id
+),
+prepared AS (
+    UPDATE shipments SET status = 'PREPARED'
+    WHERE id = (SELECT id FROM shipment)
+      AND NOT EXISTS (SELECT 1 FROM short)
+    RETURNING id
+)
+SELECT
+    (SELECT count(*) FROM shipment) AS found,
+    (SELECT count(*) FROM prepared) AS prepared,
+    sh.item_id, sh.requested, sh.available
+FROM (SELECT 1) AS one
+LEFT JOIN short sh ON true
+ORDER BY sh.item_id
+"""
+
+# Сколько раз повторить сборку, прерванную взаимоблокировкой или конфликтом сериализации.
+# Повтор безопасен: запрос откатывается целиком и ничего не списывает
+PREPARE_RETRIES = 3
+RETRY_ERRORS = (errors.DeadlockDetected, errors.SerializationFailure)
+
+
+class ShipmentService:
+    """Операции с выдачами, которые должны выполняться атомарно на мастере"""
+
+    def __init__(self, manager: PostgreSQLManager | None = None):
+        self.manager = manager or PostgreSQLManager()
+
+    def prepare(self, shipment_id: int) -> list[dict]:
+        """
+        Собирает выдачу: списывает со склада все её товары и переводит её в PREPARED
+        за один запрос и одну транзакцию. Прерванная взаимоблокировкой или конфликтом
+        сериализации сборка повторяется до PREPARE_RETRIES раз.
+
+        :return: товары, которых не хватает ({item_id, requested, available});
+            пустой список — выдача собрана. Если чего-то не хватает, ничего не списывается
+        :raises ValueError: если выдача не найдена или уже не в статусе PENDING
+        """
+        for attempt in range(PREPARE_RETRIES + 1):
+            try:
+                rows = self.manager.execute_query(
+                    PREPARE_SHIPMENT_QUERY, params={"shipment_id": shipment_id}, fetch=True,
+                    use_cache=False, row_format="dict"
+                )
+                break
+            except RETRY_ERRORS:
+                if attempt == PREPARE_RETRIES:
+                    raise
+        if not rows[0]["found"]:
+            raise ValueError(f"Выдача {shipment_id} не найдена или уже собрана")
+        return [
+            {"item_id": row["item_id"], "requested": row["requested"], "available": row["available"]}
+            for row in rows if row["item_id"] is not None
+        ]
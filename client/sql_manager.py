@@ -1,109 +1,1045 @@
+from contextlib import contextmanager
+from functools import partial
+from typing import Iterable, Iterator
+import itertools
+import math
 import psycopg2
-from psycopg2.extras import DictCursor
-from config import MASTER_CONFIG, REPLICA_CONFIG
+from psycopg2 import extensions, sql
+from psycopg2.extras import execute_values
+from config import (
+    MASTER_CONFIG,
+    REPLICA_CONFIGS,
+    POOL_CONFIG,
+    READ_BALANCING_POLICY,
+    BREAKER_CONFIG,
+    HEARTBEAT_INTERVAL,
+    MAX_STALENESS,
+    READ_YOUR_WRITES,
+    LSN_WAIT_TIMEOUT,
+    SUBSCRIPTION_NAME,
+    QUERY_CACHE_ENABLED,
+    QUERY_CACHE_CONFIG,
+    LISTEN_CHANGES,
+    CHANGE_CHANNEL,
+    STREAM_FETCH_SIZE,
+    BATCH_PAGE_SIZE,
+    QUERY_LOG,
+    QUERY_LOG_SAMPLE_RATE,
+    QUERY_LOG_PARAMS,
+    QUERY_STATS,
+    QUERY_STATS_FILE,
+    QUERY_STATS_INTERVAL,
+    HEDGE_READS,
+    HEDGE_CONFIG,
+    QUERY_TIMEOUT,
+    QUERY_CANCEL_GRACE,
+    LOCK_TIMEOUT,
+)
+from cancellation import CancelScope, Deadline, Scheduler, timeout_error
+from change_listener import ChangeListener
+from connection_pool import PoolTimeoutError
+from copy_stream import CopyStream
+from hedging import HedgePolicy, HedgeRace
+from heartbeat import HeartbeatMonitor
+from instrumentation import Instrumentation
+from load_balancer import BalancingPolicy, LoadBalancer, Node, NodeUnavailableError, is_node_failure
+from query_cache import QueryCache, tables_read, tables_written
+from query_stats import QueryStats
+from row_formats import check_row_format, column_names, format_rows, row_factory
+from session import Session, lsn_to_int
+from sql_parser import classify, split_statements, statement_preview
+import re
 import time
 
 
+# Позиция WAL мастера, до которой подписка реплики применила изменения
+APPLIED_LSN_QUERY = """
+SELECT latest_end_lsn AS lsn FROM pg_stat_subscription
+WHERE subname = %s AND relid IS NULL
+"""
+
+LSN_POLL_INTERVAL = 0.01
+
+# Запрос пакетной вставки вида INSERT ... VALUES %s (для execute_values)
+_VALUES_PLACEHOLDER = re.compile(r"\bvalues\s+%s", re.IGNORECASE)
+
+# Уникальные имена серверных курсоров в пределах процесса
+_cursor_names = itertools.count()
+
+
+class ReadOnlyModeError(NodeUnavailableError):
+    """Мастер недоступен: запросы на изменение отклоняются, пока он не вернётся в работу"""
+
+
 class PostgreSQLManager:
-    def __init__(self):
+    def __init__(
+        self,
+        pool_config: dict | None = None,
+        replica_configs: list[dict] | None = None,
+        balancing_policy: str | BalancingPolicy | None = None,
+        max_staleness: float | None = MAX_STALENESS,
+        read_your_writes: bool = READ_YOUR_WRITES,
+        session: Session | None = None,
+        query_cache: QueryCache | bool | None = None,
+        listen_changes: bool = LISTEN_CHANGES,
+        row_format: str = "dict",
+        instrumentation: Instrumentation | bool | None = None,
+        hedge_reads: bool = HEDGE_READS,
+        timeout: float | None = QUERY_TIMEOUT
+    ):
+        """
+        :param pool_config: параметры пулов соединений (по умолчанию POOL_CONFIG)
+        :param replica_configs: список реплик для чтения (по умолчанию REPLICA_CONFIGS);
+            в конфигурации реплики можно указать weight и name
+        :param balancing_policy: политика балансировки чтения или её имя
+        :param max_staleness: допустимое отставание реплики в секундах для всех чтений
+        :param read_your_writes: режим сессионной согласованности: чтение после записи
+            ждёт, пока реплика применит WAL записи, или идёт на мастер
+        :param session: сессия с позицией последней записи (по умолчанию общая для процесса)
+        :param query_cache: кэш результатов чтения; None — общий кэш процесса, если он включён
+            в конфигурации (QUERY_CACHE), False — без кэша
+        :param listen_changes: слушать уведомления об изменениях таблиц на репликах,
+            чтобы сбрасывать кэш при записях из других процессов и оповещать окна
+        :param row_format: формат строк результата по умолчанию: dict, tuple, record
+            или columnar (см. row_formats.py)
+        :param instrumentation: инструментирование запросов; None — общее для процесса,
+            если оно включено в конфигурации (QUERY_LOG), False — выключено
+        :param hedge_reads: хеджировать чтение с реплик по умолчанию (см. HedgePolicy)
+        :param timeout: срок execute_query по умолчанию в секундах (None — без ограничения)
+        """
+        pool_config = POOL_CONFIG if pool_config is None else pool_config
+        replica_configs = REPLICA_CONFIGS if replica_configs is None else replica_configs
+
+        # Пулы общие для всего процесса: каждое окно создаёт свой менеджер,
+        # но соединения к одному узлу переиспользуются
         self.master_config = MASTER_CONFIG
-        self.replica_config = REPLICA_CONFIG
+        self.master_node = Node("master", self.master_config, pool_config, breaker_config=BREAKER_CONFIG)
+        self.master_pool = self.master_node.pool
+
+        self.replica_nodes = []
+        for i, replica_config in enumerate(replica_configs, start=1):
+            config = dict(replica_config)
+            weight = config.pop("weight", 1)
+            name = config.pop("name", "replica" if len(replica_configs) == 1 else f"replica-{i}")
+            self.replica_nodes.append(
+                Node(name, config, pool_config, weight=weight, breaker_config=BREAKER_CONFIG)
+            )
+
+        self.replica_config = self.replica_nodes[0].config
+        self.replica_pool = self.replica_nodes[0].pool
+        self.balancer = LoadBalancer(
+            self.replica_nodes,
+            policy=balancing_policy or READ_BALANCING_POLICY
+        )
+
+        self.max_staleness = max_staleness
+        self.heartbeat = HeartbeatMonitor.shared(
+            self.master_node, self.replica_nodes, interval=HEARTBEAT_INTERVAL
+        )
+        if max_staleness is not None:
+            self.heartbeat.start()
+
+        self.read_your_writes = read_your_writes
+        self.session = Session.default() if session is None else session
+        self._applied_lsn: dict[str, int] = {}  # последняя известная применённая позиция WAL реплик
+
+        if query_cache is None:
+            query_cache = QueryCache.shared(**QUERY_CACHE_CONFIG) if QUERY_CACHE_ENABLED else False
+        self.query_cache = query_cache or None
+
+        self.row_format = check_row_format(row_format)
+        self.timeout = timeout or None
+
+        if instrumentation is None:
+            instrumentation = Instrumentation.shared(
+                QUERY_LOG,
+                sample_rate=QUERY_LOG_SAMPLE_RATE,
+                capture_params=QUERY_LOG_PARAMS
+            )
+            if QUERY_STATS and instrumentation.sink(QueryStats) is None:
+                instrumentation.add_sink(
+                    QueryStats.shared(export_path=QUERY_STATS_FILE, export_interval=QUERY_STATS_INTERVAL)
+                )
+        # Выключенное инструментирование хранится как None: на пути запроса — одна проверка
+        self.instrumentation = instrumentation if instrumentation and instrumentation.enabled else None
+        self.query_stats = self.instrumentation.sink(QueryStats) if self.instrumentation else None
+
+        # Политика общая для процесса: бюджет хеджирования и задержки считаются по всем окнам
+        self.hedging = HedgePolicy.shared(**HEDGE_CONFIG) if hedge_reads else None
+
+        self.change_listener = None
+        if listen_changes:
+            self.change_listener = ChangeListener.shared(
+                self.replica_nodes, channel=CHANGE_CHANNEL, cache=self.query_cache
+            )
+            self.change_listener.start()
 
     def execute_query(
         self,
         query: str,
         use_replica: bool = False,
         params: tuple | dict | None = None,
-        fetch: bool = False
-    ) -> list[dict] | int | None:
+        fetch: bool = False,
+        use_master: bool = False,
+        max_staleness: float | None = None,
+        min_lsn: str | None = None,
+        use_cache: bool = True,
+        row_format: str | None = None,
+        hedge: bool | None = None,
+        timeout: float | Deadline | None = None
+    ) -> list | dict | int | None:
         """
-        Выполняет SQL запрос. SELECT автоматически идёт на реплику.
+        Выполняет SQL запрос. Читающие запросы (см. sql_parser.classify) автоматически идут на реплику.
+        Пока мастер недоступен (см. read_only), чтение продолжает работать на репликах,
+        а запросы на изменение сразу получают ReadOnlyModeError.
 
         :param query: SQL запрос
         :param use_replica: принудительно использовать реплику
         :param params: параметры для запроса
         :param fetch: возвращать результат (только для SELECT)
+        :param use_master: выполнить читающий запрос на мастере (без отставания реплик и без кэша)
+        :param max_staleness: допустимое отставание реплики в секундах для этого запроса;
+            если все реплики отстают сильнее, запрос выполняется на мастере
+        :param min_lsn: позиция WAL мастера, которую реплика должна применить перед чтением;
+            в режиме read_your_writes по умолчанию берётся из сессии
+        :param use_cache: брать SELECT из кэша результатов, если кэш включён
+        :param row_format: формат строк для этого запроса (по умолчанию self.row_format);
+            кэш результатов используется только для формата dict
+        :param hedge: хеджировать чтение: если реплика отвечает дольше обычного, отправить
+            запрос второй реплике и взять первый ответ (по умолчанию — как настроен менеджер)
+        :param timeout: срок запроса в секундах или общий Deadline нескольких запросов
+            (None — срок менеджера, 0 — без ограничения). Срок ограничивает ожидание соединения,
+            передаётся серверу как statement_timeout, а по его истечении запрос отменяется
         :return: результаты запроса или количество изменённых строк
+        :raises QueryTimeoutError: если запрос не уложился в срок
         """
         # Автоматическое определение типа запроса
         query = query.strip()
-        if not use_replica and query.lower().startswith("select"):
+        # Читающие запросы (SELECT, WITH ... SELECT, VALUES без блокировок и побочных эффектов)
+        is_select = classify(query).read_only
+        if not use_replica and not use_master and is_select:
             use_replica = True
 
-        config = self.replica_config if use_replica else self.master_config
-        result = None
+        row_format = self.row_format if row_format is None else check_row_format(row_format)
+        # Хеджировать можно только чтение: повторная отправка не должна ничего менять
+        hedge = (self.hedging is not None if hedge is None else hedge) and is_select
+
+        # Токен чужой сессии может быть новее, чем закэшированный результат
+        use_cache = (
+            use_cache and self.query_cache is not None and is_select and not use_master
+            and min_lsn is None and row_format == "dict"
+        )
+
+        if max_staleness is None:
+            max_staleness = self.max_staleness
+        if min_lsn is None and self.read_your_writes:
+            min_lsn = self.session.lsn
+        deadline = self.deadline(self.timeout if timeout is None else timeout)
 
         try:
-            with psycopg2.connect(**config, cursor_factory=DictCursor) as conn:
+            if use_replica and use_cache:
+                return self._execute_cached(query, params, fetch, max_staleness, min_lsn, hedge, deadline)
+            if use_replica:
+                return self._execute_on_replica(
+                    query, params, fetch, max_staleness, min_lsn, row_format, hedge, deadline
+                )
+            if is_select:
+                # Чтение с мастера доступно и в режиме только для чтения
+                return self._execute_on_master(query, params, fetch, row_format=row_format, deadline=deadline)
+
+            self._check_writable()
+            result = self._execute_on_master(
+                query, params, fetch, track_lsn=self.read_your_writes, row_format=row_format,
+                deadline=deadline
+            )
+            if self.query_cache is not None:
+                self.query_cache.invalidate(tables_written(query))
+            return result
+        except psycopg2.Error as e:
+            print(f"Error executing query: {e}")
+            raise
+
+    def _execute_on_master(
+        self,
+        query: str,
+        params: tuple | dict | None,
+        fetch: bool,
+        track_lsn: bool = False,
+        row_format: str = "dict",
+        deadline: Deadline | None = None
+    ) -> list | dict | int | None:
+        with self.balancer.track(self.master_node):
+            return self._execute(
+                self.master_node, query, params, fetch, track_lsn, row_format, deadline=deadline
+            )
+
+    def _execute_on_replica(
+        self,
+        query: str,
+        params: tuple | dict | None,
+        fetch: bool,
+        max_staleness: float | None = None,
+        min_lsn: str | None = None,
+        row_format: str = "dict",
+        hedge: bool = False,
+        deadline: Deadline | None = None
+    ) -> list | dict | int | None:
+        """
+        Выполняет запрос на реплике, выбранной балансировщиком; при отказе узла пробует следующую,
+        а если доступных реплик не осталось — мастер.
+        С max_staleness выбираются только достаточно свежие реплики, а если таких нет — мастер.
+        С min_lsn чтение ждёт (не дольше LSN_WAIT_TIMEOUT), пока реплика применит эту позицию WAL,
+        иначе выполняется на мастере. Если мастер недоступен, ограничения свежести
+        не соблюдаются: лучше отдать устаревшие данные, чем ошибку.
+        С hedge чтение хеджируется (см. _execute_hedged).
+        """
+        if hedge:
+            return self._execute_hedged(query, params, fetch, max_staleness, min_lsn, row_format, deadline)
+
+        tried = []
+        while True:
+            node = self.choose_replica(max_staleness, min_lsn, exclude=tried) or self._fallback_node(tried)
+            if node is self.master_node:
+                return self._execute_on_master(query, params, fetch, row_format=row_format, deadline=deadline)
+            try:
+                with self.balancer.track(node):
+                    return self._execute(node, query, params, fetch, row_format=row_format, deadline=deadline)
+            except Exception as e:
+                if not is_node_failure(e):
+                    raise
+                # Узел не отвечает — повторяем на другой реплике или на мастере
+                tried.append(node)
+
+    def _execute_hedged(
+        self,
+        query: str,
+        params: tuple | dict | None,
+        fetch: bool,
+        max_staleness: float | None = None,
+        min_lsn: str | None = None,
+        row_format: str = "dict",
+        deadline: Deadline | None = None
+    ) -> list | dict | int | None:
+        """
+        Хеджированное чтение: запрос выполняется на первой реплике, и если она не ответила
+        за задержку HedgePolicy.delay(), он отправляется и второй (в пределах бюджета
+        хеджирования). Берётся первый успешный ответ, проигравший запрос отменяется на сервере.
+        Если реплика не ответила из-за отказа узла, чтение повторяется обычным путём.
+        """
+        hedging = self.hedging or HedgePolicy.shared(**HEDGE_CONFIG)
+        primary = self.choose_replica(max_staleness, min_lsn)
+        if primary is None:
+            return self._execute_on_replica(
+                query, params, fetch, max_staleness, min_lsn, row_format, deadline=deadline
+            )
+
+        race = HedgeRace()
+        primary_scope = race.enter()
+
+        def hedge() -> None:
+            try:
+                if not race.start_hedge():
+                    return
+                second = self.choose_replica(max_staleness, min_lsn, exclude=[primary])
+                if second is None:
+                    hedging.count("no_candidate")
+                    return
+                if not hedging.try_hedge():
+                    return
+                scope = race.enter()
+                if scope is None:
+                    return
+                try:
+                    result = self._hedge_attempt(
+                        hedging, second, query, params, fetch, row_format, scope, deadline
+                    )
+                except Exception:
+                    return
+                cancelled = race.finish(scope, result)
+                if cancelled is not None:
+                    hedging.count("hedge_wins")
+                    hedging.count("cancelled", cancelled)
+            finally:
+                race.hedge_done.set()
+
+        timer = hedging.schedule(hedging.delay(query), hedge)
+        try:
+            result = self._hedge_attempt(
+                hedging, primary, query, params, fetch, row_format, primary_scope, deadline
+            )
+        except Exception as e:
+            timer.cancel()
+            if race.close():
+                race.hedge_done.wait()
+            # Основной запрос отменён, потому что второй ответил раньше
+            if race.winner is not None and race.winner is not primary_scope:
+                return race.result
+            if is_node_failure(e):
+                return self._execute_on_replica(
+                    query, params, fetch, max_staleness, min_lsn, row_format, deadline=deadline
+                )
+            raise
+
+        timer.cancel()
+        race.close()
+        cancelled = race.finish(primary_scope, result)
+        if cancelled:
+            hedging.count("cancelled", cancelled)
+        return race.result
+
+    def _hedge_attempt(
+        self,
+        hedging: HedgePolicy,
+        node: Node,
+        query: str,
+        params: tuple | dict | None,
+        fetch: bool,
+        row_format: str,
+        scope: CancelScope,
+        deadline: Deadline | None = None
+    ) -> list | dict | int | None:
+        start = time.perf_counter()
+        with self.balancer.track(node):
+            result = self._execute(
+                node, query, params, fetch, row_format=row_format, scope=scope, deadline=deadline
+            )
+        hedging.observe(query, (time.perf_counter() - start) * 1000)
+        return result
+
+    def _fallback_node(self, exclude: list[Node] | tuple = ()) -> Node:
+        """
+        Узел для чтения, когда подходящей реплики нет: мастер, а в режиме только
+        для чтения — любая доступная реплика, даже отстающая
+        """
+        if self.master_node.healthy:
+            return self.master_node
+        return self.balancer.choose(exclude=exclude) or self.master_node
+
+    @property
+    def read_only(self) -> bool:
+        """
+        Режим только для чтения: выключатель мастера разомкнут после отказов.
+        Мастер возвращается в работу после успешной пробы или проверки heartbeat.
+        """
+        return not self.master_node.healthy
+
+    def _check_writable(self) -> None:
+        """
+        :raises ReadOnlyModeError: если мастер недоступен
+        """
+        if self.read_only:
+            raise ReadOnlyModeError(
+                "Мастер недоступен, база данных в режиме только для чтения "
+                f"(повторная попытка через {self.master_node.breaker.retry_in():.1f} с)"
+            )
+
+    def choose_replica(
+        self,
+        max_staleness: float | None = None,
+        min_lsn: str | None = None,
+        exclude: list[Node] | tuple = ()
+    ) -> Node | None:
+        """
+        Выбирает реплику для чтения с учётом допустимого отставания и позиции WAL сессии.
+        None — подходящей реплики нет, читать нужно с мастера.
+        """
+        fresh = None
+        if max_staleness is not None:
+            self.heartbeat.start()
+            fresh = partial(self.is_fresh, max_staleness=max_staleness)
+
+        node = self.balancer.choose(exclude=exclude, eligible=fresh)
+        if node is None:
+            return None
+        if min_lsn is not None and not self.wait_for_lsn(node, min_lsn):
+            return None
+        return node
+
+    def _execute_cached(
+        self,
+        query: str,
+        params: tuple | dict | None,
+        fetch: bool,
+        max_staleness: float | None = None,
+        min_lsn: str | None = None,
+        hedge: bool = False,
+        deadline: Deadline | None = None
+    ) -> list[dict]:
+        """
+        Отдаёт результат чтения из кэша, а при промахе читает с реплики и кэширует.
+
+        Если таблицы запроса недавно менялись, отстающая реплика может ещё не содержать
+        изменение, и в кэш попали бы строки до него. Поэтому при промахе допустимое
+        отставание ограничивается временем с последней инвалидации: читаются только
+        реплики, которые по heartbeat уже догнали запись, иначе мастер.
+        """
+        key = self.query_cache.make_key(query, params)
+        if key is None:
+            return self._execute_on_replica(
+                query, params, fetch, max_staleness, min_lsn, hedge=hedge, deadline=deadline
+            )
+
+        rows = self.query_cache.get(key, max_age=max_staleness)
+        if rows is not None:
+            return rows
+
+        tables = tables_read(query)
+        version = self.query_cache.version(tables)
+        changed = self.query_cache.changed_since(tables)
+        if changed is not None:
+            max_staleness = changed if max_staleness is None else min(max_staleness, changed)
+        rows = self._execute_on_replica(
+            query, params, fetch, max_staleness, min_lsn, hedge=hedge, deadline=deadline
+        )
+        # Без мастера чтение идёт и с отстающей реплики — такой результат не кэшируется
+        if changed is None or not self.read_only:
+            self.query_cache.put(key, rows, tables, version)
+        return rows
+
+    def is_fresh(self, node: Node, max_staleness: float) -> bool:
+        """Проверяет по heartbeat, что данные на реплике устарели не больше чем на max_staleness секунд"""
+        staleness = self.heartbeat.staleness(node)
+        return staleness is not None and staleness <= max_staleness
+
+    def wait_for_lsn(self, node: Node, lsn: str, timeout: float = LSN_WAIT_TIMEOUT) -> bool:
+        """
+        Ждёт, пока подписка на реплике применит WAL мастера до позиции lsn.
+        Применённая позиция берётся из pg_stat_subscription.latest_end_lsn.
+
+        :return: True, если реплика догнала позицию за timeout секунд
+        """
+        target = lsn_to_int(lsn)
+        if self._applied_lsn.get(node.name, 0) >= target:
+            return True
+
+        deadline = time.monotonic() + timeout
+        try:
+            with node.pool.connection() as conn:
                 with conn.cursor() as cursor:
-                    # Логируем реальный SQL
-                    self._log_query(cursor, query, params)
+                    while True:
+                        cursor.execute(APPLIED_LSN_QUERY, (SUBSCRIPTION_NAME,))
+                        row = cursor.fetchone()
+                        conn.rollback()
+                        if row is None or row["lsn"] is None:
+                            return False
+
+                        applied = lsn_to_int(row["lsn"])
+                        if applied > self._applied_lsn.get(node.name, 0):
+                            self._applied_lsn[node.name] = applied
+                        if applied >= target:
+                            return True
+                        if time.monotonic() >= deadline:
+                            return False
+                        time.sleep(LSN_POLL_INTERVAL)
+        except psycopg2.Error:
+            return False
 
-                    # Выполняем
-                    cursor.execute(query, params)
+    @property
+    def last_write_lsn(self) -> str | None:
+        """Позиция WAL мастера после последней записи сессии (токен для min_lsn)"""
+        return self.session.lsn
+
+    def replication_lag(self) -> dict[str, dict]:
+        """Возвращает измеренное отставание реплик (запускает heartbeat, если он ещё не работает)"""
+        self.heartbeat.start()
+        return self.heartbeat.stats()
+
+    def _execute(
+        self,
+        node: Node,
+        query: str,
+        params: tuple | dict | None,
+        fetch: bool,
+        track_lsn: bool = False,
+        row_format: str = "dict",
+        scope: CancelScope | None = None,
+        deadline: Deadline | None = None
+    ) -> list | dict | int | None:
+        """
+        Выполняет запрос на соединении из пула узла.
+        С track_lsn после коммита запоминает в сессии текущую позицию WAL мастера.
+        Через scope запрос можно отменить из другого потока, deadline — срок запроса.
+        """
+        with self._checkout(node, deadline, scope) as conn:
+            # Обычный курсор отдаёт кортежи: строки собираются сразу в нужном формате,
+            # без промежуточных DictRow
+            with conn.cursor(cursor_factory=extensions.cursor) as cursor:
+                instrumentation = self.instrumentation
+                event = instrumentation.before(node.name, query, params, cursor) if instrumentation else None
+                try:
+                    # Ограничения срока уходят серверу в том же обмене, что и запрос
+                    cursor.execute(self._timeout_settings(deadline) + query, params)
 
                     # Получаем результат
-                    if fetch or query.lower().startswith("select"):
-                        result = [dict(row) for row in cursor.fetchall()]
+                    if fetch or classify(query).returns_rows:
+                        result = format_rows(cursor.fetchall(), column_names(cursor), row_format)
                     else:
                         result = cursor.rowcount
 
                     conn.commit()
+                except Exception as e:
+                    error = timeout_error(e, deadline)
+                    if event is not None:
+                        instrumentation.after(event, error=error)
+                    if error is e:
+                        raise
+                    raise error from e
+                if event is not None:
+                    instrumentation.after(event, cursor.rowcount)
+
+                if track_lsn:
+                    self._remember_lsn(conn, cursor)
+        return result
+
+    def deadline(self, timeout: float | Deadline | None) -> Deadline | None:
+        """
+        Срок для одного или нескольких запросов: число секунд, готовый Deadline
+        или None/0 — без ограничения. Например, общий срок загрузки окна:
+        deadline = manager.deadline(5); manager.execute_query(..., timeout=deadline)
+        """
+        if not timeout:
+            return None
+        return Deadline.coerce(timeout)
+
+    @contextmanager
+    def _checkout(
+        self,
+        node: Node,
+        deadline: Deadline | None = None,
+        scope: CancelScope | None = None,
+        grace: float = QUERY_CANCEL_GRACE
+    ):
+        """
+        Соединение из пула узла для одного запроса. Со сроком ожидание соединения
+        ограничено оставшимся временем, а если сервер не отменил запрос сам
+        (statement_timeout не сработал, запрос завис в сети или на COPY),
+        таймер отменяет его через grace секунд после срока.
+
+        :param grace: 0 — для вызовов из нескольких запросов (executemany, COPY),
+            где statement_timeout ограничивает каждый запрос, но не весь вызов
+        """
+        if deadline is None and scope is None:
+            with node.pool.connection() as conn:
+                yield conn
+            return
+
+        timer = None
+        try:
+            acquire_timeout = None if deadline is None else min(node.pool.acquire_timeout, deadline.check())
+            with node.pool.connection(acquire_timeout) as conn:
+                scope = scope or CancelScope()
+                with scope.attach(conn):
+                    if deadline is not None:
+                        timer = Scheduler.shared().schedule(
+                            deadline.remaining() + grace, scope.cancel
+                        )
+                    yield conn
+        except (extensions.QueryCanceledError, PoolTimeoutError) as e:
+            error = timeout_error(e, deadline)
+            if error is e:
+                raise
+            raise error from e
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+    @staticmethod
+    def _timeout_settings(deadline: Deadline | None) -> str:
+        """SET LOCAL statement_timeout (и lock_timeout, если он настроен) по оставшемуся сроку"""
+        if deadline is None:
+            return ""
+        remaining_ms = max(math.ceil(deadline.check() * 1000), 1)
+        settings = f"SET LOCAL statement_timeout = {remaining_ms}; "
+        if LOCK_TIMEOUT:
+            settings += f"SET LOCAL lock_timeout = {min(math.ceil(LOCK_TIMEOUT * 1000), remaining_ms)}; "
+        return settings
+
+    def _set_timeouts(self, conn, deadline: Deadline | None) -> None:
+        """Отдельным обменом задаёт ограничения срока для запросов, к которым их не приписать"""
+        if deadline is not None:
+            with conn.cursor() as cursor:
+                cursor.execute(self._timeout_settings(deadline))
+
+    def _remember_lsn(self, conn, cursor) -> None:
+        """Запоминает в сессии позицию WAL мастера после закоммиченной записи"""
+        cursor.execute("SELECT pg_current_wal_lsn() AS lsn")
+        self.session.advance(cursor.fetchone()[0])
+        conn.rollback()
+
+    def stream_query(
+        self,
+        query: str,
+        params: tuple | dict | None = None,
+        use_replica: bool | None = None,
+        fetch_size: int = STREAM_FETCH_SIZE,
+        max_staleness: float | None = None,
+        min_lsn: str | None = None,
+        row_format: str | None = None,
+        timeout: float | Deadline | None = None
+    ) -> Iterator:
+        """
+        Отдаёт строки результата по мере чтения через именованный (серверный) курсор:
+        с сервера забирается по fetch_size строк, поэтому память не растёт с размером
+        таблицы, а первая строка доступна до чтения последней.
+
+        Соединение занято, пока итератор не исчерпан или не закрыт.
+
+        :param use_replica: по умолчанию читающие запросы выполняются на реплике
+        :param fetch_size: сколько строк забирать с сервера за один раз
+        :param row_format: dict, tuple или record (columnar для потока не подходит)
+        :param timeout: срок всего потока в секундах или Deadline (по умолчанию без ограничения):
+            каждое чтение с сервера получает оставшееся время, а по истечении срока запрос отменяется
+        """
+        row_format = self.row_format if row_format is None else check_row_format(row_format)
+        if row_format == "columnar":
+            raise ValueError("Формат columnar не поддерживается потоковым чтением")
+        query = query.strip()
+        if use_replica is None:
+            use_replica = classify(query).read_only
+        if max_staleness is None:
+            max_staleness = self.max_staleness
+        if min_lsn is None and self.read_your_writes:
+            min_lsn = self.session.lsn
+        deadline = self.deadline(timeout)
+
+        if use_replica:
+            node = self.choose_replica(max_staleness, min_lsn) or self._fallback_node()
+        else:
+            self._check_writable()
+            node = self.master_node
+
+        with self.balancer.track(node):
+            with self._checkout(node, deadline) as conn:
+                name = f"stream_{next(_cursor_names)}"
+                with conn.cursor(name=name, cursor_factory=extensions.cursor) as cursor:
+                    cursor.itersize = fetch_size
+                    instrumentation = self.instrumentation
+                    event = instrumentation.before(node.name, query, params, cursor) if instrumentation else None
+                    rows = 0
+                    try:
+                        self._set_timeouts(conn, deadline)
+                        cursor.execute(query, params)
+                        make_row = None
+                        for row in cursor:
+                            # У именованного курсора описание колонок появляется после первого FETCH
+                            if make_row is None:
+                                make_row = row_factory(column_names(cursor), row_format)
+                            rows += 1
+                            if deadline is not None and rows % fetch_size == 0:
+                                # Следующий FETCH получает только оставшееся время
+                                self._set_timeouts(conn, deadline)
+                            yield make_row(row)
+                    except GeneratorExit:
+                        # Поток закрыли, не дочитав: это не ошибка запроса
+                        if event is not None:
+                            instrumentation.after(event, rows)
+                        raise
+                    except Exception as e:
+                        error = timeout_error(e, deadline)
+                        if event is not None:
+                            instrumentation.after(event, rows, error=error)
+                        if error is e:
+                            raise
+                        raise error from e
+                    if event is not None:
+                        instrumentation.after(event, rows)
+                conn.commit()
+
+    def execute_batch(
+        self,
+        query: str,
+        rows: Iterable[tuple | dict],
+        page_size: int = BATCH_PAGE_SIZE,
+        returning: bool = False,
+        row_format: str | None = None,
+        timeout: float | Deadline | None = None
+    ) -> list | dict | int:
+        """
+        Выполняет запрос на изменение для множества наборов параметров в одной транзакции
+        на мастере.
+
+        Запрос вида INSERT ... VALUES %s (или UPDATE ... FROM (VALUES %s) AS v(...)) отправляется
+        страницами по page_size строк — один обмен с сервером на страницу. Остальные запросы
+        выполняются для каждого набора параметров, но на одном соединении и с одним коммитом.
+
+        :param rows: наборы параметров запроса
+        :param returning: вернуть строки RETURNING вместо числа изменённых строк
+        :param timeout: срок всей пачки в секундах или Deadline (по умолчанию без ограничения)
+        :return: число изменённых строк или строки RETURNING в формате row_format
+        """
+        row_format = self.row_format if row_format is None else check_row_format(row_format)
+        query = query.strip()
+        deadline = self.deadline(timeout)
+
+        try:
+            self._check_writable()
+            with self.balancer.track(self.master_node):
+                with self._checkout(self.master_node, deadline, grace=0) as conn:
+                    with conn.cursor(cursor_factory=extensions.cursor) as cursor:
+                        instrumentation = self.instrumentation
+                        event = instrumentation.before(self.master_node.name, query, None) if instrumentation else None
+                        try:
+                            self._set_timeouts(conn, deadline)
+                            if _VALUES_PLACEHOLDER.search(query):
+                                result = self._execute_values(cursor, query, rows, page_size, returning)
+                            elif returning:
+                                result = []
+                                for params in rows:
+                                    cursor.execute(query, params)
+                                    result.extend(cursor.fetchall())
+                            else:
+                                # executemany суммирует rowcount по всем выполнениям
+                                cursor.executemany(query, rows)
+                                result = cursor.rowcount
+
+                            if returning:
+                                columns = column_names(cursor) if cursor.description else ()
+                                result = format_rows(result, columns, row_format)
+                            conn.commit()
+                        except Exception as e:
+                            error = timeout_error(e, deadline)
+                            if event is not None:
+                                instrumentation.after(event, error=error)
+                            if error is e:
+                                raise
+                            raise error from e
+                        if event is not None:
+                            instrumentation.after(event, result if isinstance(result, int) else len(result))
+
+                        if self.read_your_writes:
+                            self._remember_lsn(conn, cursor)
         except psycopg2.Error as e:
-            print(f"Error executing query: {e}")
+            print(f"Error executing batch: {e}")
             raise
 
+        if self.query_cache is not None:
+            self.query_cache.invalidate(tables_written(query))
         return result
 
-    def execute_script(self, script_path: str, use_replica: bool = False) -> None:
-        """Выполняет SQL скрипт из файла"""
+    @staticmethod
+    def _execute_values(
+        cursor,
+        query: str,
+        rows: Iterable[tuple | dict],
+        page_size: int,
+        returning: bool
+    ) -> list[tuple] | int:
+        if returning:
+            return execute_values(cursor, query, rows, page_size=page_size, fetch=True)
+
+        # execute_values оставляет rowcount только последней страницы, поэтому считаем сами
+        count = 0
+        rows = iter(rows)
+        while page := list(itertools.islice(rows, page_size)):
+            execute_values(cursor, query, page, page_size=len(page))
+            count += cursor.rowcount
+        return count
+
+    def copy_in(
+        self,
+        table: str,
+        rows: Iterable[tuple],
+        columns: list[str],
+        returning: str | list[str] | None = None,
+        row_format: str | None = None,
+        timeout: float | Deadline | None = None
+    ) -> list | dict | int:
+        """
+        Загружает строки в таблицу на мастере через COPY FROM STDIN — самый быстрый
+        способ массовой вставки. Строки кодируются по мере чтения, так что rows может
+        быть генератором.
+
+        COPY не умеет RETURNING, поэтому с returning строки сначала копируются во временную
+        таблицу, а затем вставляются одним INSERT ... SELECT ... RETURNING.
+
+        :param table: таблица (можно со схемой: schema.table)
+        :param columns: колонки, в порядке которых идут значения в строках
+        :param returning: колонка или колонки, значения которых нужно вернуть (например, id)
+        :param timeout: срок загрузки в секундах или Deadline (по умолчанию без ограничения)
+        :return: число загруженных строк или строки RETURNING в формате row_format
+        """
+        row_format = self.row_format if row_format is None else check_row_format(row_format)
+        target = sql.Identifier(*table.split("."))
+        column_list = sql.SQL(", ").join(map(sql.Identifier, columns))
+        deadline = self.deadline(timeout)
+        stream = CopyStream(rows, deadline)
+
         try:
-            with open(script_path, 'r') as f:
-                queries = [q.strip() for q in f.read().split(';') if q.strip()]
+            self._check_writable()
+            with self.balancer.track(self.master_node):
+                with self._checkout(self.master_node, deadline, grace=0) as conn:
+                    with conn.cursor(cursor_factory=extensions.cursor) as cursor:
+                        self._set_timeouts(conn, deadline)
+                        if returning is None:
+                            copy = sql.SQL("COPY {} ({}) FROM STDIN").format(target, column_list)
+                            cursor.copy_expert(copy, stream)
+                            result = stream.rows
+                        else:
+                            returning = [returning] if isinstance(returning, str) else returning
+                            staging = sql.Identifier(f"copy_in_{next(_cursor_names)}")
+                            cursor.execute(
+                                sql.SQL(
+                                    "CREATE TEMP TABLE {} ON COMMIT DROP AS SELECT {} FROM {} WITH NO DATA"
+                                ).format(staging, column_list, target)
+                            )
+                            cursor.copy_expert(
+                                sql.SQL("COPY {} ({}) FROM STDIN").format(staging, column_list), stream
+                            )
+                            cursor.execute(
+                                sql.SQL("INSERT INTO {} ({}) SELECT {} FROM {} RETURNING {}").format(
+                                    target, column_list, column_list, staging,
+                                    sql.SQL(", ").join(map(sql.Identifier, returning))
+                                )
+                            )
+                            result = format_rows(cursor.fetchall(), column_names(cursor), row_format)
+                        conn.commit()
 
-            for query in queries:
-                self.execute_query(query, use_replica=use_replica)
+                        if self.read_your_writes:
+                            self._remember_lsn(conn, cursor)
+        except psycopg2.Error as e:
+            print(f"Error copying into {table}: {e}")
+            raise
+
+        if self.query_cache is not None:
+            self.query_cache.invalidate({table.split(".")[-1].lower()})
+        return result
+
+    def execute_script(
+        self,
+        script_path: str,
+        use_replica: bool = False,
+        single_transaction: bool = False,
+        batch_size: int = 1
+    ) -> list[dict]:
+        """
+        Выполняет SQL скрипт из файла на одном соединении.
+
+        Скрипт делится на запросы с учётом строк, комментариев и долларовых строк
+        (тела функций), см. sql_parser.split_statements.
+
+        :param single_transaction: выполнить весь скрипт в одной транзакции
+            (при ошибке не применяется ничего); иначе каждый запрос коммитится сразу
+        :param batch_size: сколько запросов отправлять серверу за один обмен;
+            запросы одной пачки выполняются в одной транзакции
+        :return: отчёт по пачкам: {"statement", "statements", "ms", "rowcount"}
+        """
+        with open(script_path, 'r', encoding='utf-8') as f:
+            statements = split_statements(f.read())
 
-            print(f"Script {script_path} executed successfully")
+        node = (self.balancer.choose() or self.master_node) if use_replica else self.master_node
+        report = []
+        try:
+            if node is self.master_node:
+                self._check_writable()
+            with self.balancer.track(node):
+                with node.pool.connection() as conn:
+                    conn.autocommit = not single_transaction
+                    try:
+                        with conn.cursor(cursor_factory=extensions.cursor) as cursor:
+                            for i in range(0, len(statements), batch_size):
+                                batch = statements[i:i + batch_size]
+                                start = time.perf_counter()
+                                cursor.execute("\n;\n".join(batch))
+                                report.append({
+                                    "statement": statement_preview(batch[0]),
+                                    "statements": len(batch),
+                                    "ms": round((time.perf_counter() - start) * 1000, 2),
+                                    "rowcount": cursor.rowcount,
+                                })
+                            conn.commit()
+
+                            if self.read_your_writes and node is self.master_node:
+                                self._remember_lsn(conn, cursor)
+                    finally:
+                        self._reset_autocommit(conn)
+
+            print(f"Script {script_path} executed successfully: {len(statements)} statements, "
+                  f"{sum(entry['ms'] for entry in report):.2f} ms")
         except Exception as e:
-            print(f"Error executing script {script_path}: {e}")
+            print(f"Error executing script {script_path} (statement {len(report) * batch_size + 1}): {e}")
             raise
+        finally:
+            # Скрипт может менять что угодно, включая схему
+            if self.query_cache is not None and node is self.master_node:
+                self.query_cache.invalidate(None)
+        return report
 
-    def check_connection(self, use_replica: bool = False) -> tuple[bool, float | None]:
-        """Проверяет доступность базы данных и возвращает (success, ping_time)"""
-        config = self.replica_config if use_replica else self.master_config
-        start = time.time()
+    @staticmethod
+    def _reset_autocommit(conn) -> None:
+        """Возвращает соединению обычный режим транзакций перед возвратом в пул"""
+        if conn.closed or not conn.autocommit:
+            return
         try:
-            with psycopg2.connect(**config, cursor_factory=DictCursor) as conn:
+            # Скрипт мог открыть транзакцию явным BEGIN и не закрыть её
+            if conn.info.transaction_status != extensions.TRANSACTION_STATUS_IDLE:
                 with conn.cursor() as cursor:
-                    cursor.execute("SELECT 1")
-                    cursor.fetchone()
-            latency = round((time.time() - start) * 1000, 2)  # в миллисекундах
-            return True, latency
-        except Exception:
+                    cursor.execute("ROLLBACK")
+            conn.autocommit = False
+        except psycopg2.Error:
+            conn.close()
+
+    def check_connection(self, use_replica: bool = False) -> tuple[bool, float | None]:
+        """
+        Проверяет доступность базы данных и возвращает (success, ping_time).
+        Для реплик проверяется узел, который балансировщик выбрал бы для чтения.
+        """
+        node = self.balancer.choose() if use_replica else self.master_node
+        if node is None:
             return False, None
+        return self._ping(node)
 
-    def _log_query(self, cursor, query: str, params: tuple | dict | None):
+    def check_nodes(self) -> dict[str, tuple[bool, float | None]]:
+        """Проверяет все узлы: {имя узла: (success, ping_time)}"""
+        return {node.name: self._ping(node) for node in [self.master_node, *self.replica_nodes]}
+
+    def _ping(self, node: Node) -> tuple[bool, float | None]:
         """
-        Логирует SQL-запрос с подставленными значениями и указывает источник (master/replica)
+        Проверка узла — это тоже запрос через выключатель: пока он разомкнут,
+        проверка сразу возвращает отказ, а после reset_timeout становится пробой.
         """
-        # Получаем dsn из соединения
-        dsn = str(cursor.connection.dsn)
+        try:
+            with self.balancer.track(node):
+                start = time.time()
+                with node.pool.connection() as conn:
+                    with conn.cursor() as cursor:
+                        cursor.execute("SELECT 1")
+                        cursor.fetchone()
+            return True, round((time.time() - start) * 1000, 2)  # в миллисекундах
+        except Exception:
+            return False, None
+
+    def pool_stats(self) -> dict[str, dict]:
+        """Возвращает статистику пулов соединений по узлам"""
+        return {node.name: node.pool.stats() for node in [self.master_node, *self.replica_nodes]}
 
-        # Определяем, мастер это или реплика по порту или хосту
-        is_replica = (
-            f"host={self.replica_config['host']}" in dsn and 
-            f"port={self.replica_config['port']}" in dsn
+    def cache_stats(self) -> dict | None:
+        """Возвращает статистику кэша результатов (None, если кэш выключен)"""
+        return None if self.query_cache is None else self.query_cache.stats()
+
+    def statement_stats(self) -> list[dict]:
+        """
+        Задержки, вызовы, строки и ошибки по отпечаткам запросов и узлам
+        (пусто, если QueryStats не подключён к инструментированию)
+        """
+        if self.query_stats is None:
+            return []
+        return sorted(
+            (entry.summary() for entry in self.query_stats.entries()),
+            key=lambda summary: summary["total_ms"], reverse=True
         )
 
-        source = "replica" if is_replica else "master"
+    def hedge_stats(self) -> dict | None:
+        """
+        Счётчики хеджирования: чтения, отправленные вторые запросы, выигрыши второго запроса,
+        отменённые запросы и хеджи, не отправленные из-за бюджета (None, если хеджирование выключено)
+        """
+        return None if self.hedging is None else self.hedging.stats()
 
-        if params:
-            try:
-                sql_with_values = cursor.mogrify(query, params).decode('utf-8')
-            except Exception:
-                sql_with_values = f"{query} -- params: {params}"
-        else:
-            sql_with_values = query
+    def node_stats(self) -> list[dict]:
+        """Возвращает метрики балансировки по узлам: нагрузку, задержку, отказы"""
+        return [node.stats() for node in [self.master_node, *self.replica_nodes]]
 
-        # print(f"[{source}] {sql_with_values}")
+    def close(self) -> None:
+        """Закрывает пулы соединений (они общие для всех менеджеров процесса)"""
+        for node in [self.master_node, *self.replica_nodes]:
+            node.pool.close()
@@ -0,0 +1,193 @@
+import re
+from functools import lru_cache
+from typing import Iterator, NamedTuple
+
+
+class Token(NamedTuple):
+    kind: str
+    text: str
+    start: int
+
+
+# Лексемы PostgreSQL. Строки с учётом '' и E'\'', идентификаторы в кавычках,
+# параметры psycopg2 и $n. Долларовые строки и вложенные /* */ разбираются отдельно
+_TOKEN = re.compile(
+    r"""
+      (?P<space>\s+)
+    | (?P<line_comment>--[^\n]*)
+    | (?P<block_comment>/\*)
+    | (?P<string>[eE]'(?:[^'\\]|\\.|'')*'?|'(?:[^']|'')*'?)
+    | (?P<quoted>"(?:[^"]|"")*"?)
+    | (?P<dollar>\$(?:[^\W\d]\w*)?\$)
+    | (?P<param>\$\d+|%\(\w+\)s|%s)
+    | (?P<word>[^\W\d]\w*(?:\$\w*)*)
+    | (?P<number>\d+(?:\.\d*)?(?:[eE][+-]?\d+)?|\.\d+(?:[eE][+-]?\d+)?)
+    | (?P<semicolon>;)
+    | (?P<punct>.)
+    """,
+    re.VERBOSE | re.DOTALL
+)
+
+# Лексемы, не влияющие на смысл запроса
+IGNORED = frozenset(("space", "line_comment", "block_comment"))
+
+
+def tokenize(sql: str) -> Iterator[Token]:
+    """
+    Разбивает текст SQL на лексемы. Содержимое строк, долларовых строк
+    ($$...$$, $body$...$body$) и комментариев возвращается одной лексемой,
+    поэтому ; и ключевые слова внутри них не видны.
+    """
+    pos, length = 0, len(sql)
+    while pos < length:
+        match = _TOKEN.match(sql, pos)
+        kind, start = match.lastgroup, pos
+        pos = match.end()
+
+        if kind == "dollar":
+            # Тело долларовой строки до такого же тега; незакрытая — до конца текста
+            close = sql.find(match.group(), pos)
+            pos = length if close < 0 else close + len(match.group())
+            kind = "string"
+        elif kind == "block_comment":
+            depth = 1
+            while depth and pos < length:
+                if sql.startswith("/*", pos):
+                    depth, pos = depth + 1, pos + 2
+                elif sql.startswith("*/", pos):
+                    depth, pos = depth - 1, pos + 2
+                else:
+                    pos += 1
+
+        yield Token(kind, sql[start:pos], start)
+
+
+def split_statements(sql: str) -> list[str]:
+    """
+    Делит скрипт на отдельные запросы по ; вне строк, комментариев, долларовых строк
+    и тел BEGIN ATOMIC ... END. Пустые запросы (только комментарии) отбрасываются.
+    """
+    statements = []
+    start = 0
+    significant = False
+    previous = ""
+    atomic_depth = 0
+
+    for token in tokenize(sql):
+        if token.kind in IGNORED:
+            continue
+
+        if token.kind == "word":
+            word = token.text.lower()
+            if atomic_depth:
+                # Внутри тела BEGIN ATOMIC конец тела — END, не относящийся к CASE
+                if word == "case":
+                    atomic_depth += 1
+                elif word == "end":
+                    atomic_depth -= 1
+            elif word == "atomic" and previous == "begin":
+                atomic_depth = 1
+            previous = word
+        else:
+            previous = ""
+
+        if token.kind == "semicolon" and not atomic_depth:
+            if significant:
+                statements.append(sql[start:token.start].strip())
+            start, significant = token.start + 1, False
+        else:
+            significant = True
+
+    if significant:
+        statements.append(sql[start:].strip())
+    return statements
+
+
+def statement_preview(statement: str, width: int = 60) -> str:
+    """Первые символы запроса в одну строку — для логов и отчётов"""
+    text = " ".join(statement.split())
+    return text if len(text) <= width else text[:width - 3] + "..."
+
+
+class QueryClass(NamedTuple):
+    command: str            # главный оператор (для WITH — оператор после списка CTE)
+    read_only: bool         # запрос ничего не меняет и его можно выполнить на реплике
+    returns_rows: bool      # запрос возвращает строки (без учёта RETURNING)
+    reason: str | None      # почему запрос нельзя выполнить на реплике
+
+
+# Операторы, которые только читают данные
+READ_COMMANDS = frozenset(("select", "values", "table", "show", "explain"))
+# Операторы, возвращающие строки
+ROW_COMMANDS = READ_COMMANDS
+# Операторы, которые могут быть главными после списка CTE
+MAIN_COMMANDS = frozenset(("select", "values", "table", "insert", "update", "delete", "merge"))
+# Изменение данных — в том числе внутри CTE (WITH t AS (DELETE ... RETURNING ...))
+WRITE_WORDS = frozenset(("insert", "update", "delete", "merge", "truncate"))
+# Блокировки строк: FOR UPDATE, FOR NO KEY UPDATE, FOR SHARE, FOR KEY SHARE
+LOCK_WORDS = frozenset(("update", "share", "no", "key"))
+# Функции с побочными эффектами или зависящие от состояния мастера
+WRITE_FUNCTIONS = frozenset((
+    "nextval", "setval", "currval", "lastval",
+    "set_config", "pg_notify",
+    "txid_current", "pg_current_xact_id", "pg_current_wal_lsn", "pg_current_wal_insert_lsn",
+    "pg_advisory_lock", "pg_advisory_lock_shared", "pg_advisory_xact_lock",
+    "pg_advisory_xact_lock_shared", "pg_try_advisory_lock", "pg_try_advisory_lock_shared",
+    "pg_try_advisory_xact_lock", "pg_try_advisory_xact_lock_shared",
+    "pg_advisory_unlock", "pg_advisory_unlock_shared", "pg_advisory_unlock_all",
+    "lo_create", "lo_creat", "lo_import", "lo_unlink", "lo_put", "lo_from_bytea",
+    "dblink_exec", "pg_terminate_backend", "pg_cancel_backend",
+))
+
+
+@lru_cache(maxsize=4096)
+def classify(query: str) -> QueryClass:
+    """
+    Определяет, можно ли выполнить запрос на реплике. Комментарии, строки и скобки
+    перед запросом пропускаются, для WITH определяется главный оператор.
+    Запрос не считается читающим, если он изменяет данные (в том числе в CTE),
+    блокирует строки (FOR UPDATE/SHARE), создаёт таблицу (SELECT INTO)
+    или вызывает функцию из WRITE_FUNCTIONS.
+
+    Результат запоминается по тексту запроса.
+    """
+    tokens = [token for token in tokenize(query) if token.kind not in IGNORED]
+    words = [(i, token.text.lower()) for i, token in enumerate(tokens) if token.kind == "word"]
+    if not words:
+        return QueryClass("", False, False, "пустой запрос")
+
+    first = words[0][1]
+    command = first
+    if first == "with":
+        command = _main_command(tokens)
+
+    reason = None
+    if first not in READ_COMMANDS and first != "with":
+        reason = f"оператор {first.upper()}"
+    else:
+        for position, (i, word) in enumerate(words):
+            if word == "for" and position + 1 < len(words) and words[position + 1][1] in LOCK_WORDS:
+                reason = "блокировка строк FOR UPDATE/SHARE"
+            elif word in WRITE_WORDS:
+                reason = f"изменение данных ({word.upper()})"
+            elif word == "into":
+                reason = "SELECT INTO"
+            elif word in WRITE_FUNCTIONS and i + 1 < len(tokens) and tokens[i + 1].text == "(":
+                reason = f"функция {word}()"
+            if reason:
+                break
+
+    return QueryClass(command, reason is None, command in ROW_COMMANDS, reason)
+
+
+def _main_command(tokens: list[Token]) -> str:
+    """Главный оператор запроса WITH: первое ключевое слово оператора вне скобок CTE"""
+    depth = 0
+    for token in tokens[1:]:
+        if token.text == "(":
+            depth += 1
+        elif token.text == ")":
+            depth -= 1
+        elif depth == 0 and token.kind == "word" and token.text.lower() in MAIN_COMMANDS:
+            return token.text.lower()
+    return "with"
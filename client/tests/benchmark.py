@@ -0,0 +1,489 @@
+"""
+Бенчмарк клиента: именованные нагрузки (см. workloads.py), прогрев и замер,
+перцентили задержек, ошибки по типам, результаты в JSON и сравнение с базовым запуском.
+
+    cd client
+    python -m tests.benchmark run point_read shipment_list mixed --threads 16 --output bench.json
+    python -m tests.benchmark compare baseline.json bench.json --threshold 10
+    python -m tests.benchmark open-loop point_read --steps 500:5000:500 --node all --slo-ms 50
+    python -m tests.benchmark run point_read --processes 4 --threads 16
+    python -m tests.benchmark visibility --background write_cycle --background-rates 0,100,200,400
+    python -m tests.benchmark run shipment_workflow:hot_items=2,hot_ratio=0.9 --threads 16
+"""
+import datetime
+import json
+import platform
+import threading
+import time
+
+import click
+
+from config import HEDGE_READS, POOL_CONFIG, QUERY_CACHE_ENABLED
+from sql_manager import PostgreSQLManager
+
+from .load_generator import (
+    Stage, constant_profile, find_saturation, node_manager, ramp_profile, run_closed_loop, run_open_loop,
+    stage_results, step_profile
+)
+from .process_driver import run_in_processes
+from .recorder import compare
+from .visibility import VisibilityProbe
+from .workloads import WORKLOADS, make_workload
+
+
+def environment(manager: PostgreSQLManager) -> dict:
+    """Условия запуска, от которых зависят результаты (без паролей)"""
+    return {
+        "python": platform.python_version(),
+        "host": platform.node(),
+        "nodes": [
+            {"name": node.name, "host": node.config.get("host"), "port": node.config.get("port")}
+            for node in [manager.master_node, *manager.replica_nodes]
+        ],
+        "pool_max_size": POOL_CONFIG["max_size"],
+        "query_cache": QUERY_CACHE_ENABLED,
+        "hedge_reads": HEDGE_READS,
+        "row_format": manager.row_format,
+    }
+
+
+def run_benchmark(
+    specs: list[str],
+    threads: int = 8,
+    duration: float = 10.0,
+    warmup: float = 3.0,
+    processes: int = 1,
+    manager: PostgreSQLManager | None = None
+) -> dict:
+    """
+    Прогоняет нагрузки по очереди и возвращает результаты в виде, пригодном для JSON:
+    итоги (перцентили, пропускная способность, ошибки) и сырые гистограммы.
+
+    :param threads: потоков нагрузки в каждом процессе
+    :param processes: процессов нагрузки (см. process_driver.run_in_processes)
+    """
+    manager = manager or PostgreSQLManager()
+    result = {
+        "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "environment": environment(manager),
+        "settings": {"threads": threads, "processes": processes, "duration": duration, "warmup": warmup},
+        "workloads": {},
+    }
+    for spec in specs:
+        workload = make_workload(spec)
+        click.echo(f"[~] {workload.name}: {workload.description} ({processes} × {threads} потоков, "
+                   f"прогрев {warmup:g} с, замер {duration:g} с)")
+        workload.setup(manager)
+        try:
+            if processes > 1:
+                recorders, elapsed = run_in_processes(
+                    processes, "closed", workload, threads=threads, duration=duration, warmup=warmup
+                )
+                recorder = recorders[0]
+            else:
+                recorder, elapsed = run_closed_loop(manager, workload, threads, duration, warmup)
+        finally:
+            workload.teardown(manager)
+        result["workloads"][workload.name] = {
+            "description": workload.description,
+            "threads": threads * processes,
+            "duration": round(elapsed, 3),
+            **recorder.summary(elapsed),
+            "raw": recorder.to_dict(),
+        }
+        print_summary(workload.name, result["workloads"][workload.name])
+    return result
+
+
+def run_open_loop_benchmark(
+    spec: str,
+    profile: list[Stage],
+    nodes: list[str] | None = None,
+    warmup: float = 0.0,
+    concurrency: int = 256,
+    poisson: bool = False,
+    slo_ms: float | None = None,
+    processes: int = 1,
+    manager: PostgreSQLManager | None = None
+) -> dict:
+    """
+    Прогоняет профиль открытого цикла (см. load_generator.run_open_loop) на каждом из узлов
+    и находит точку насыщения каждого. Итоги участков лежат в workloads под именами
+    нагрузка@узел@интенсивность, поэтому их можно сравнивать с базовым запуском.
+
+    :param nodes: узлы, на которые отправляется чтение; None — обычная балансировка
+    :param warmup: секунд прогрева на интенсивности первого участка (не учитываются)
+    :param concurrency: потоков, выполняющих запросы, в каждом процессе
+    :param processes: процессов нагрузки; интенсивность профиля делится между ними
+    """
+    manager = manager or PostgreSQLManager()
+    result = {
+        "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "environment": environment(manager),
+        "settings": {
+            "mode": "open_loop", "profile": [stage._asdict() for stage in profile], "warmup": warmup,
+            "concurrency": concurrency, "processes": processes, "poisson": poisson, "slo_ms": slo_ms,
+        },
+        "workloads": {},
+        "saturation": {},
+    }
+    workload = make_workload(spec)
+    workload.setup(manager)
+    try:
+        for node_name in nodes or [None]:
+            target = manager if node_name is None else node_manager(manager, node_name)
+            label = node_name or "default"
+            click.echo(f"[~] {workload.name} → {label}: {len(profile)} участков, "
+                       f"{sum(stage.duration for stage in profile):g} с")
+            stages = profile
+            if warmup > 0:
+                stages = [Stage(profile[0].rate, profile[0].rate, warmup), *profile]
+            if processes > 1:
+                recorders, _ = run_in_processes(
+                    processes, "open", workload, profile=stages, concurrency=concurrency, poisson=poisson,
+                    node=node_name
+                )
+            else:
+                recorders = run_open_loop(target, workload, stages, concurrency=concurrency, poisson=poisson)
+            if warmup > 0:
+                recorders = recorders[1:]
+
+            results = stage_results(profile, recorders)
+            for summary, recorder in zip(results, recorders):
+                summary["raw"] = recorder.to_dict()
+                result["workloads"][f"{workload.name}@{label}@{summary['stage']}"] = summary
+            saturation = result["saturation"][label] = find_saturation(results, slo_ms=slo_ms)
+            print_stages(results)
+            click.echo(
+                f"[✓] {label}: выдерживает {saturation['sustained_rate'] or 0:g} запросов/с"
+                + (f", насыщение на {saturation['saturated_at']}: {saturation['reason']}"
+                   if saturation["saturated_at"] else ", насыщение не достигнуто")
+            )
+    finally:
+        workload.teardown(manager)
+    return result
+
+
+def run_visibility_benchmark(
+    rate: float = 20.0,
+    duration: float = 10.0,
+    background: str | None = None,
+    background_rates: list[float] | None = None,
+    processes: int = 1,
+    concurrency: int = 256,
+    settle: float = 2.0,
+    poll_interval: float = 0.002,
+    timeout: float = 30.0,
+    manager: PostgreSQLManager | None = None
+) -> dict:
+    """
+    Задержка видимости записей мастера на репликах (см. visibility.VisibilityProbe)
+    без фоновой нагрузки и под фоновой записью разной интенсивности: видно, как растёт
+    отставание применения на реплике вместе с потоком записи.
+
+    :param background: нагрузка, создающая фоновый поток записи (например, write_cycle)
+    :param background_rates: интенсивности фоновой нагрузки, операций/с; 0 — без неё
+    :param processes: процессов фоновой нагрузки
+    :param concurrency: потоков фоновой нагрузки в каждом процессе
+    :param settle: сколько секунд фоновая нагрузка работает до начала замера
+    """
+    manager = manager or PostgreSQLManager()
+    background_rates = background_rates if background and background_rates else [0.0]
+    result = {
+        "started_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "environment": environment(manager),
+        "settings": {
+            "mode": "visibility", "rate": rate, "duration": duration, "background": background,
+            "background_rates": background_rates, "processes": processes, "concurrency": concurrency,
+            "settle": settle,
+            "poll_interval": poll_interval, "timeout": timeout,
+        },
+        "workloads": {},
+        "levels": [],
+    }
+    probe = VisibilityProbe(manager, rate=rate, poll_interval=poll_interval, timeout=timeout)
+    probe.setup()
+    workload = make_workload(background) if background else None
+    if workload is not None:
+        workload.setup(manager)
+    click.echo(f"{'background':>12} {'done/s':>8} {'replica':<12} {'p50':>8} {'p95':>8} {'p99':>8} "
+               f"{'max':>8} {'invisible':>9}")
+    try:
+        for background_rate in background_rates:
+            loaded: list = []
+            failures: list[BaseException] = []
+            thread = None
+            if workload is not None and background_rate > 0:
+                profile = [
+                    Stage(background_rate, background_rate, settle),
+                    Stage(background_rate, background_rate, duration),
+                ]
+
+                def load(profile=profile) -> None:
+                    try:
+                        if processes > 1:
+                            loaded.extend(run_in_processes(
+                                processes, "open", workload, profile=profile, concurrency=concurrency
+                            )[0])
+                        else:
+                            loaded.extend(run_open_loop(manager, workload, profile, concurrency=concurrency))
+                    except BaseException as error:
+                        failures.append(error)
+
+                thread = threading.Thread(target=load, name="background-load", daemon=True)
+                thread.start()
+                time.sleep(settle)
+
+            writes, visibility = probe.run(duration)
+            if thread is not None:
+                thread.join()
+            if failures:
+                # Уровень без фоновой нагрузки нельзя выдавать за нагруженный
+                raise RuntimeError(
+                    f"Фоновая нагрузка {background} ({background_rate:g}/s) не выполнена: {failures[0]}"
+                ) from failures[0]
+            level = {
+                "background_rate": background_rate,
+                "background": stage_results([Stage(background_rate, background_rate, duration)], loaded[1:])[0]
+                if loaded else None,
+                "writes": writes.summary(duration),
+                "replicas": {},
+            }
+            done = level["background"]["throughput"] if loaded else 0.0
+            for name, recorder in visibility.items():
+                summary = level["replicas"][name] = recorder.summary(duration)
+                result["workloads"][f"visibility@{name}@bg={background_rate:g}/s"] = {
+                    **summary, "raw": recorder.to_dict()
+                }
+                latency = summary["latency_ms"]
+                click.echo(
+                    f"{background_rate:>10g}/s {done:>8g} {name:<12} {_ms(latency['p50']):>8} "
+                    f"{_ms(latency['p95']):>8} {_ms(latency['p99']):>8} {_ms(latency['max']):>8} "
+                    f"{summary['errors']:>9}"
+                )
+            result["levels"].append(level)
+    finally:
+        probe.teardown()
+        if workload is not None:
+            workload.teardown(manager)
+    return result
+
+
+def _ms(value: float | None) -> str:
+    return "-" if value is None else f"{value:.2f}"
+
+
+def print_summary(name: str, summary: dict) -> None:
+    latency = summary["latency_ms"]
+    click.echo(
+        f"[✓] {name}: {summary['operations']} операций, {summary['errors']} ошибок, "
+        f"{summary['throughput']:.1f} оп/с; "
+        f"p50 {_ms(latency['p50'])} p95 {_ms(latency['p95'])} p99 {_ms(latency['p99'])} "
+        f"max {_ms(latency['max'])} мс"
+    )
+    for step, step_latency in summary["steps"].items():
+        click.echo(f"      {step:<20} p50 {_ms(step_latency['p50'])} p99 {_ms(step_latency['p99'])} мс")
+    for counter, value in summary["counters"].items():
+        share = value / summary["operations"] if summary["operations"] else 0.0
+        click.echo(f"      {counter:<20} {value} ({share:.1%} операций, {summary['counter_rates'][counter]:g}/с)")
+    for error, count in summary["error_types"].items():
+        click.echo(f"[!]   {error} × {count}: {summary['error_samples'][error]}")
+
+
+def print_stages(results: list[dict]) -> None:
+    click.echo(f"  {'stage':<16} {'offered':>8} {'done/s':>8} {'p50':>8} {'p99':>8} {'p99.9':>8} "
+               f"{'wait p99':>9} {'lag p99':>8} {'errors':>7}")
+    for result in results:
+        latency = result["latency_ms"]
+        wait = result["steps"].get("wait", {}).get("p99")
+        lag = result["steps"].get("dispatch_lag", {}).get("p99")
+        click.echo(
+            f"  {result['stage']:<16} {result['offered_rate']:>8g} {result['throughput']:>8g} "
+            f"{_ms(latency['p50']):>8} {_ms(latency['p99']):>8} {_ms(latency['p99.9']):>8} "
+            f"{_ms(wait):>9} {_ms(lag):>8} {result['errors']:>7}"
+        )
+
+
+def print_comparison(rows: list[dict]) -> None:
+    click.echo(f"{'workload':<24} {'metric':<12} {'baseline':>12} {'current':>12} {'change':>9}")
+    for row in rows:
+        change = f"{row['change']:+.1f}%" if row["metric"] != "error_rate" else f"{row['change']:+.2f}pp"
+        mark = "  РЕГРЕССИЯ" if row["regression"] else ""
+        click.echo(
+            f"{row['workload']:<24} {row['metric']:<12} {row['baseline']:>12g} {row['current']:>12g} {change:>9}{mark}"
+        )
+
+
+@click.group()
+def cli():
+    """Бенчмарк клиента PostgreSQL (мастер + реплики)"""
+    pass
+
+
+@cli.command(name="list")
+def list_workloads():
+    """Доступные нагрузки"""
+    for name in WORKLOADS:
+        click.echo(f"{name:<16} {make_workload(name).description}")
+    click.echo(f"{'mix:a=N,b=M':<16} Смесь нагрузок в пропорции N:M")
+    click.echo("Параметры нагрузки: имя:параметр=значение,... (например, shipment_workflow:hot_items=2,hot_ratio=0.9)")
+
+
+@cli.command()
+@click.argument('workloads', nargs=-1)
+@click.option('--threads', type=int, default=8, show_default=True, help='Потоков нагрузки в каждом процессе')
+@click.option('--processes', type=int, default=1, show_default=True,
+              help='Процессов нагрузки (каждый со своим менеджером и пулами соединений)')
+@click.option('--duration', type=float, default=10.0, show_default=True, help='Длительность замера, с')
+@click.option('--warmup', type=float, default=3.0, show_default=True, help='Длительность прогрева, с')
+@click.option('--output', type=click.Path(dir_okay=False), help='Куда записать результаты (JSON)')
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False), help='Сравнить с базовым запуском')
+@click.option('--threshold', type=float, default=10.0, show_default=True, help='Допустимое ухудшение, %')
+@click.pass_context
+def run(ctx, workloads: tuple[str, ...], threads: int, processes: int, duration: float, warmup: float,
+        output: str | None, baseline: str | None, threshold: float):
+    """Прогнать нагрузки (по умолчанию — все, кроме смесей)"""
+    specs = list(workloads) or [name for name in WORKLOADS if name != "mixed"]
+    try:
+        for spec in specs:
+            make_workload(spec)
+    except ValueError as e:
+        raise click.BadParameter(str(e), param_hint="WORKLOADS")
+
+    result = run_benchmark(specs, threads=threads, duration=duration, warmup=warmup, processes=processes)
+    save_result(ctx, result, output, baseline, threshold)
+
+
+def save_result(ctx, result: dict, output: str | None, baseline: str | None, threshold: float) -> None:
+    """Записывает результаты и сравнивает их с базовым запуском (код выхода 1 — регрессия)"""
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+        click.echo(f"Результаты записаны в {output}")
+    if baseline:
+        with open(baseline, encoding="utf-8") as f:
+            rows = compare(json.load(f), result, threshold=threshold)
+        print_comparison(rows)
+        if any(row["regression"] for row in rows):
+            ctx.exit(1)
+
+
+def _parse_rates(value: str, count: int, option: str) -> list[float]:
+    try:
+        rates = [float(part) for part in value.split(":")]
+    except ValueError:
+        rates = []
+    if len(rates) != count:
+        raise click.BadParameter(f"ожидается {count} числа через двоеточие: {value}", param_hint=option)
+    return rates
+
+
+@cli.command(name="open-loop")
+@click.argument('workload')
+@click.option('--rate', type=float, help='Постоянная интенсивность, запросов/с (на --duration)')
+@click.option('--ramp', help='Линейный рост START:END запросов/с за --duration')
+@click.option('--steps', help='Ступени START:STOP:STEP запросов/с по --step-duration')
+@click.option('--duration', type=float, default=30.0, show_default=True, help='Длительность --rate и --ramp, с')
+@click.option('--step-duration', type=float, default=5.0, show_default=True, help='Длительность ступени, с')
+@click.option('--warmup', type=float, default=3.0, show_default=True, help='Прогрев на начальной интенсивности, с')
+@click.option('--node', 'nodes', multiple=True,
+              help='Отправлять чтение только на этот узел (master, replica, ...); all — на каждый по очереди')
+@click.option('--concurrency', type=int, default=256, show_default=True,
+              help='Потоков, выполняющих запросы, в каждом процессе')
+@click.option('--processes', type=int, default=1, show_default=True,
+              help='Процессов нагрузки; интенсивность делится между ними')
+@click.option('--poisson', is_flag=True, help='Случайные (пуассоновские) интервалы между запросами')
+@click.option('--slo-ms', type=float, help='Допустимый p99; участок с большим p99 считается насыщением')
+@click.option('--output', type=click.Path(dir_okay=False), help='Куда записать результаты (JSON)')
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False), help='Сравнить с базовым запуском')
+@click.option('--threshold', type=float, default=10.0, show_default=True, help='Допустимое ухудшение, %')
+@click.pass_context
+def open_loop(ctx, workload: str, rate: float | None, ramp: str | None, steps: str | None, duration: float,
+              step_duration: float, warmup: float, nodes: tuple[str, ...], concurrency: int, processes: int,
+              poisson: bool,
+              slo_ms: float | None, output: str | None, baseline: str | None, threshold: float):
+    """Открытый цикл: запросы с заданной интенсивностью, задержка от запланированного момента"""
+    if sum(option is not None for option in (rate, ramp, steps)) != 1:
+        raise click.UsageError("Укажите ровно один профиль: --rate, --ramp или --steps")
+    try:
+        make_workload(workload)
+        if rate is not None:
+            profile = constant_profile(rate, duration)
+        elif ramp is not None:
+            profile = ramp_profile(*_parse_rates(ramp, 2, "--ramp"), duration)
+        else:
+            profile = step_profile(*_parse_rates(steps, 3, "--steps"), step_duration)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+
+    manager = PostgreSQLManager()
+    names = (manager.master_node.name, *(node.name for node in manager.replica_nodes))
+    if "all" in nodes:
+        nodes = names
+    unknown = [node for node in nodes if node not in names]
+    if unknown:
+        raise click.BadParameter(f"неизвестные узлы {', '.join(unknown)} (доступны: {', '.join(names)})",
+                                 param_hint="--node")
+    result = run_open_loop_benchmark(
+        workload, profile, nodes=list(nodes) or None, warmup=warmup, concurrency=concurrency,
+        poisson=poisson, slo_ms=slo_ms, processes=processes, manager=manager
+    )
+    save_result(ctx, result, output, baseline, threshold)
+
+
+@cli.command()
+@click.option('--rate', type=float, default=20.0, show_default=True, help='Помеченных строк в секунду')
+@click.option('--duration', type=float, default=10.0, show_default=True, help='Длительность замера на уровне, с')
+@click.option('--background', help='Фоновая нагрузка записи (например, write_cycle)')
+@click.option('--background-rates', default='0', show_default=True,
+              help='Интенсивности фоновой нагрузки через запятую, операций/с')
+@click.option('--processes', type=int, default=1, show_default=True, help='Процессов фоновой нагрузки')
+@click.option('--concurrency', type=int, default=256, show_default=True,
+              help='Потоков фоновой нагрузки в каждом процессе')
+@click.option('--poll-interval', type=float, default=0.002, show_default=True, help='Пауза между опросами реплики, с')
+@click.option('--timeout', type=float, default=30.0, show_default=True,
+              help='Через сколько секунд невидимая строка считается ошибкой')
+@click.option('--output', type=click.Path(dir_okay=False), help='Куда записать результаты (JSON)')
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False), help='Сравнить с базовым запуском')
+@click.option('--threshold', type=float, default=10.0, show_default=True, help='Допустимое ухудшение, %')
+@click.pass_context
+def visibility(ctx, rate: float, duration: float, background: str | None, background_rates: str, processes: int,
+               concurrency: int, poll_interval: float, timeout: float, output: str | None, baseline: str | None, threshold: float):
+    """Задержка видимости записей мастера на репликах, в том числе под фоновой записью"""
+    try:
+        rates = [float(value) for value in background_rates.split(",")]
+        if background:
+            make_workload(background)
+    except ValueError as e:
+        raise click.BadParameter(str(e))
+    result = run_visibility_benchmark(
+        rate=rate, duration=duration, background=background, background_rates=rates, processes=processes,
+        concurrency=concurrency, poll_interval=poll_interval, timeout=timeout
+    )
+    save_result(ctx, result, output, baseline, threshold)
+
+
+@cli.command(name="compare")
+@click.argument('baseline', type=click.Path(exists=True, dir_okay=False))
+@click.argument('current', type=click.Path(exists=True, dir_okay=False))
+@click.option('--threshold', type=float, default=10.0, show_default=True, help='Допустимое ухудшение, %')
+@click.option('--min-delta-ms', type=float, default=0.5, show_default=True,
+              help='Изменения задержки меньше этого не считаются регрессией')
+@click.pass_context
+def compare_results(ctx, baseline: str, current: str, threshold: float, min_delta_ms: float):
+    """Сравнить результаты с базовым запуском; код выхода 1 — есть регрессии"""
+    with open(baseline, encoding="utf-8") as f:
+        base = json.load(f)
+    with open(current, encoding="utf-8") as f:
+        result = json.load(f)
+    rows = compare(base, result, threshold=threshold, min_delta_ms=min_delta_ms)
+    if not rows:
+        click.echo("Нет общих нагрузок для сравнения")
+        return
+    print_comparison(rows)
+    if any(row["regression"] for row in rows):
+        ctx.exit(1)
+
+
+if __name__ == "__main__":
+    cli()
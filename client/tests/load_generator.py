@@ -0,0 +1,252 @@
+import bisect
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, NamedTuple
+
+from config import MASTER_CONFIG
+from sql_manager import PostgreSQLManager
+
+from .recorder import Recorder
+from .workloads import Workload, run_operation
+
+
+class Stage(NamedTuple):
+    """Участок профиля нагрузки: интенсивность меняется линейно от rate до end_rate (запросов в секунду)"""
+    rate: float
+    end_rate: float
+    duration: float
+
+    def rate_at(self, offset: float) -> float:
+        return self.rate + (self.end_rate - self.rate) * min(offset / self.duration, 1.0)
+
+    @property
+    def label(self) -> str:
+        if self.rate == self.end_rate:
+            return f"{self.rate:g}/s"
+        return f"{self.rate:g}-{self.end_rate:g}/s"
+
+
+def constant_profile(rate: float, duration: float) -> list[Stage]:
+    return [Stage(rate, rate, duration)]
+
+
+def step_profile(start: float, stop: float, step: float, step_duration: float) -> list[Stage]:
+    """Ступени start, start + step, ... до stop включительно, по step_duration секунд каждая"""
+    if start <= 0 or step <= 0 or stop < start:
+        raise ValueError(f"Некорректные ступени: {start}:{stop}:{step}")
+    stages = []
+    rate = start
+    while rate <= stop + 1e-9:
+        stages.append(Stage(rate, rate, step_duration))
+        rate += step
+    return stages
+
+
+def ramp_profile(start: float, end: float, duration: float, stages: int = 10) -> list[Stage]:
+    """
+    Линейный рост от start до end за duration секунд. Разбит на stages участков,
+    чтобы по каждому было видно свои задержки и найти точку насыщения.
+    """
+    length = duration / stages
+    delta = (end - start) / stages
+    return [Stage(start + delta * i, start + delta * (i + 1), length) for i in range(stages)]
+
+
+def arrivals(profile: list[Stage], poisson: bool = False, seed: int | None = None) -> Iterator[tuple[float, int]]:
+    """
+    Запланированные моменты запросов от начала профиля и номера их участков.
+
+    :param poisson: случайные интервалы (пуассоновский поток) вместо равномерных
+    """
+    rng = random.Random(seed)
+    offset = 0.0
+    for index, stage in enumerate(profile):
+        t = 0.0
+        while True:
+            rate = stage.rate_at(t)
+            if rate <= 0:
+                break
+            t += rng.expovariate(rate) if poisson else 1 / rate
+            if t >= stage.duration:
+                break
+            yield offset + t, index
+        offset += stage.duration
+
+
+def run_closed_loop(
+    manager: PostgreSQLManager,
+    workload: Workload,
+    threads: int,
+    duration: float,
+    warmup: float = 0.0
+) -> tuple[Recorder, float]:
+    """
+    Замкнутый цикл: каждый поток выполняет следующую операцию сразу после предыдущей.
+    Операции прогрева не учитываются; операции, начатые после замера, тоже.
+
+    :return: замеры и фактическая длительность замера в секундах
+    """
+    stop = threading.Event()
+    # Текущая фаза: свой Recorder на поток, главный поток подменяет список целиком
+    phase = [[Recorder() for _ in range(threads)]]
+
+    def loop(index: int) -> None:
+        while not stop.is_set():
+            run_operation(workload, manager, phase[0][index], time.perf_counter())
+
+    with ThreadPoolExecutor(max_workers=threads, thread_name_prefix="bench") as executor:
+        futures = [executor.submit(loop, index) for index in range(threads)]
+        try:
+            if warmup > 0:
+                time.sleep(warmup)
+            measured = phase[0] = [Recorder() for _ in range(threads)]
+            started = time.perf_counter()
+            time.sleep(duration)
+            phase[0] = [Recorder() for _ in range(threads)]
+            elapsed = time.perf_counter() - started
+        finally:
+            stop.set()
+        for future in futures:
+            # Ошибки запросов учтены в Recorder; здесь всплывают только ошибки самого бенчмарка
+            future.result()
+
+    recorder = Recorder()
+    for part in measured:
+        recorder.merge(part)
+    return recorder, elapsed
+
+
+class LoadShedError(RuntimeError):
+    """Запрос не отправлен: генератор уже ждёт ответа на max_outstanding запросов"""
+
+
+def run_open_loop(
+    manager: PostgreSQLManager,
+    workload: Workload,
+    profile: list[Stage],
+    concurrency: int = 256,
+    max_outstanding: int = 10000,
+    poisson: bool = False
+) -> list[Recorder]:
+    """
+    Открытый цикл: запросы отправляются по расписанию профиля, независимо от того,
+    успел ли ответить предыдущий. Задержка считается от запланированного момента,
+    поэтому ожидание свободного потока или соединения, когда база не справляется,
+    входит в результат (поправка на coordinated omission), а не скрывается.
+
+    Запрос учитывается в участке, на который он был запланирован; счётчик completed —
+    сколько запросов успешно завершилось за время участка (по нему считается пропускная
+    способность: при перегрузке запросы участка завершаются уже на следующих).
+    Шаги замеров: wait — от запланированного момента до начала выполнения,
+    dispatch_lag — насколько сам генератор опоздал с отправкой (если велико,
+    упирается генератор, а не база).
+
+    :param concurrency: потоков, выполняющих запросы
+    :param max_outstanding: сколько запросов может ждать ответа одновременно; сверх этого
+        запросы не отправляются и учитываются как ошибки LoadShedError
+    :return: замеры по участкам профиля
+    """
+    local = threading.local()
+    recorders: list[dict[int, Recorder]] = []
+    recorders_lock = threading.Lock()
+    dispatcher = [Recorder() for _ in profile]
+    slots = threading.BoundedSemaphore(max_outstanding)
+    stage_ends = list(itertools.accumulate(stage.duration for stage in profile))
+
+    def stage_recorder(index: int) -> Recorder:
+        stages = getattr(local, "stages", None)
+        if stages is None:
+            stages = local.stages = {}
+            with recorders_lock:
+                recorders.append(stages)
+        recorder = stages.get(index)
+        if recorder is None:
+            recorder = stages[index] = Recorder()
+        return recorder
+
+    def task(due: float, index: int) -> None:
+        try:
+            recorder = stage_recorder(index)
+            recorder.record_step("wait", (time.perf_counter() - due) * 1000)
+            errors = recorder.error_count
+            run_operation(workload, manager, recorder, due)
+            finished = bisect.bisect_right(stage_ends, time.perf_counter() - started)
+            if recorder.error_count == errors and finished < len(profile):
+                stage_recorder(finished).count("completed")
+        finally:
+            slots.release()
+
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="open-loop") as executor:
+        started = time.perf_counter()
+        for offset, index in arrivals(profile, poisson=poisson):
+            due = started + offset
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            dispatcher[index].record_step("dispatch_lag", max(time.perf_counter() - due, 0) * 1000)
+            if not slots.acquire(blocking=False):
+                dispatcher[index].record(0, LoadShedError(f"Ожидают ответа {max_outstanding} запросов"))
+                continue
+            executor.submit(task, due, index)
+
+    for stages in recorders:
+        for index, recorder in stages.items():
+            dispatcher[index].merge(recorder)
+    return dispatcher
+
+
+def stage_results(profile: list[Stage], recorders: list[Recorder]) -> list[dict]:
+    """Итоги участков: запланированная интенсивность, фактическая пропускная способность, задержки"""
+    results = []
+    for stage, recorder in zip(profile, recorders):
+        summary = recorder.summary(stage.duration)
+        summary["throughput"] = round(recorder.counters.get("completed", 0) / stage.duration, 2)
+        summary["stage"] = stage.label
+        summary["offered_rate"] = round((stage.rate + stage.end_rate) / 2, 2)
+        results.append(summary)
+    return results
+
+
+def find_saturation(results: list[dict], slo_ms: float | None = None, tolerance: float = 0.95) -> dict:
+    """
+    Точка насыщения: первый участок, где пропускная способность отстала от заданной
+    интенсивности больше чем на (1 - tolerance), появились ошибки или p99 превысил slo_ms.
+
+    :return: {sustained_rate — последняя выдержанная интенсивность, saturated_at — участок
+        насыщения или None, reason — что нарушено}
+    """
+    sustained = None
+    for result in results:
+        reasons = []
+        if result["throughput"] < result["offered_rate"] * tolerance:
+            reasons.append(f"throughput {result['throughput']:g} < {result['offered_rate']:g}")
+        if result["errors"]:
+            reasons.append(f"errors {result['errors']}")
+        p99 = result["latency_ms"]["p99"]
+        if slo_ms is not None and p99 is not None and p99 > slo_ms:
+            reasons.append(f"p99 {p99:g} ms > {slo_ms:g} ms")
+        if reasons:
+            return {"sustained_rate": sustained, "saturated_at": result["stage"], "reason": "; ".join(reasons)}
+        sustained = result["offered_rate"]
+    return {"sustained_rate": sustained, "saturated_at": None, "reason": None}
+
+
+def node_manager(manager: PostgreSQLManager, node_name: str) -> PostgreSQLManager:
+    """
+    Менеджер, отправляющий всё чтение на один узел — мастер или одну из реплик,
+    чтобы найти предел каждого узла отдельно. Запись по-прежнему идёт на мастер.
+
+    :raises ValueError: если узла с таким именем нет
+    """
+    if node_name == manager.master_node.name:
+        config = MASTER_CONFIG
+    else:
+        node = next((node for node in manager.replica_nodes if node.name == node_name), None)
+        if node is None:
+            names = [manager.master_node.name, *(node.name for node in manager.replica_nodes)]
+            raise ValueError(f"Неизвестный узел: {node_name} (доступны: {', '.join(names)})")
+        config = node.config
+    return PostgreSQLManager(replica_configs=[{**config, "name": node_name}])
@@ -0,0 +1,123 @@
+import multiprocessing
+import queue
+import threading
+import time
+import traceback
+
+from sql_manager import PostgreSQLManager
+
+from .load_generator import Stage, node_manager, run_closed_loop, run_open_loop
+from .recorder import Recorder
+from .workloads import Workload
+
+
+# Сколько секунд процессы ждут друг друга на старте (подключение к узлам)
+START_TIMEOUT = 60.0
+
+
+def _worker(index: int, processes: int, mode: str, workload: Workload, options: dict, barrier, results) -> None:
+    """
+    Процесс нагрузки: свой менеджер и пулы соединений, затем общий старт. Нагрузка приходит
+    уже подготовленной в главном процессе, setup() здесь не вызывается.
+    Результат — ("ok", index, замеры, длительность) или ("error", index, traceback).
+    """
+    try:
+        manager = PostgreSQLManager()
+        if options.get("node"):
+            manager = node_manager(manager, options["node"])
+        # Соединения открываются до старта, чтобы подключение не попало в замер
+        manager.check_connection(use_replica=False)
+        manager.check_connection(use_replica=True)
+        barrier.wait(START_TIMEOUT)
+
+        if mode == "closed":
+            recorder, elapsed = run_closed_loop(
+                manager, workload, options["threads"], options["duration"], options.get("warmup", 0.0)
+            )
+            recorders = [recorder]
+        else:
+            # Каждый процесс даёт свою долю общей интенсивности; равномерные расписания
+            # процессов сдвинуты друг относительно друга, чтобы запросы не шли пачками
+            profile = [
+                Stage(stage.rate / processes, stage.end_rate / processes, stage.duration)
+                for stage in options["profile"]
+            ]
+            if not options.get("poisson", False) and profile[0].rate > 0:
+                time.sleep(index / processes / profile[0].rate)
+            started = time.perf_counter()
+            recorders = run_open_loop(
+                manager, workload, profile, concurrency=options["concurrency"], poisson=options.get("poisson", False)
+            )
+            elapsed = time.perf_counter() - started
+        results.put(("ok", index, [recorder.to_dict() for recorder in recorders], elapsed))
+    except threading.BrokenBarrierError:
+        results.put(("error", index, "Другой процесс не смог начать нагрузку"))
+    except BaseException:
+        barrier.abort()
+        results.put(("error", index, traceback.format_exc()))
+
+
+def run_in_processes(processes: int, mode: str, workload: Workload, **options) -> tuple[list[Recorder], float]:
+    """
+    Запускает нагрузку в processes процессах, чтобы пределом была база, а не один
+    процесс Python (GIL: разбор строк, инструментирование). Процессы стартуют одновременно
+    после подключения, их гистограммы в конце складываются.
+
+    Подготовку и уборку данных (setup/teardown) выполняет вызывающий, один раз: процессы
+    получают копию уже подготовленной нагрузки, поэтому её состояние должно сериализоваться.
+
+    :param mode: closed — замкнутый цикл (threads, duration, warmup на процесс),
+        open — открытый цикл (profile с общей интенсивностью, concurrency на процесс, poisson, node)
+    :return: сложенные замеры (по участкам для open) и наибольшая длительность замера
+    :raises RuntimeError: если процесс не смог подготовиться или упал
+    """
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(processes + 1)
+    results = context.Queue()
+    workers = [
+        context.Process(
+            target=_worker, args=(index, processes, mode, workload, options, barrier, results),
+            name=f"bench-{index}", daemon=True
+        )
+        for index in range(processes)
+    ]
+    for worker in workers:
+        worker.start()
+
+    merged: list[Recorder] = []
+    elapsed = 0.0
+    failures = []
+    try:
+        try:
+            barrier.wait(START_TIMEOUT)
+        except threading.BrokenBarrierError:
+            pass
+        for _ in workers:
+            try:
+                message = results.get(timeout=START_TIMEOUT + _expected_duration(mode, options))
+            except queue.Empty:
+                failures.append("Процесс не вернул результат вовремя")
+                break
+            if message[0] == "error":
+                failures.append(f"Процесс {message[1]}: {message[2]}")
+                continue
+            _, _, recorders, worker_elapsed = message
+            for position, data in enumerate(recorders):
+                if position == len(merged):
+                    merged.append(Recorder())
+                merged[position].merge(Recorder.from_dict(data))
+            elapsed = max(elapsed, worker_elapsed)
+    finally:
+        for worker in workers:
+            worker.join(timeout=5)
+            if worker.is_alive():
+                worker.terminate()
+    if failures:
+        raise RuntimeError("Нагрузка в процессах не выполнена:\n" + "\n".join(failures))
+    return merged, elapsed
+
+
+def _expected_duration(mode: str, options: dict) -> float:
+    if mode == "closed":
+        return options.get("warmup", 0.0) + options["duration"]
+    return sum(stage.duration for stage in options["profile"])
@@ -0,0 +1,157 @@
+import time
+from contextlib import contextmanager
+
+from query_stats import LatencyHistogram
+
+
+# Перцентили в отчётах бенчмарков
+PERCENTILES = (50, 90, 95, 99, 99.9)
+
+
+def latency_summary(histogram: LatencyHistogram) -> dict:
+    """Перцентили, среднее и максимум гистограммы в миллисекундах"""
+    summary = {f"p{percent:g}": histogram.percentile(percent) for percent in PERCENTILES}
+    summary["mean"] = round(histogram.total_us / histogram.count / 1000, 3) if histogram.count else None
+    summary["max"] = histogram.max_us / 1000 if histogram.count else None
+    return summary
+
+
+class Recorder:
+    """
+    Замеры одного потока нагрузки: задержки операций и их шагов, ошибки по типам
+    и счётчики исходов (например, отказов из-за нехватки товара). Каждый поток
+    пишет в свой Recorder без блокировок, в конце замеры складываются (merge).
+    """
+
+    def __init__(self):
+        self.latency = LatencyHistogram()
+        self.steps: dict[str, LatencyHistogram] = {}
+        self.operations = 0
+        self.errors: dict[str, int] = {}
+        self.error_samples: dict[str, str] = {}  # тип ошибки -> первое сообщение
+        self.counters: dict[str, int] = {}
+
+    @property
+    def error_count(self) -> int:
+        return sum(self.errors.values())
+
+    def record(self, latency_ms: float, error: BaseException | None = None) -> None:
+        """Учитывает завершённую операцию; задержки считаются только у успешных"""
+        self.operations += 1
+        if error is None:
+            self.latency.record(latency_ms)
+            return
+        name = type(error).__name__
+        self.errors[name] = self.errors.get(name, 0) + 1
+        self.error_samples.setdefault(name, str(error).strip().splitlines()[0] if str(error).strip() else name)
+
+    @contextmanager
+    def step(self, name: str):
+        """Замеряет шаг операции (успешный — ошибку учтёт вся операция)"""
+        started = time.perf_counter()
+        yield
+        self.record_step(name, (time.perf_counter() - started) * 1000)
+
+    def record_step(self, name: str, latency_ms: float) -> None:
+        histogram = self.steps.get(name)
+        if histogram is None:
+            histogram = self.steps[name] = LatencyHistogram()
+        histogram.record(latency_ms)
+
+    def count(self, name: str, value: int = 1) -> None:
+        self.counters[name] = self.counters.get(name, 0) + value
+
+    def merge(self, other: "Recorder") -> None:
+        self.latency.merge(other.latency)
+        for name, histogram in other.steps.items():
+            self.steps.setdefault(name, LatencyHistogram()).merge(histogram)
+        self.operations += other.operations
+        for name, count in other.errors.items():
+            self.errors[name] = self.errors.get(name, 0) + count
+        for name, message in other.error_samples.items():
+            self.error_samples.setdefault(name, message)
+        for name, count in other.counters.items():
+            self.count(name, count)
+
+    def summary(self, duration: float) -> dict:
+        """Итог замера за duration секунд (без сырых гистограмм)"""
+        return {
+            "operations": self.operations,
+            "errors": self.error_count,
+            "error_rate": round(self.error_count / self.operations, 6) if self.operations else 0.0,
+            "throughput": round((self.operations - self.error_count) / duration, 2) if duration > 0 else 0.0,
+            "latency_ms": latency_summary(self.latency),
+            "steps": {name: latency_summary(histogram) for name, histogram in sorted(self.steps.items())},
+            "error_types": dict(self.errors),
+            "error_samples": dict(self.error_samples),
+            "counters": dict(self.counters),
+            "counter_rates": {
+                name: round(count / duration, 2) if duration > 0 else 0.0 for name, count in self.counters.items()
+            },
+        }
+
+    def to_dict(self) -> dict:
+        return {
+            "latency": self.latency.to_dict(),
+            "steps": {name: histogram.to_dict() for name, histogram in self.steps.items()},
+            "operations": self.operations,
+            "errors": self.errors,
+            "error_samples": self.error_samples,
+            "counters": self.counters,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Recorder":
+        recorder = cls()
+        recorder.latency = LatencyHistogram.from_dict(data["latency"])
+        recorder.steps = {name: LatencyHistogram.from_dict(value) for name, value in data["steps"].items()}
+        recorder.operations = data["operations"]
+        recorder.errors = dict(data["errors"])
+        recorder.error_samples = dict(data["error_samples"])
+        recorder.counters = dict(data["counters"])
+        return recorder
+
+
+def compare(
+    baseline: dict,
+    current: dict,
+    threshold: float = 10.0,
+    min_delta_ms: float = 0.5
+) -> list[dict]:
+    """
+    Сравнивает результаты двух запусков (JSON бенчмарка) по общим нагрузкам.
+
+    :param threshold: на сколько процентов метрика может ухудшиться, не считаясь регрессией
+    :param min_delta_ms: изменения задержки меньше этого не считаются регрессией
+        (погрешность на очень быстрых запросах)
+    :return: строки сравнения {workload, metric, baseline, current, change, regression}
+    """
+    rows = []
+    for name, base in baseline["workloads"].items():
+        result = current["workloads"].get(name)
+        if result is None:
+            continue
+
+        def add(metric: str, old, new, higher_is_worse: bool, min_delta: float = 0.0) -> None:
+            if old is None or new is None:
+                return
+            change = (new - old) / old * 100 if old else (0.0 if new == old else float("inf"))
+            worse = change if higher_is_worse else -change
+            regression = worse > threshold and abs(new - old) > min_delta
+            rows.append({
+                "workload": name, "metric": metric, "baseline": old, "current": new,
+                "change": round(change, 2), "regression": regression,
+            })
+
+        add("throughput", base["throughput"], result["throughput"], higher_is_worse=False)
+        for percentile in ("p50", "p95", "p99"):
+            add(f"{percentile}_ms", base["latency_ms"][percentile], result["latency_ms"][percentile],
+                higher_is_worse=True, min_delta=min_delta_ms)
+        rows.append({
+            "workload": name, "metric": "error_rate",
+            "baseline": base["error_rate"], "current": result["error_rate"],
+            "change": round((result["error_rate"] - base["error_rate"]) * 100, 4),
+            # Любые новые ошибки — регрессия, независимо от порога
+            "regression": result["error_rate"] > base["error_rate"],
+        })
+    return rows
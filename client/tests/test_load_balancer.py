@@ -0,0 +1,251 @@
+"""
+Тесты балансировки: выключатель узла (closed → open → half_open → closed),
+классификация отказов узла и политики выбора реплики.
+
+    cd client
+    python -m pytest tests/test_load_balancer.py -q
+"""
+import pytest
+from psycopg2 import errors, extensions, OperationalError
+
+import load_balancer
+from connection_pool import PoolTimeoutError
+from load_balancer import (
+    CircuitBreaker, LeastOutstandingPolicy, LoadBalancer, LowestLatencyPolicy, Node,
+    NodeUnavailableError, RoundRobinPolicy, WeightedPolicy, is_node_failure, make_policy
+)
+
+
+class Clock:
+    """Управляемые часы вместо time.monotonic"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(load_balancer.time, "monotonic", clock)
+    return clock
+
+
+@pytest.fixture(autouse=True)
+def separate_breakers(monkeypatch):
+    # Выключатели общие для процесса: каждый тест начинает с чистого реестра
+    monkeypatch.setattr(CircuitBreaker, "_shared", {})
+
+
+def pg_error(kind: type, pgcode: str) -> Exception:
+    """Ошибка сервера с SQLSTATE: у созданных вручную исключений psycopg2 pgcode пустой"""
+    return type(kind.__name__, (kind,), {"pgcode": pgcode})()
+
+
+def make_node(name: str, weight: int = 1, **breaker_config) -> Node:
+    return Node(
+        name, {"host": name}, {}, weight=weight,
+        pool_factory=lambda config, name, **options: None, breaker_config=breaker_config
+    )
+
+
+def test_breaker_opens_after_threshold(clock):
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.available
+    assert not breaker.allow()
+    assert breaker.stats()["rejected"] == 1
+    assert breaker.stats()["trips"] == 1
+
+
+def test_breaker_success_resets_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=2)
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_breaker_half_open_after_reset_timeout(clock):
+    breaker = CircuitBreaker(reset_timeout=5)
+    breaker.record_failure()
+    assert breaker.retry_in() == 5
+
+    clock.now += 4.9
+    assert breaker.state == CircuitBreaker.OPEN
+    assert not breaker.allow()
+
+    clock.now += 0.1
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert breaker.available
+    assert breaker.retry_in() == 0
+
+
+def test_breaker_half_open_limits_probes(clock):
+    breaker = CircuitBreaker(reset_timeout=5, half_open_probes=2)
+    breaker.record_failure()
+    clock.now += 5
+
+    assert breaker.allow()
+    assert breaker.allow()
+    assert not breaker.available
+    assert not breaker.allow()
+
+
+def test_breaker_probe_success_closes(clock):
+    breaker = CircuitBreaker(reset_timeout=5)
+    breaker.record_failure()
+    clock.now += 5
+    assert breaker.allow()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    assert breaker.allow()
+    assert breaker.allow()
+
+
+def test_breaker_probe_failure_reopens_with_backoff(clock):
+    breaker = CircuitBreaker(reset_timeout=5, max_reset_timeout=12)
+    breaker.record_failure()
+
+    for timeout in (10, 12, 12):
+        clock.now += breaker.retry_in()
+        assert breaker.allow()
+        breaker.record_failure()
+        assert breaker.state == CircuitBreaker.OPEN
+        assert breaker.retry_in() == timeout
+    assert breaker.stats()["trips"] == 4
+
+    clock.now += 12
+    assert breaker.allow()
+    breaker.record_success()
+    # После успеха срок снова начинается с reset_timeout
+    breaker.record_failure()
+    assert breaker.retry_in() == 5
+
+
+def test_breaker_trip(clock):
+    breaker = CircuitBreaker(reset_timeout=5)
+    breaker.trip(30)
+    assert breaker.state == CircuitBreaker.OPEN
+    assert breaker.retry_in() == 30
+
+
+@pytest.mark.parametrize("options", [{"failure_threshold": 0}, {"half_open_probes": 0}])
+def test_breaker_rejects_invalid_config(options):
+    with pytest.raises(ValueError):
+        CircuitBreaker(**options)
+
+
+def test_breaker_shared_by_config():
+    first = CircuitBreaker.shared({"host": "a", "port": 5432})
+    assert CircuitBreaker.shared({"port": 5432, "host": "a"}) is first
+    assert CircuitBreaker.shared({"host": "b", "port": 5432}) is not first
+
+
+def test_track_node_failure_opens_breaker(clock):
+    node = make_node("replica", reset_timeout=5)
+    balancer = LoadBalancer([node])
+
+    with pytest.raises(OperationalError):
+        with balancer.track(node):
+            raise OperationalError("server closed the connection unexpectedly")
+    assert node.breaker.state == CircuitBreaker.OPEN
+    assert not node.healthy
+    assert balancer.choose() is None
+
+    with pytest.raises(NodeUnavailableError):
+        with balancer.track(node):
+            pass
+
+    clock.now += 5
+    assert balancer.choose() is node
+    with balancer.track(node):
+        pass
+    assert node.breaker.state == CircuitBreaker.CLOSED
+    assert node.stats()["failures"] == 1
+
+
+def test_track_query_error_keeps_node(clock):
+    node = make_node("replica")
+    balancer = LoadBalancer([node])
+    with pytest.raises(errors.UniqueViolation):
+        with balancer.track(node):
+            raise pg_error(errors.UniqueViolation, "23505")
+    assert node.breaker.state == CircuitBreaker.CLOSED
+    assert node.outstanding == 0
+
+
+@pytest.mark.parametrize("error, failure", [
+    (OperationalError("server closed the connection unexpectedly"), True),
+    (pg_error(errors.ConnectionFailure, "08006"), True),
+    (pg_error(errors.AdminShutdown, "57P01"), True),
+    (pg_error(errors.CrashShutdown, "57P02"), True),
+    (pg_error(errors.CannotConnectNow, "57P03"), True),
+    (pg_error(errors.QueryCanceled, "57014"), False),
+    (pg_error(errors.LockNotAvailable, "55P03"), False),
+    (pg_error(errors.OutOfMemory, "53200"), False),
+    (pg_error(errors.DiskFull, "53100"), False),
+    (pg_error(errors.ProgramLimitExceeded, "54000"), False),
+    (pg_error(errors.DeadlockDetected, "40P01"), False),
+    (pg_error(errors.UniqueViolation, "23505"), False),
+    (PoolTimeoutError("pool exhausted"), False),
+    (ValueError("not a database error"), False),
+])
+def test_is_node_failure(error, failure):
+    assert is_node_failure(error) is failure
+
+
+def test_query_canceled_is_not_node_failure():
+    assert not is_node_failure(extensions.QueryCanceledError())
+
+
+def test_choose_skips_excluded_and_ineligible():
+    first, second, third = make_node("r1"), make_node("r2"), make_node("r3")
+    balancer = LoadBalancer([first, second, third])
+    for _ in range(10):
+        assert balancer.choose(exclude=[first], eligible=lambda node: node is not third) is second
+
+
+def test_round_robin():
+    nodes = [make_node("r1"), make_node("r2"), make_node("r3")]
+    policy = RoundRobinPolicy()
+    chosen = [policy.choose(nodes).name for _ in range(6)]
+    assert sorted(chosen) == ["r1", "r1", "r2", "r2", "r3", "r3"]
+    assert chosen[:3] == chosen[3:]
+
+
+def test_weighted_is_smooth():
+    heavy, light = make_node("heavy", weight=2), make_node("light")
+    policy = WeightedPolicy()
+    assert [policy.choose([heavy, light]).name for _ in range(6)] == ["heavy", "light", "heavy"] * 2
+
+
+def test_least_outstanding():
+    busy, idle = make_node("busy"), make_node("idle")
+    busy.outstanding = 3
+    idle.outstanding = 1
+    assert LeastOutstandingPolicy().choose([busy, idle]) is idle
+
+
+def test_lowest_latency_measures_unmeasured_first():
+    slow, fast, new = make_node("slow"), make_node("fast"), make_node("new")
+    slow.latency_ms, fast.latency_ms = 20.0, 2.0
+    policy = LowestLatencyPolicy(exploration=0)
+    assert policy.choose([slow, fast, new]) is new
+    assert policy.choose([slow, fast]) is fast
+
+
+def test_make_policy():
+    assert isinstance(make_policy("weighted"), WeightedPolicy)
+    policy = RoundRobinPolicy()
+    assert make_policy(policy) is policy
+    with pytest.raises(ValueError):
+        make_policy("random")
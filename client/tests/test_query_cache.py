@@ -0,0 +1,228 @@
+"""
+Тесты кэша результатов: запись в таблицу должна убирать из кэша всё, что из неё
+читалось, в том числе результат чтения, начатого до записи и закончившегося после неё.
+
+    cd client
+    python -m pytest tests/test_query_cache.py -q
+"""
+import pytest
+
+import query_cache
+from query_cache import QueryCache, normalize_query, tables_read, tables_written
+
+
+class Clock:
+    """Управляемые часы вместо time.monotonic"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(query_cache.time, "monotonic", clock)
+    return clock
+
+
+def rows(*ids):
+    return [{"id": item_id} for item_id in ids]
+
+
+def test_put_and_get_returns_copy():
+    cache = QueryCache()
+    key = cache.make_key("SELECT * FROM items", None)
+    cache.put(key, rows(1, 2), {"items"})
+
+    result = cache.get(key)
+    assert result == rows(1, 2)
+    result[0]["id"] = 99
+    assert cache.get(key) == rows(1, 2)
+
+
+def test_key_ignores_whitespace_and_depends_on_params():
+    cache = QueryCache()
+    assert cache.make_key("SELECT *\n  FROM items", (1,)) == cache.make_key("SELECT * FROM items", (1,))
+    assert cache.make_key("SELECT * FROM items", (1,)) != cache.make_key("SELECT * FROM items", (2,))
+    assert cache.make_key("SELECT 1", {"b": 2, "a": [1, 2]}) == cache.make_key("SELECT 1", {"a": [1, 2], "b": 2})
+
+
+def test_unhashable_params_are_not_cached():
+    assert QueryCache().make_key("SELECT 1", ({1, 2}, {"a": [1]})) is not None
+    assert QueryCache().make_key("SELECT 1", (bytearray(b"x"),)) is None
+
+
+def test_invalidate_removes_entries_of_table():
+    cache = QueryCache()
+    items = cache.make_key("SELECT * FROM items", None)
+    joined = cache.make_key("SELECT * FROM shipments s JOIN items i ON i.id = s.id", None)
+    employees = cache.make_key("SELECT * FROM employees", None)
+    cache.put(items, rows(1), {"items"})
+    cache.put(joined, rows(2), {"shipments", "items"})
+    cache.put(employees, rows(3), {"employees"})
+
+    assert cache.invalidate({"items"}) == 2
+    assert cache.get(items) is None
+    assert cache.get(joined) is None
+    assert cache.get(employees) == rows(3)
+
+
+def test_invalidate_all():
+    cache = QueryCache()
+    key = cache.make_key("SELECT * FROM items", None)
+    cache.put(key, rows(1), {"items"})
+    cache.invalidate(None)
+    assert cache.get(key) is None
+    assert cache.stats()["entries"] == 0
+
+
+def test_read_started_before_write_is_not_cached():
+    # Чтение сняло версию, запись инвалидировала таблицу, пока чтение шло:
+    # результат мог быть прочитан до записи
+    cache = QueryCache()
+    key = cache.make_key("SELECT * FROM items", None)
+    version = cache.version({"items"})
+    cache.invalidate({"items"})
+    cache.put(key, rows(1), {"items"}, version)
+    assert cache.get(key) is None
+
+
+def test_read_started_before_full_reset_is_not_cached():
+    cache = QueryCache()
+    key = cache.make_key("SELECT * FROM items", None)
+    version = cache.version({"items"})
+    cache.invalidate(None)
+    cache.put(key, rows(1), {"items"}, version)
+    assert cache.get(key) is None
+
+
+def test_write_to_other_table_does_not_block_caching():
+    cache = QueryCache()
+    key = cache.make_key("SELECT * FROM items", None)
+    version = cache.version({"items"})
+    cache.invalidate({"employees"})
+    cache.put(key, rows(1), {"items"}, version)
+    assert cache.get(key) == rows(1)
+
+
+def test_changed_since(clock):
+    cache = QueryCache()
+    assert cache.changed_since({"items"}) is None
+
+    cache.invalidate({"items"})
+    clock.now += 2
+    assert cache.changed_since({"items", "employees"}) == 2
+    assert cache.changed_since({"employees"}) is None
+
+    cache.invalidate({"employees"})
+    clock.now += 1
+    assert cache.changed_since({"items", "employees"}) == 1
+
+
+def test_changed_since_full_reset(clock):
+    cache = QueryCache()
+    cache.invalidate(None)
+    clock.now += 3
+    assert cache.changed_since({"items"}) == 3
+
+
+def test_ttl(clock):
+    cache = QueryCache(ttl=30)
+    key = cache.make_key("SELECT * FROM items", None)
+    cache.put(key, rows(1), {"items"})
+
+    clock.now += 29
+    assert cache.get(key) == rows(1)
+    clock.now += 1
+    assert cache.get(key) is None
+    assert cache.stats()["expirations"] == 1
+
+
+def test_max_age(clock):
+    cache = QueryCache(ttl=30)
+    key = cache.make_key("SELECT * FROM items", None)
+    cache.put(key, rows(1), {"items"})
+
+    clock.now += 5
+    assert cache.get(key, max_age=10) == rows(1)
+    assert cache.get(key, max_age=2) is None
+    # Запись остаётся для запросов без ограничения свежести
+    assert cache.get(key) == rows(1)
+
+
+def test_lru_eviction_by_entries():
+    cache = QueryCache(max_entries=2)
+    first, second, third = (cache.make_key(f"SELECT {n} FROM items", None) for n in range(3))
+    cache.put(first, rows(1), {"items"})
+    cache.put(second, rows(2), {"items"})
+    cache.get(first)
+    cache.put(third, rows(3), {"items"})
+
+    assert cache.get(second) is None
+    assert cache.get(first) == rows(1)
+    assert cache.get(third) == rows(3)
+    assert cache.stats()["evictions"] == 1
+
+
+def test_eviction_by_rows():
+    cache = QueryCache(max_rows=3)
+    first = cache.make_key("SELECT 1 FROM items", None)
+    second = cache.make_key("SELECT 2 FROM items", None)
+    cache.put(first, rows(1, 2), {"items"})
+    cache.put(second, rows(3, 4), {"items"})
+
+    assert cache.get(first) is None
+    assert cache.get(second) == rows(3, 4)
+    assert cache.stats()["rows"] == 2
+
+
+def test_result_larger_than_limit_is_not_cached():
+    cache = QueryCache(max_rows=2)
+    key = cache.make_key("SELECT * FROM items", None)
+    cache.put(key, rows(1, 2, 3), {"items"})
+    assert cache.get(key) is None
+
+
+def test_hit_ratio():
+    cache = QueryCache()
+    key = cache.make_key("SELECT * FROM items", None)
+    assert cache.stats()["hit_ratio"] is None
+    cache.get(key)
+    cache.put(key, rows(1), {"items"})
+    cache.get(key)
+    assert cache.stats()["hit_ratio"] == 0.5
+
+
+def test_normalize_query():
+    assert normalize_query("  SELECT *\n\tFROM   items  ") == "SELECT * FROM items"
+
+
+@pytest.mark.parametrize("query, tables", [
+    ("SELECT * FROM items", {"items"}),
+    ("SELECT * FROM public.items", {"items"}),
+    ('SELECT * FROM "Items"', {"items"}),
+    ("SELECT * FROM items i, warehouses AS w WHERE i.warehouse_id = w.id", {"items", "warehouses"}),
+    ("SELECT * FROM shipments s JOIN employees e ON e.id = s.courier_id LEFT JOIN warehouses w ON true",
+     {"shipments", "employees", "warehouses"}),
+    ("SELECT * FROM items WHERE id IN (SELECT item_id FROM shipment_items)", {"items", "shipment_items"}),
+    ("SELECT 1", set()),
+])
+def test_tables_read(query, tables):
+    assert tables_read(query) == tables
+
+
+@pytest.mark.parametrize("query, tables", [
+    ("INSERT INTO items (name) VALUES ('a')", {"items"}),
+    ("UPDATE public.items SET quantity = 0", {"items"}),
+    ("DELETE FROM shipment_items WHERE shipment_id = 1", {"shipment_items"}),
+    ("TRUNCATE TABLE items", {"items"}),
+    ("UPDATE ONLY items SET quantity = 0", {"items"}),
+    ("WITH t AS (SELECT 1) UPDATE items SET quantity = 0", None),
+    ("CREATE INDEX ON items (name)", None),
+    ("SELECT refresh_stock()", None),
+])
+def test_tables_written(query, tables):
+    assert tables_written(query) == tables
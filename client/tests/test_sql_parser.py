@@ -0,0 +1,197 @@
+"""
+Тесты разбора SQL: classify решает, уйдёт ли запрос на реплику, поэтому ошибка
+в нём отправляет запись на реплику; split_statements делит скрипты на запросы.
+
+    cd client
+    python -m pytest tests/test_sql_parser.py -q
+"""
+import pytest
+
+from sql_parser import classify, split_statements
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT * FROM items WHERE id = %s",
+    "  select id from items",
+    "(SELECT 1) UNION (SELECT 2)",
+    "VALUES (1), (2)",
+    "TABLE items",
+    "SHOW server_version",
+    "WITH recent AS (SELECT * FROM shipments ORDER BY id DESC LIMIT 10) SELECT * FROM recent",
+    "SELECT id, last_update, updated_at FROM items",
+    'SELECT "update", "insert" FROM "for"',
+    "SELECT * FROM items FOR READ ONLY",
+])
+def test_read_only(query):
+    result = classify(query)
+    assert result.read_only, result.reason
+    assert result.reason is None
+
+
+@pytest.mark.parametrize("query, command", [
+    ("INSERT INTO items (name) VALUES ('a')", "insert"),
+    ("UPDATE items SET quantity = 0", "update"),
+    ("DELETE FROM items", "delete"),
+    ("TRUNCATE items", "truncate"),
+    ("CREATE TABLE t (id int)", "create"),
+    ("CALL refresh_stock()", "call"),
+])
+def test_write_commands(query, command):
+    result = classify(query)
+    assert not result.read_only
+    assert result.command == command
+
+
+@pytest.mark.parametrize("query, command", [
+    ("WITH gone AS (DELETE FROM items WHERE id = 1 RETURNING *) SELECT * FROM gone", "select"),
+    ("WITH moved AS (UPDATE items SET warehouse_id = 2 RETURNING id) SELECT count(*) FROM moved", "select"),
+    ("WITH new AS (INSERT INTO items (name) VALUES ('a') RETURNING id) SELECT id FROM new", "select"),
+    ("WITH a AS (SELECT 1), b AS (WITH c AS (DELETE FROM items RETURNING id) SELECT * FROM c) SELECT * FROM b",
+     "select"),
+    ("WITH ids AS (SELECT id FROM items) DELETE FROM shipment_items WHERE item_id IN (SELECT id FROM ids)",
+     "delete"),
+])
+def test_write_inside_cte(query, command):
+    result = classify(query)
+    assert not result.read_only
+    assert result.command == command
+    assert "изменение данных" in result.reason
+
+
+@pytest.mark.parametrize("lock", ["FOR UPDATE", "FOR NO KEY UPDATE", "FOR SHARE", "FOR KEY SHARE",
+                                  "for update of items nowait", "FOR UPDATE SKIP LOCKED"])
+def test_row_locks(lock):
+    result = classify(f"SELECT * FROM items WHERE id = 1 {lock}")
+    assert not result.read_only
+    assert result.command == "select"
+
+
+def test_row_lock_inside_cte():
+    result = classify("WITH s AS (SELECT id FROM items ORDER BY id FOR UPDATE) SELECT * FROM s")
+    assert not result.read_only
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT * INTO items_copy FROM items",
+    "SELECT id, name INTO TEMP t FROM items",
+    "WITH s AS (SELECT 1 AS x) SELECT x INTO t FROM s",
+])
+def test_select_into(query):
+    result = classify(query)
+    assert not result.read_only
+    assert result.reason == "SELECT INTO"
+
+
+@pytest.mark.parametrize("function", ["nextval", "setval", "pg_notify", "pg_advisory_lock",
+                                      "pg_try_advisory_xact_lock", "txid_current", "set_config"])
+def test_write_functions(function):
+    result = classify(f"SELECT {function}('x')")
+    assert not result.read_only
+    assert result.reason == f"функция {function}()"
+
+
+def test_write_function_upper_case_and_nested():
+    assert not classify("SELECT id FROM items WHERE id = (SELECT NEXTVAL('items_id_seq'))").read_only
+
+
+def test_write_function_name_without_call():
+    # Столбец или псевдоним с именем функции — не вызов
+    assert classify("SELECT nextval FROM sequences_view").read_only
+    assert classify("SELECT 1 AS pg_notify").read_only
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT 1 -- FOR UPDATE",
+    "SELECT 1 /* DELETE FROM items */",
+    "SELECT 1 /* outer /* nested DELETE */ still a comment; UPDATE */",
+    "SELECT 'DELETE FROM items; FOR UPDATE' AS text",
+    "SELECT E'it\\'s INSERT' AS text",
+    "SELECT 'it''s UPDATE' AS text",
+    "SELECT $$DELETE FROM items$$ AS body",
+    "SELECT $fn$ INSERT INTO t VALUES (1); SELECT nextval('s') $fn$ AS body",
+    'SELECT "delete" FROM items',
+    "SELECT 'nextval(' || name || ')' FROM items",
+])
+def test_keywords_hidden_in_comments_and_strings(query):
+    result = classify(query)
+    assert result.read_only, result.reason
+
+
+def test_leading_comment_does_not_hide_write():
+    result = classify("/* отчёт */ -- по складам\nDELETE FROM items")
+    assert not result.read_only
+    assert result.command == "delete"
+
+
+def test_dollar_body_does_not_hide_write_after_it():
+    result = classify("SELECT $$ harmless $$; DELETE FROM items")
+    assert not result.read_only
+
+
+@pytest.mark.parametrize("query", ["", "   ", "-- только комментарий", "/* */"])
+def test_empty(query):
+    result = classify(query)
+    assert not result.read_only
+    assert result.command == ""
+
+
+@pytest.mark.parametrize("script, statements", [
+    ("SELECT 1; SELECT 2", ["SELECT 1", "SELECT 2"]),
+    ("SELECT 1;\n\nSELECT 2;\n", ["SELECT 1", "SELECT 2"]),
+    ("SELECT 1;;  ;SELECT 2", ["SELECT 1", "SELECT 2"]),
+    ("SELECT 1", ["SELECT 1"]),
+    ("", []),
+])
+def test_split_simple(script, statements):
+    assert split_statements(script) == statements
+
+
+@pytest.mark.parametrize("script, statements", [
+    ("SELECT 'a;b'; SELECT 2", ["SELECT 'a;b'", "SELECT 2"]),
+    ("SELECT 'it''s; fine'; SELECT 2", ["SELECT 'it''s; fine'", "SELECT 2"]),
+    ("SELECT E'\\'; still'; SELECT 2", ["SELECT E'\\'; still'", "SELECT 2"]),
+    ('SELECT 1 AS "a;b"; SELECT 2', ['SELECT 1 AS "a;b"', "SELECT 2"]),
+])
+def test_split_ignores_semicolons_in_strings(script, statements):
+    assert split_statements(script) == statements
+
+
+@pytest.mark.parametrize("script, statements", [
+    ("SELECT 1 -- конец; не запрос\n; SELECT 2", ["SELECT 1 -- конец; не запрос", "SELECT 2"]),
+    ("SELECT /* a; b */ 1; SELECT 2", ["SELECT /* a; b */ 1", "SELECT 2"]),
+    ("SELECT /* a /* b; */ c; */ 1; SELECT 2", ["SELECT /* a /* b; */ c; */ 1", "SELECT 2"]),
+    ("-- только комментарий;\n; /* и этот; */ ; SELECT 1", ["SELECT 1"]),
+])
+def test_split_ignores_semicolons_in_comments(script, statements):
+    assert split_statements(script) == statements
+
+
+def test_split_dollar_quoted_function_body():
+    function = (
+        "CREATE FUNCTION notify() RETURNS trigger AS $$\n"
+        "BEGIN\n"
+        "    PERFORM pg_notify('changes', TG_TABLE_NAME);\n"
+        "    RETURN NULL;\n"
+        "END;\n"
+        "$$ LANGUAGE plpgsql"
+    )
+    assert split_statements(f"{function};\nSELECT 1;") == [function, "SELECT 1"]
+
+
+def test_split_dollar_quoted_with_tag():
+    body = "DO $body$ BEGIN RAISE NOTICE '$$;'; END $body$"
+    assert split_statements(f"{body}; SELECT 2") == [body, "SELECT 2"]
+
+
+def test_split_unterminated_dollar_quote_runs_to_end():
+    assert split_statements("SELECT 1; SELECT $$ a; b") == ["SELECT 1", "SELECT $$ a; b"]
+
+
+def test_split_begin_atomic_body():
+    function = (
+        "CREATE FUNCTION add(a int, b int) RETURNS int LANGUAGE sql BEGIN ATOMIC\n"
+        "    SELECT CASE WHEN a IS NULL THEN 0 ELSE a END + b;\n"
+        "    SELECT 1;\n"
+        "END"
+    )
+    assert split_statements(f"{function}; SELECT 2") == [function, "SELECT 2"]
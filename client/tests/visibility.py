@@ -0,0 +1,140 @@
+import threading
+import time
+import uuid
+
+from load_balancer import Node
+from sql_manager import PostgreSQLManager
+
+from .recorder import Recorder
+from .workloads import BENCH_PREFIX, INSERT_ITEM_QUERY
+
+
+# Префикс имён помеченных строк пробы видимости
+PROBE_PREFIX = f"{BENCH_PREFIX}vis:"
+
+
+class VisibilityTimeoutError(RuntimeError):
+    """Запись мастера не появилась на реплике за отведённое время"""
+
+
+class VisibilityProbe:
+    """
+    Замер задержки видимости: на мастер с заданной интенсивностью пишутся помеченные
+    строки, а по потоку на реплику опрашивают, когда каждая из них стала видна.
+    Задержка считается от момента, когда коммит вернулся клиенту, до первого опроса,
+    который нашёл строку, поэтому её точность — poll_interval плюс время одного опроса.
+    """
+
+    def __init__(
+        self,
+        manager: PostgreSQLManager,
+        rate: float = 20.0,
+        poll_interval: float = 0.002,
+        timeout: float = 30.0
+    ):
+        """
+        :param rate: помеченных строк в секунду
+        :param poll_interval: пауза между опросами реплики, с
+        :param timeout: через сколько секунд невидимая строка считается ошибкой
+        """
+        self.manager = manager
+        self.rate = rate
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self._pending: dict[str, dict[str, float]] = {}  # реплика -> метка -> время коммита
+        self._lock = threading.Lock()
+
+    def setup(self) -> None:
+        query = self.manager.execute_query
+        categories = query("SELECT id FROM item_categories LIMIT 1", fetch=True, row_format="tuple")
+        warehouses = query("SELECT id FROM warehouses LIMIT 1", fetch=True, row_format="tuple")
+        if not categories or not warehouses:
+            raise RuntimeError("Нет категорий или складов для создания товаров")
+        self.category_id, self.warehouse_id = categories[0][0], warehouses[0][0]
+
+    def run(self, duration: float) -> tuple[Recorder, dict[str, Recorder]]:
+        """
+        Пишет строки duration секунд и ждёт их появления на всех репликах (не дольше timeout).
+
+        :return: замеры записи на мастер и замеры видимости по репликам
+        """
+        writes = Recorder()
+        visibility = {node.name: Recorder() for node in self.manager.replica_nodes}
+        self._pending = {name: {} for name in visibility}
+        writing = threading.Event()
+        writing.set()
+        pollers = [
+            threading.Thread(
+                target=self._poll, args=(node, visibility[node.name], writing), name=f"visibility-{node.name}",
+                daemon=True
+            )
+            for node in self.manager.replica_nodes
+        ]
+        for poller in pollers:
+            poller.start()
+        try:
+            self._write(duration, writes)
+        finally:
+            writing.clear()
+            for poller in pollers:
+                poller.join()
+        return writes, visibility
+
+    def teardown(self) -> None:
+        self.manager.execute_query("DELETE FROM items WHERE name LIKE %s", params=(f"{PROBE_PREFIX}%",))
+
+    def _write(self, duration: float, recorder: Recorder) -> None:
+        started = time.perf_counter()
+        for n in range(int(duration * self.rate)):
+            due = started + n / self.rate
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            token = uuid.uuid4().hex
+            begin = time.perf_counter()
+            try:
+                self.manager.execute_query(INSERT_ITEM_QUERY, params=(
+                    f"{PROBE_PREFIX}{token}", "Проба видимости", token, self.category_id, 1, self.warehouse_id, 1
+                ), fetch=True, row_format="tuple")
+            except Exception as error:
+                recorder.record((time.perf_counter() - begin) * 1000, error)
+                continue
+            committed = time.perf_counter()
+            recorder.record((committed - begin) * 1000)
+            with self._lock:
+                for pending in self._pending.values():
+                    pending[token] = committed
+
+    def _poll(self, node: Node, recorder: Recorder, writing: threading.Event) -> None:
+        pending = self._pending[node.name]
+        try:
+            # Пул узла напрямую, без балансировщика: при отказе реплики чтение не должно уйти на мастер
+            with node.pool.connection() as conn:
+                while self._poll_once(conn, node, pending, recorder) or writing.is_set():
+                    time.sleep(self.poll_interval)
+        except Exception as error:
+            # Реплика недоступна: все ожидающие строки — ошибки, новые больше не ждём
+            with self._lock:
+                for _ in range(max(len(pending), 1)):
+                    recorder.record(0, error)
+                self._pending.pop(node.name, None)
+
+    def _poll_once(self, conn, node: Node, pending: dict[str, float], recorder: Recorder) -> bool:
+        """Один опрос реплики; True — ещё есть невидимые строки"""
+        with self._lock:
+            tokens = list(pending)
+        if not tokens:
+            return False
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT barcode FROM items WHERE barcode = ANY(%s)", (tokens,))
+            found = [row[0] for row in cursor.fetchall()]
+        # Транзакция опроса не держится открытой между опросами
+        conn.rollback()
+        now = time.perf_counter()
+        with self._lock:
+            for token in found:
+                recorder.record((now - pending.pop(token)) * 1000)
+            for token in [token for token, committed in pending.items() if now - committed > self.timeout]:
+                del pending[token]
+                recorder.record(0, VisibilityTimeoutError(f"Строка не видна на {node.name} за {self.timeout:g} с"))
+            return bool(pending)
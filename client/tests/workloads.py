@@ -0,0 +1,346 @@
+import random
+import time
+import uuid
+
+from psycopg2 import errors
+
+from shipment_service import ShipmentService
+from sql_manager import PostgreSQLManager
+
+from .recorder import Recorder
+
+
+# Префикс имён товаров, которые создают нагрузки записи (по нему убираются остатки)
+BENCH_PREFIX = "bench:"
+
+# Запрос списка выдач из ShipmentView.load_data
+SHIPMENT_LIST_QUERY = """
+SELECT s.id, w.name AS warehouse, s.status, e.first_name || ' ' || e.last_name AS courier,
+       s.created_at, s.completed_at
+FROM shipments s
+LEFT JOIN warehouses w ON s.warehouse_id = w.id
+LEFT JOIN employees e ON s.courier_id = e.id
+WHERE s.status = %s
+ORDER BY s.created_at DESC
+"""
+
+INSERT_ITEM_QUERY = """
+INSERT INTO items (name, description, barcode, category_id, weight, warehouse_id, quantity)
+VALUES (%s, %s, %s, %s, %s, %s, %s) RETURNING id
+"""
+
+# Запросы жизненного цикла выдачи: ShipmentForm.save, ShipmentView.complete_shipment
+CREATE_SHIPMENT_QUERY = "INSERT INTO shipments (warehouse_id, status) VALUES (%s, 'PENDING') RETURNING id"
+INSERT_SHIPMENT_ITEMS_QUERY = "INSERT INTO shipment_items (shipment_id, item_id, quantity) VALUES %s"
+COURIERS_QUERY = """
+SELECT e.id, (e.first_name || ' ' || e.last_name) AS name, e.phone, w.name AS warehouse
+FROM employees e
+JOIN warehouses w ON e.warehouse_id = w.id
+WHERE e.position = 'courier' AND e.warehouse_id = %s
+"""
+COMPLETE_SHIPMENT_QUERY = """
+UPDATE shipments
+SET courier_id = %s, status = 'COMPLETED', completed_at = NOW()
+WHERE id = %s
+"""
+SET_STOCK_QUERY = "UPDATE items i SET quantity = v.quantity FROM (VALUES %s) AS v(id, quantity) WHERE i.id = v.id"
+
+# Ошибки конкурентного доступа: ожидание блокировки дольше lock_timeout, взаимоблокировка
+CONFLICT_ERRORS = (errors.LockNotAvailable, errors.DeadlockDetected, errors.SerializationFailure)
+
+
+class Workload:
+    """
+    Нагрузка бенчмарка: run() выполняет одну операцию и вызывается из многих
+    потоков одновременно, поэтому после setup() состояние нагрузки только читается.
+    setup() и teardown() выполняются один раз в главном процессе; процессы нагрузки
+    получают копию подготовленного объекта (см. process_driver.run_in_processes).
+    """
+
+    name = ""
+    description = ""
+
+    def setup(self, manager: PostgreSQLManager) -> None:
+        """Готовит данные перед прогревом (один раз на запуск)"""
+
+    def run(self, manager: PostgreSQLManager, recorder: Recorder) -> None:
+        raise NotImplementedError
+
+    def teardown(self, manager: PostgreSQLManager) -> None:
+        """Убирает данные, оставшиеся после запуска"""
+
+
+class PointRead(Workload):
+    name = "point_read"
+    description = "Чтение товара по первичному ключу"
+
+    def setup(self, manager: PostgreSQLManager) -> None:
+        rows = manager.execute_query("SELECT id FROM items", fetch=True, row_format="tuple", use_cache=False)
+        if not rows:
+            raise RuntimeError("Таблица items пуста: нечего читать")
+        self.ids = [row[0] for row in rows]
+
+    def run(self, manager: PostgreSQLManager, recorder: Recorder) -> None:
+        manager.execute_query("SELECT * FROM items WHERE id = %s", params=(random.choice(self.ids),), fetch=True)
+
+
+class FullScan(Workload):
+    name = "full_scan"
+    description = "Чтение всей таблицы items"
+
+    def run(self, manager: PostgreSQLManager, recorder: Recorder) -> None:
+        manager.execute_query("SELECT * FROM items", fetch=True)
+
+
+class ShipmentList(Workload):
+    name = "shipment_list"
+    description = "Список выдач по статусу со складом и курьером (ShipmentView.load_data)"
+
+    STATUSES = ("PENDING", "PREPARED", "COMPLETED")
+
+    def run(self, manager: PostgreSQLManager, recorder: Recorder) -> None:
+        manager.execute_query(SHIPMENT_LIST_QUERY, params=(random.choice(self.STATUSES),), fetch=True)
+
+
+class WriteCycle(Workload):
+    name = "write_cycle"
+    description = "INSERT товара, UPDATE и DELETE по возвращённому id"
+
+    def setup(self, manager: PostgreSQLManager) -> None:
+        categories = manager.execute_query("SELECT id FROM item_categories", fetch=True, row_format="tuple")
+        warehouses = manager.execute_query("SELECT id FROM warehouses", fetch=True, row_format="tuple")
+        if not categories or not warehouses:
+            raise RuntimeError("Нет категорий или складов для создания товаров")
+        self.category_ids = [row[0] for row in categories]
+        self.warehouse_ids = [row[0] for row in warehouses]
+
+    def run(self, manager: PostgreSQLManager, recorder: Recorder) -> None:
+        token = uuid.uuid4().hex
+        with recorder.step("insert"):
+            rows = manager.execute_query(INSERT_ITEM_QUERY, params=(
+                f"{BENCH_PREFIX}{token}", "Товар для бенчмарка", token,
+                random.choice(self.category_ids), round(random.uniform(0.1, 10.0), 2),
+                random.choice(self.warehouse_ids), 10
+            ), fetch=True, row_format="tuple")
+        item_id = rows[0][0]
+        with recorder.step("update"):
+            manager.execute_query(
+                "UPDATE items SET name = %s, quantity = quantity + 1 WHERE id = %s",
+                params=(f"{BENCH_PREFIX}{token}:updated", item_id)
+            )
+        with recorder.step("delete"):
+            manager.execute_query("DELETE FROM items WHERE id = %s", params=(item_id,))
+
+    def teardown(self, manager: PostgreSQLManager) -> None:
+        manager.execute_query("DELETE FROM items WHERE name LIKE %s", params=(f"{BENCH_PREFIX}%",))
+
+
+class Mixed(Workload):
+    """Смесь нагрузок в заданной пропорции; задержки каждой части — отдельные шаги"""
+
+    def __init__(self, weights: dict[str, float], name: str = "mixed"):
+        """
+        :param weights: имя нагрузки -> доля (в любых единицах, например процентах)
+        """
+        if not weights or any(weight <= 0 for weight in weights.values()):
+            raise ValueError(f"Некорректные доли смеси: {weights}")
+        self.name = name
+        self.parts = [make_workload(part) for part in weights]
+        self.weights = list(weights.values())
+        self.description = "Смесь: " + ", ".join(f"{part}={weight:g}" for part, weight in weights.items())
+
+    def setup(self, manager: PostgreSQLManager) -> None:
+        for part in self.parts:
+            part.setup(manager)
+
+    def run(self, manager: PostgreSQLManager, recorder: Recorder) -> None:
+        part = random.choices(self.parts, weights=self.weights)[0]
+        with recorder.step(part.name):
+            part.run(manager, recorder)
+
+    def teardown(self, manager: PostgreSQLManager) -> None:
+        for part in self.parts:
+            part.teardown(manager)
+
+
+class ShipmentWorkflow(Workload):
+    """
+    Жизненный цикл выдачи, как в окнах: создание с корзиной товаров (ShipmentForm.save),
+    сборка со списанием остатков (ShipmentView.prepare_shipment), выбор курьера
+    и завершение (ShipmentView.complete_shipment).
+
+    Конкуренцию задают «горячие» товары: с вероятностью hot_ratio позиция корзины берётся
+    из первых hot_items товаров склада. Исходы считаются счётчиками: shipments_completed,
+    short_stock (не хватило товара, выдача осталась PENDING), conflict (ошибка блокировки).
+
+    Нагрузка меняет данные: остатки товаров восстанавливаются в teardown, а выдачи,
+    созданные после setup (id больше запомненного), удаляются — запускайте её на тестовой базе.
+    Остатки выставляются и восстанавливаются только в главном процессе: процессы нагрузки
+    получают уже подготовленный объект и setup/teardown не вызывают.
+    """
+
+    name = "shipment_workflow"
+
+    def __init__(self, basket: int = 3, max_quantity: int = 3, hot_items: int = 5, hot_ratio: float = 0.5,
+                 stock: int | None = 1000):
+        """
+        :param basket: наибольшее число позиций в корзине (берётся случайно от 1)
+        :param max_quantity: наибольшее количество одного товара в позиции
+        :param hot_items: сколько товаров каждого склада считаются горячими
+        :param hot_ratio: вероятность, что позиция корзины — горячий товар
+        :param stock: остаток, который выставляется товарам перед запуском; None — как есть
+        """
+        self.basket = int(basket)
+        self.max_quantity = int(max_quantity)
+        self.hot_items = max(int(hot_items), 1)
+        self.hot_ratio = hot_ratio
+        self.stock = None if stock is None else int(stock)
+        self.description = (
+            f"Создание, сборка и завершение выдачи (корзина до {self.basket}, "
+            f"горячих товаров {self.hot_items} с долей {hot_ratio:g}, остаток {stock})"
+        )
+
+    def setup(self, manager: PostgreSQLManager) -> None:
+        # Остатки и последний id читаются с мастера, без отставания реплик:
+        # по ним данные восстанавливаются после запуска
+        items = manager.execute_query(
+            "SELECT id, warehouse_id, quantity FROM items WHERE warehouse_id IS NOT NULL ORDER BY id",
+            fetch=True, row_format="tuple", use_master=True
+        )
+        couriers = manager.execute_query(
+            "SELECT warehouse_id, count(*) FROM employees WHERE position = 'courier' GROUP BY warehouse_id",
+            fetch=True, row_format="tuple", use_cache=False
+        )
+        self.items: dict[int, list[int]] = {}
+        for item_id, warehouse_id, _ in items:
+            self.items.setdefault(warehouse_id, []).append(item_id)
+        # Склады, где есть и товары, и курьеры
+        self.warehouse_ids = sorted(set(self.items) & {row[0] for row in couriers})
+        if not self.warehouse_ids:
+            raise RuntimeError("Нет складов с товарами и курьерами")
+        rows = manager.execute_query(
+            "SELECT COALESCE(max(id), 0) FROM shipments", fetch=True, row_format="tuple", use_master=True
+        )
+        self.first_shipment_id = rows[0][0]
+        self.original_stock = [(item_id, quantity) for item_id, _, quantity in items]
+        if self.stock is not None:
+            manager.execute_batch(SET_STOCK_QUERY, [(item_id, self.stock) for item_id, _, _ in items])
+
+    def choose_basket(self, warehouse_id: int) -> list[tuple[int, int]]:
+        """Позиции корзины (товар, количество) без повторов товаров"""
+        items = self.items[warehouse_id]
+        hot = items[:self.hot_items]
+        basket = {}
+        for _ in range(random.randint(1, self.basket)):
+            item_id = random.choice(hot if random.random() < self.hot_ratio else items)
+            basket[item_id] = random.randint(1, self.max_quantity)
+        return list(basket.items())
+
+    def run(self, manager: PostgreSQLManager, recorder: Recorder) -> None:
+        try:
+            self.lifecycle(manager, recorder)
+        except CONFLICT_ERRORS:
+            # Сборки одних и тех же горячих товаров ждут друг друга дольше lock_timeout;
+            # взаимоблокировки ShipmentService.prepare повторяет сам
+            recorder.count("conflict")
+            raise
+
+    def lifecycle(self, manager: PostgreSQLManager, recorder: Recorder) -> None:
+        warehouse_id = random.choice(self.warehouse_ids)
+        with recorder.step("create"):
+            rows = manager.execute_query(CREATE_SHIPMENT_QUERY, params=(warehouse_id,), fetch=True, row_format="tuple")
+            shipment_id = rows[0][0]
+            manager.execute_batch(
+                INSERT_SHIPMENT_ITEMS_QUERY,
+                [(shipment_id, item_id, quantity) for item_id, quantity in self.choose_basket(warehouse_id)]
+            )
+        with recorder.step("prepare"):
+            short = ShipmentService(manager).prepare(shipment_id)
+        if short:
+            recorder.count("short_stock")
+            return
+        with recorder.step("assign"):
+            couriers = manager.execute_query(
+                COURIERS_QUERY, params=(warehouse_id,), use_replica=True, fetch=True, row_format="tuple"
+            )
+        with recorder.step("complete"):
+            manager.execute_query(
+                COMPLETE_SHIPMENT_QUERY, params=(random.choice(couriers)[0] if couriers else None, shipment_id)
+            )
+        recorder.count("shipments_completed")
+
+    def teardown(self, manager: PostgreSQLManager) -> None:
+        created = "SELECT id FROM shipments WHERE id > %s"
+        manager.execute_query(
+            f"DELETE FROM shipment_items WHERE shipment_id IN ({created})", params=(self.first_shipment_id,)
+        )
+        manager.execute_query("DELETE FROM shipments WHERE id > %s", params=(self.first_shipment_id,))
+        if self.stock is not None:
+            manager.execute_batch(SET_STOCK_QUERY, self.original_stock)
+
+
+def run_operation(workload: Workload, manager: PostgreSQLManager, recorder: Recorder, started: float) -> None:
+    """
+    Выполняет одну операцию нагрузки и учитывает её задержку от момента started (perf_counter).
+    В открытом цикле started — запланированное время запроса, поэтому в задержку входит
+    и ожидание в очереди генератора.
+    """
+    try:
+        workload.run(manager, recorder)
+    except Exception as error:
+        recorder.record((time.perf_counter() - started) * 1000, error)
+    else:
+        recorder.record((time.perf_counter() - started) * 1000)
+
+
+WORKLOADS = {
+    "point_read": PointRead,
+    "full_scan": FullScan,
+    "shipment_list": ShipmentList,
+    "write_cycle": WriteCycle,
+    "mixed": lambda: Mixed({"point_read": 80, "shipment_list": 10, "write_cycle": 10}),
+    "shipment_workflow": ShipmentWorkflow,
+}
+
+
+def _parse_value(value: str) -> int | float | None:
+    if value.lower() == "none":
+        return None
+    return int(value) if value.lstrip("-").isdigit() else float(value)
+
+
+def make_workload(spec: str) -> Workload:
+    """
+    Нагрузка по имени из WORKLOADS, с параметрами вида shipment_workflow:hot_items=2,hot_ratio=0.9
+    или смесь вида mix:point_read=90,write_cycle=10
+
+    :raises ValueError: если нагрузка или параметр неизвестны
+    """
+    if spec.startswith("mix:"):
+        weights = {}
+        for part in spec[len("mix:"):].split(","):
+            name, _, weight = part.partition("=")
+            try:
+                weights[name.strip()] = float(weight)
+            except ValueError:
+                raise ValueError(f"Некорректная доля в смеси {spec}: {part}") from None
+        return Mixed(weights, name=spec)
+    name, _, options = spec.partition(":")
+    factory = WORKLOADS.get(name)
+    if factory is None:
+        raise ValueError(f"Неизвестная нагрузка: {name} (доступны: {', '.join(WORKLOADS)}, mix:...)")
+    if not options:
+        return factory()
+    params = {}
+    for option in options.split(","):
+        key, _, value = option.partition("=")
+        try:
+            params[key.strip()] = _parse_value(value.strip())
+        except ValueError:
+            raise ValueError(f"Некорректный параметр нагрузки {spec}: {option}") from None
+    try:
+        workload = factory(**params)
+    except TypeError as e:
+        raise ValueError(f"Некорректные параметры нагрузки {spec}: {e}") from None
+    workload.name = spec
+    return workload
@@ -4,7 +4,40 @@ from tkinter import ttk, messagebox
 from sql_manager import PostgreSQLManager
 
 
-class BaseView(ttk.Frame):
+class ChangeWatcherMixin:
+    """
+    Перезагрузка окна по уведомлениям об изменениях (см. ChangeListener).
+    Окно задаёт self.manager, load_data() и watched_tables() и вызывает watch_changes()
+    после создания виджетов.
+    """
+
+    def watch_changes(self):
+        """Подписывает окно на уведомления об изменениях, если менеджер их слушает"""
+        self.data_changed = False
+        listener = self.manager.change_listener
+        if listener is None:
+            return
+        listener.subscribe(self.on_data_changed)
+        self.bind("<Destroy>", lambda e: listener.unsubscribe(self.on_data_changed))
+        self.after(1000, self.poll_changes)
+
+    def watched_tables(self):
+        """Таблицы, изменение которых требует перезагрузки окна"""
+        raise NotImplementedError("Метод watched_tables() должен быть переопределён")
+
+    def on_data_changed(self, table, node_name):
+        # Вызывается из фонового потока: только запоминаем событие
+        if table is None or table in self.watched_tables():
+            self.data_changed = True
+
+    def poll_changes(self):
+        if self.data_changed:
+            self.data_changed = False
+            self.load_data()
+        self.after(1000, self.poll_changes)
+
+
+class BaseView(ChangeWatcherMixin, ttk.Frame):
     def __init__(self, parent, table_name, columns):
         super().__init__(parent)
         self.manager = PostgreSQLManager()
@@ -12,6 +45,7 @@ class BaseView(ttk.Frame):
         self.columns = columns
 
         self.create_widgets()
+        self.watch_changes()
 
     def edit_selected(self):
         selected = self.tree.selection()
@@ -53,6 +87,9 @@ class BaseView(ttk.Frame):
         for record in result:
             self.tree.insert('', 'end', values=tuple(record[col] for col in self.columns), tags=(record['id'],))
 
+    def watched_tables(self):
+        return {self.table_name}
+
     def get_fields(self):
         """
         Шаблонный метод: должен возвращать список полей, доступных для редактирования
@@ -13,11 +13,17 @@ class ConnectionStatusBar(ttk.Frame):
         self.replica_label = ttk.Label(self, text="Replica: ...", width=30)
         self.replica_label.pack(side='left', padx=10)
 
+        self.mode_label = ttk.Label(self, text="", width=40)
+        self.mode_label.pack(side='left', padx=10)
+
         self.update_status()
 
     def update_status(self):
-        self.check_and_update_label(self.master_label, use_replica=False)
-        self.check_and_update_label(self.replica_label, use_replica=True)
+        # Проверки идут через выключатели узлов: недоступный узел не задерживает окно
+        # таймаутом подключения, а проверяется пробой раз в NODE_RETRY_INTERVAL
+        master_ok = self.check_and_update_label(self.master_label, use_replica=False)
+        replica_ok = self.check_and_update_label(self.replica_label, use_replica=True)
+        self.update_mode(master_ok, replica_ok)
         self.after(5000, self.update_status)  # обновление каждые 5 секунд
 
     def check_and_update_label(self, label, use_replica):
@@ -30,3 +36,14 @@ class ConnectionStatusBar(ttk.Frame):
             color = "red"
             text = f"{name}: ✖️ (недоступна)"
         label.config(text=text, foreground=color)
+        return success
+
+    def update_mode(self, master_ok, replica_ok):
+        if master_ok and replica_ok:
+            self.mode_label.config(text="")
+        elif replica_ok:
+            self.mode_label.config(text="Только чтение: изменения недоступны", foreground="orange")
+        elif master_ok:
+            self.mode_label.config(text="Чтение выполняется на мастере", foreground="orange")
+        else:
+            self.mode_label.config(text="Нет соединения с базой данных", foreground="red")
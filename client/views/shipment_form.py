@@ -157,13 +157,14 @@ class ShipmentForm(ttk.Frame):
         result = self.manager.execute_query(query, params=(warehouse_id,), fetch=True)
         shipment_id = result[0]['id']
 
-        # Добавляем товары
-        for item_id, quantity in selected_items:
-            query = """
-            INSERT INTO shipment_items (shipment_id, item_id, quantity)
-            VALUES (%s, %s, %s)
-            """
-            self.manager.execute_query(query, params=(shipment_id, item_id, quantity))
+        # Добавляем товары одним запросом
+        query = """
+        INSERT INTO shipment_items (shipment_id, item_id, quantity)
+        VALUES %s
+        """
+        self.manager.execute_batch(
+            query, [(shipment_id, item_id, quantity) for item_id, quantity in selected_items]
+        )
 
         messagebox.showinfo("Успех", "Выдача создана")
         self.master.destroy()
@@ -2,18 +2,22 @@
 import tkinter as tk
 from tkinter import ttk, messagebox, simpledialog
 from sql_manager import PostgreSQLManager
+from shipment_service import ShipmentService
+from .base_view import ChangeWatcherMixin
 from .shipment_form import ShipmentForm
 
 
-class ShipmentView(ttk.Frame):
+class ShipmentView(ChangeWatcherMixin, ttk.Frame):
     def __init__(self, parent):
         super().__init__(parent)
         self.manager = PostgreSQLManager()
+        self.shipments = ShipmentService(self.manager)
 
         self.status_var = tk.StringVar(value="PENDING")
 
         self.create_widgets()
         self.load_data()
+        self.watch_changes()
 
     def create_widgets(self):
         top_bar = ttk.Frame(self)
@@ -48,6 +52,10 @@ class ShipmentView(ttk.Frame):
         self.prepare_button.pack(side='left', padx=5)
         self.complete_button.pack(side='left', padx=5)
 
+    def watched_tables(self):
+        # Список выдач показывает склад и курьера
+        return {'shipments', 'warehouses', 'employees'}
+
     def load_data(self):
         for item in self.tree.get_children():
             self.tree.delete(item)
@@ -93,32 +101,21 @@ class ShipmentView(ttk.Frame):
         if not hasattr(self, 'current_shipment_id'):
             return
 
-        # Получаем товары и количество из shipment_items
-        query = "SELECT item_id, quantity FROM shipment_items WHERE shipment_id = %s"
-        items = self.manager.execute_query(query, params=(self.current_shipment_id,), use_replica=True, fetch=True)
-
-        # Списываем товары со склада
+        # Списание и смена статуса — одним запросом в одной транзакции
         try:
-            for item in items:
-                update_query = """
-                UPDATE items SET quantity = quantity - %s
-                WHERE id = %s AND quantity >= %s
-                """
-                updated = self.manager.execute_query(update_query, params=(
-                    item['quantity'],
-                    item['item_id'],
-                    item['quantity']
-                ), fetch=False)
-
-                if updated != 1:
-                    raise Exception(f"Недостаточно товара ID {item['item_id']} на складе")
-
-            # Обновляем статус выдачи
-            query = "UPDATE shipments SET status = 'PREPARED' WHERE id = %s"
-            self.manager.execute_query(query, params=(self.current_shipment_id,))
-            self.load_data()
+            short = self.shipments.prepare(self.current_shipment_id)
         except Exception as e:
             messagebox.showerror("Ошибка", f"Не удалось собрать выдачу: {e}")
+            return
+
+        if short:
+            details = "\n".join(
+                f"Товар ID {item['item_id']}: нужно {item['requested']}, на складе {item['available']}"
+                for item in short
+            )
+            messagebox.showerror("Ошибка", f"Недостаточно товаров на складе:\n{details}")
+            return
+        self.load_data()
 
     def complete_shipment(self):
         if not hasattr(self, 'current_shipment_id'):
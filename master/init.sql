@@ -63,6 +63,13 @@ CREATE INDEX idx_shipments_status ON shipments(status);
 CREATE INDEX idx_shipments_warehouse ON shipments(warehouse_id);
 CREATE INDEX idx_shipments_courier ON shipments(courier_id);
 
+-- Heartbeat: мастер периодически пишет отметку времени, реплики читают её
+-- и по разнице с текущим временем определяют своё отставание
+CREATE TABLE replication_heartbeat (
+    id INTEGER PRIMARY KEY,
+    written_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
 -- Создаем пользователя для репликации
 CREATE USER repl_user WITH REPLICATION LOGIN PASSWORD 'repl_password';
 CREATE PUBLICATION my_publication FOR ALL TABLES;
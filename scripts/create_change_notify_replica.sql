@@ -0,0 +1,55 @@
+-- Триггеры уведомлений об изменениях для уже развёрнутой реплики
+-- (в новых базах они создаются в init.sql). Выполнять через psql:
+--   psql -U admin -d test_db -f /scripts/create_change_notify_replica.sql
+-- Уведомления об изменениях (LISTEN table_changes): клиенты сбрасывают кэш
+-- и обновляют открытые окна. Payload — имя изменённой таблицы.
+-- Применение логической репликации вызывает только строковые триггеры,
+-- и только включённые как ALWAYS; одинаковые уведомления в транзакции схлопываются
+CREATE FUNCTION notify_table_change() RETURNS trigger AS $$
+BEGIN
+    PERFORM pg_notify('table_changes', TG_TABLE_NAME);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER item_categories_notify AFTER INSERT OR UPDATE OR DELETE ON item_categories
+    FOR EACH ROW EXECUTE FUNCTION notify_table_change();
+CREATE TRIGGER item_categories_notify_truncate AFTER TRUNCATE ON item_categories
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change();
+ALTER TABLE item_categories ENABLE ALWAYS TRIGGER item_categories_notify;
+ALTER TABLE item_categories ENABLE ALWAYS TRIGGER item_categories_notify_truncate;
+
+CREATE TRIGGER warehouses_notify AFTER INSERT OR UPDATE OR DELETE ON warehouses
+    FOR EACH ROW EXECUTE FUNCTION notify_table_change();
+CREATE TRIGGER warehouses_notify_truncate AFTER TRUNCATE ON warehouses
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change();
+ALTER TABLE warehouses ENABLE ALWAYS TRIGGER warehouses_notify;
+ALTER TABLE warehouses ENABLE ALWAYS TRIGGER warehouses_notify_truncate;
+
+CREATE TRIGGER items_notify AFTER INSERT OR UPDATE OR DELETE ON items
+    FOR EACH ROW EXECUTE FUNCTION notify_table_change();
+CREATE TRIGGER items_notify_truncate AFTER TRUNCATE ON items
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change();
+ALTER TABLE items ENABLE ALWAYS TRIGGER items_notify;
+ALTER TABLE items ENABLE ALWAYS TRIGGER items_notify_truncate;
+
+CREATE TRIGGER employees_notify AFTER INSERT OR UPDATE OR DELETE ON employees
+    FOR EACH ROW EXECUTE FUNCTION notify_table_change();
+CREATE TRIGGER employees_notify_truncate AFTER TRUNCATE ON employees
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change();
+ALTER TABLE employees ENABLE ALWAYS TRIGGER employees_notify;
+ALTER TABLE employees ENABLE ALWAYS TRIGGER employees_notify_truncate;
+
+CREATE TRIGGER shipments_notify AFTER INSERT OR UPDATE OR DELETE ON shipments
+    FOR EACH ROW EXECUTE FUNCTION notify_table_change();
+CREATE TRIGGER shipments_notify_truncate AFTER TRUNCATE ON shipments
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change();
+ALTER TABLE shipments ENABLE ALWAYS TRIGGER shipments_notify;
+ALTER TABLE shipments ENABLE ALWAYS TRIGGER shipments_notify_truncate;
+
+CREATE TRIGGER shipment_items_notify AFTER INSERT OR UPDATE OR DELETE ON shipment_items
+    FOR EACH ROW EXECUTE FUNCTION notify_table_change();
+CREATE TRIGGER shipment_items_notify_truncate AFTER TRUNCATE ON shipment_items
+    FOR EACH STATEMENT EXECUTE FUNCTION notify_table_change();
+ALTER TABLE shipment_items ENABLE ALWAYS TRIGGER shipment_items_notify;
+ALTER TABLE shipment_items ENABLE ALWAYS TRIGGER shipment_items_notify_truncate;
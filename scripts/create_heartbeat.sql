@@ -0,0 +1,7 @@
+-- Таблица heartbeat для уже развёрнутых баз (в новых она создаётся в init.sql).
+-- Выполнить на мастере и на каждой реплике, затем на реплике:
+--   ALTER SUBSCRIPTION my_subscription REFRESH PUBLICATION
+CREATE TABLE IF NOT EXISTS replication_heartbeat (
+    id INTEGER PRIMARY KEY,
+    written_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
@@ -0,0 +1,281 @@
+import argparse
+import io
+import math
+import multiprocessing
+import random
+import time
+from array import array
+from datetime import datetime, timedelta
+
+import psycopg2
+
+from populate import DB_CONFIG, copy_line, defer_indexes, restore_indexes
+
+# Генерация истории выдач за несколько месяцев поверх данных populate.py:
+#   python generate_shipments.py --months 6 --rate 20 --workers 8
+#
+# Модель поступления: число выдач склада за день — пуассоновское со средним
+# rate * (ёмкость склада / 3000) * коэффициент дня недели * рост (growth в месяц).
+# Время выдачи — в часы работы склада с пиками в обед и вечером.
+# Жизненный цикл: сборка через ~PREPARE_MEAN_HOURS, завершение курьером своего склада
+# через ~DELIVERY_MEAN_HOURS; доля stuck выдач так и остаётся в PENDING.
+# Состав — 1..MAX_BASKET разных товаров склада, популярные товары встречаются чаще.
+# Остатки товаров (items.quantity) не списываются: история уже отражена в текущих остатках.
+
+CHUNK_SHIPMENTS = 50_000
+MAX_BASKET = 10
+PREPARE_MEAN_HOURS = 3.0
+DELIVERY_MEAN_HOURS = 8.0
+# Чем больше, тем сильнее спрос смещён к первым товарам склада
+POPULARITY_SKEW = 3.0
+REFERENCE_CAPACITY = 3000
+
+# Понедельник..воскресенье
+WEEKDAY_FACTORS = (1.0, 1.0, 1.05, 1.05, 1.2, 0.8, 0.5)
+# Часы работы как в DataGenerator.generate_working_hours: [открытие, закрытие)
+OPENING_HOURS = ((8, 20),) * 5 + ((10, 18), (10, 16))
+PEAK_HOURS = {11: 1.6, 12: 1.8, 13: 1.5, 17: 1.4, 18: 1.6}
+
+SHIPMENT_COLUMNS = ("id", "warehouse_id", "courier_id", "status", "created_at", "completed_at")
+SHIPMENT_ITEM_COLUMNS = ("shipment_id", "item_id", "quantity")
+
+
+def poisson(rng: random.Random, lam: float) -> int:
+    """Пуассоновская случайная величина (при большом lam — нормальное приближение)"""
+    if lam <= 0:
+        return 0
+    if lam > 30:
+        return max(0, round(rng.normalvariate(lam, math.sqrt(lam))))
+    limit, k, p = math.exp(-lam), 0, rng.random()
+    while p > limit:
+        k += 1
+        p *= rng.random()
+    return k
+
+
+def hour_weights(weekday: int) -> tuple[list[int], list[float]]:
+    """Часы работы склада в этот день недели и накопленные веса для выбора часа"""
+    opening, closing = OPENING_HOURS[weekday]
+    hours = list(range(opening, closing))
+    weights, total = [], 0.0
+    for hour in hours:
+        total += PEAK_HOURS.get(hour, 1.0)
+        weights.append(total)
+    return hours, weights
+
+
+def basket_size(rng: random.Random, mean: float, available: int) -> int:
+    """1 + геометрическое распределение со средним mean"""
+    extra = 0
+    if mean > 1:
+        extra = int(math.log(1.0 - rng.random()) / math.log(1.0 - 1.0 / mean))
+    return min(1 + extra, MAX_BASKET, available)
+
+
+class HistoryPlan:
+    """
+    План генерации: число выдач каждого склада по дням и первые id каждого дня.
+    Считается в основном процессе, чтобы id выдач росли вместе с created_at
+    независимо от того, какой процесс генерирует день.
+    """
+
+    def __init__(self, conn, args: argparse.Namespace):
+        self.seed = args.seed
+        self.end = datetime.combine(datetime.now().date(), datetime.min.time())
+        self.days = args.months * 30
+        self.start = self.end - timedelta(days=self.days)
+
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                SELECT w.id, w.capacity, COUNT(i.id)
+                FROM warehouses w LEFT JOIN items i ON i.warehouse_id = w.id
+                GROUP BY w.id ORDER BY w.id
+                """
+            )
+            warehouses = cur.fetchall()
+
+        # Склады без товаров выдач не получают
+        self.warehouses = [
+            (warehouse_id, (capacity or REFERENCE_CAPACITY) / REFERENCE_CAPACITY)
+            for warehouse_id, capacity, items in warehouses if items
+        ]
+
+        self.counts: list[list[int]] = []
+        for day in range(self.days):
+            rng = random.Random(f"{self.seed}:counts:{day}")
+            factor = (
+                args.rate
+                * WEEKDAY_FACTORS[(self.start + timedelta(days=day)).weekday()]
+                * (1 + args.growth) ** (day / 30)
+            )
+            self.counts.append([poisson(rng, factor * load) for _, load in self.warehouses])
+        self.total = sum(map(sum, self.counts))
+
+    def tasks(self, first_id: int) -> list[tuple[int, int, int]]:
+        """Пачки последовательных дней: (первый день, последний день + 1, первый id)"""
+        tasks, day, next_id = [], 0, first_id
+        while day < self.days:
+            start_day, start_id, size = day, next_id, 0
+            while day < self.days and (size == 0 or size + sum(self.counts[day]) <= CHUNK_SHIPMENTS):
+                size += sum(self.counts[day])
+                day += 1
+            tasks.append((start_day, day, start_id))
+            next_id += size
+        return tasks
+
+
+# Состояние процесса-генератора
+_worker: dict = {}
+
+
+def _init_worker(plan: HistoryPlan, args: argparse.Namespace) -> None:
+    conn = psycopg2.connect(**DB_CONFIG)
+    items: dict[int, array] = {}
+    couriers: dict[int, array] = {}
+    with conn.cursor() as cur:
+        cur.execute("SELECT warehouse_id, id FROM items WHERE warehouse_id IS NOT NULL ORDER BY id")
+        for warehouse_id, item_id in cur:
+            items.setdefault(warehouse_id, array('i')).append(item_id)
+        cur.execute(
+            "SELECT warehouse_id, id FROM employees WHERE position = 'courier' AND warehouse_id IS NOT NULL ORDER BY id"
+        )
+        for warehouse_id, courier_id in cur:
+            couriers.setdefault(warehouse_id, array('i')).append(courier_id)
+    conn.rollback()
+
+    _worker.update(conn=conn, plan=plan, args=args, items=items, couriers=couriers)
+
+
+def _generate_day(day: int, next_id: int, shipments: io.StringIO, lines: io.StringIO) -> dict[str, int]:
+    plan: HistoryPlan = _worker["plan"]
+    args = _worker["args"]
+    rng = random.Random(f"{plan.seed}:day:{day}")
+    date = plan.start + timedelta(days=day)
+    hours, weights = hour_weights(date.weekday())
+
+    generated = []
+    for (warehouse_id, _), count in zip(plan.warehouses, plan.counts[day]):
+        items = _worker["items"].get(warehouse_id, ())
+        couriers = _worker["couriers"].get(warehouse_id, ())
+        for _ in range(count):
+            created_at = date + timedelta(
+                hours=rng.choices(hours, cum_weights=weights)[0], seconds=rng.randrange(3600)
+            )
+            courier_id, completed_at = None, None
+            prepared_at = created_at + timedelta(hours=rng.expovariate(1 / PREPARE_MEAN_HOURS))
+            done_at = prepared_at + timedelta(hours=rng.expovariate(1 / DELIVERY_MEAN_HOURS))
+            if rng.random() < args.stuck or prepared_at > plan.end:
+                status = "PENDING"
+            elif not couriers or done_at > plan.end:
+                # Без курьера на складе выдачу нельзя завершить — как в ShipmentView
+                status = "PREPARED"
+            else:
+                status = "COMPLETED"
+                courier_id, completed_at = rng.choice(couriers), done_at.replace(microsecond=0)
+
+            basket = set()
+            size = basket_size(rng, args.basket_mean, len(items))
+            while len(basket) < size:
+                basket.add(items[int(len(items) * rng.random() ** POPULARITY_SKEW)])
+            lines_of_basket = [(item_id, min(1 + int(rng.expovariate(1.0)), 10)) for item_id in sorted(basket)]
+            generated.append((created_at, warehouse_id, courier_id, status, completed_at, lines_of_basket))
+
+    generated.sort(key=lambda shipment: shipment[0])
+    stats = {"shipments": len(generated), "shipment_items": 0}
+    for shipment_id, (created_at, warehouse_id, courier_id, status, completed_at, basket) in enumerate(
+        generated, start=next_id
+    ):
+        shipments.write(copy_line((shipment_id, warehouse_id, courier_id, status, created_at, completed_at)))
+        for item_id, quantity in basket:
+            lines.write(copy_line((shipment_id, item_id, quantity)))
+        stats["shipment_items"] += len(basket)
+        stats[status] = stats.get(status, 0) + 1
+    return stats
+
+
+def _load_days(task: tuple[int, int, int]) -> dict[str, int]:
+    first_day, last_day, next_id = task
+    plan: HistoryPlan = _worker["plan"]
+    shipments, lines = io.StringIO(), io.StringIO()
+    totals: dict[str, int] = {}
+    for day in range(first_day, last_day):
+        stats = _generate_day(day, next_id, shipments, lines)
+        next_id += sum(plan.counts[day])
+        for key, value in stats.items():
+            totals[key] = totals.get(key, 0) + value
+
+    conn = _worker["conn"]
+    shipments.seek(0)
+    lines.seek(0)
+    with conn.cursor() as cur:
+        cur.copy_expert(f"COPY shipments ({', '.join(SHIPMENT_COLUMNS)}) FROM STDIN", shipments)
+        cur.copy_expert(f"COPY shipment_items ({', '.join(SHIPMENT_ITEM_COLUMNS)}) FROM STDIN", lines)
+    conn.commit()
+    return totals
+
+
+def generate(args: argparse.Namespace) -> None:
+    started = time.time()
+    conn = psycopg2.connect(**DB_CONFIG)
+    cur = conn.cursor()
+
+    if args.truncate:
+        print("Очистка shipments и shipment_items")
+        cur.execute("TRUNCATE shipment_items, shipments RESTART IDENTITY")
+        conn.commit()
+
+    plan = HistoryPlan(conn, args)
+    if not plan.warehouses:
+        raise SystemExit("Нет складов с товарами — сначала запустите populate.py")
+    print(
+        f"История с {plan.start:%Y-%m-%d} по {plan.end - timedelta(days=1):%Y-%m-%d}: "
+        f"{plan.total} выдач на {len(plan.warehouses)} складах"
+    )
+
+    # Резервируем id: выдачи, созданные приложением во время загрузки, их не займут
+    cur.execute("SELECT nextval('shipments_id_seq')")
+    first_id = cur.fetchone()[0]
+    cur.execute("SELECT setval('shipments_id_seq', %s)", (first_id + max(plan.total, 1) - 1,))
+    conn.commit()
+
+    deferred = defer_indexes(conn, ["shipments", "shipment_items"]) if args.defer_indexes else []
+
+    totals: dict[str, int] = {}
+    with multiprocessing.Pool(args.workers, _init_worker, (plan, args)) as pool:
+        for stats in pool.imap_unordered(_load_days, plan.tasks(first_id)):
+            for key, value in stats.items():
+                totals[key] = totals.get(key, 0) + value
+            print(f"\rshipments: {totals['shipments']}/{plan.total}", end="", flush=True)
+    print()
+
+    if deferred:
+        restore_indexes(conn, deferred)
+    conn.autocommit = True
+    cur.execute("ANALYZE shipments, shipment_items")
+
+    mix = ", ".join(
+        f"{status} — {totals.get(status, 0) / max(totals['shipments'], 1):.1%}"
+        for status in ("PENDING", "PREPARED", "COMPLETED")
+    )
+    print(f"Позиций: {totals.get('shipment_items', 0)}; статусы: {mix}")
+    print(f"Генерация завершена за {time.time() - started:.1f} с")
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Генерация истории выдач")
+    parser.add_argument("--months", type=int, default=6, help="глубина истории в месяцах (по 30 дней)")
+    parser.add_argument("--rate", type=float, default=20.0, help="среднее число выдач склада в будний день")
+    parser.add_argument("--growth", type=float, default=0.03, help="рост потока выдач за месяц (0.03 = 3%%)")
+    parser.add_argument("--stuck", type=float, default=0.01, help="доля выдач, так и не собранных")
+    parser.add_argument("--basket-mean", type=float, default=2.5, help="среднее число товаров в выдаче")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="число процессов")
+    parser.add_argument("--seed", type=int, default=0, help="seed генерации (история воспроизводима)")
+    parser.add_argument("--truncate", action="store_true", help="удалить существующие выдачи перед генерацией")
+    parser.add_argument("--defer-indexes", action="store_true",
+                        help="удалить индексы и ограничения на время загрузки и создать их после")
+    return parser.parse_args()
+
+
+if __name__ == "__main__":
+    generate(parse_args())
@@ -1,8 +1,19 @@
+import argparse
+import io
+import json
+import multiprocessing
+import os
+import random
+import sys
+import time
+from typing import Callable, Iterator, List, Dict
+
 import psycopg2
 from faker import Faker
-import random
-import json
-from typing import List, Dict
+
+# Кодирование строк COPY общее с клиентом (client/copy_stream.py)
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "client"))
+from copy_stream import copy_line  # noqa: E402
 
 # Настройки генерации
 NUM_WAREHOUSES = 5
@@ -11,6 +22,19 @@ NUM_EMPLOYEES = 100
 NUM_ITEMS = 1000
 NUM_COURIERS = 10  # количество курьеров
 
+DB_CONFIG = {
+    "host": "localhost",
+    "port": "5432",
+    "user": "admin",
+    "password": "admin123",
+    "dbname": "test_db",
+}
+
+# Режим --scale: объёмы умножаются на масштаб (--scale 1 повторяет объёмы выше),
+# данные грузятся пачками по CHUNK_ROWS строк через COPY из нескольких процессов
+CHUNK_ROWS = 50_000
+VALUE_POOL_SIZE = 2_000
+
 # Реалистичные названия товаров по категориям
 CATEGORY_PRODUCTS = {
     "Электроника": [
@@ -58,13 +82,7 @@ CATEGORY_PRODUCTS = {
 class DataGenerator:
     def __init__(self):
         self.fake = Faker('ru_RU')  # Русские данные
-        self.conn = psycopg2.connect(
-            host="localhost",
-            port="5432",
-            user="admin",
-            password="admin123",
-            dbname="test_db"
-        )
+        self.conn = psycopg2.connect(**DB_CONFIG)
         self.cur = self.conn.cursor()
         
         # Кэш для хранения ID созданных записей
@@ -73,7 +91,8 @@ class DataGenerator:
         self.employee_ids: List[int] = []
         self.courier_ids: List[int] = []
 
-    def generate_working_hours(self) -> Dict:
+    @staticmethod
+    def generate_working_hours() -> Dict:
         """Генерация JSON с рабочими часами склада"""
         return {
             "monday": {"open": "08:00", "close": "20:00"},
@@ -228,6 +247,280 @@ class DataGenerator:
 
 
 
+# ---------------------------------------------------------------------------
+# Массовая загрузка: python populate.py --scale N [--workers W] [--seed S] [--defer-indexes]
+# ---------------------------------------------------------------------------
+
+# Таблицы в порядке загрузки и колонки COPY
+COPY_COLUMNS = {
+    "item_categories": ("id", "name", "description"),
+    "warehouses": ("id", "name", "address", "contact_phone", "working_hours", "capacity", "is_active"),
+    "employees": ("id", "first_name", "last_name", "email", "phone", "position", "warehouse_id"),
+    "items": ("id", "name", "description", "barcode", "category_id", "weight", "warehouse_id", "quantity"),
+}
+
+# Таблицы, которые очищаются перед загрузкой (зависимые — первыми)
+TRUNCATE_TABLES = ("shipment_items", "shipments", "items", "employees", "warehouses", "item_categories")
+
+EMPLOYEE_POSITIONS = [
+    "Менеджер", "Кладовщик", "Грузчик", "Бухгалтер",
+    "Администратор", "Логист", "Охранник"
+]
+
+def ean13(number: int) -> str:
+    """Уникальный штрихкод EAN-13 из номера строки (префикс 2 — внутренняя нумерация)"""
+    body = f"2{number:011d}"
+    total = sum(int(digit) * (3 if i % 2 else 1) for i, digit in enumerate(body))
+    return body + str((10 - total % 10) % 10)
+
+
+class ValuePools:
+    """
+    Заранее сгенерированные Faker значения. Строки собираются случайным выбором
+    из пулов, поэтому Faker не вызывается на каждую строку. Пулы строятся
+    из фиксированного seed и одинаковы во всех процессах.
+    """
+
+    def __init__(self, seed: int, size: int = VALUE_POOL_SIZE):
+        fake = Faker('ru_RU')
+        fake.seed_instance(seed)
+        self.first_names = [fake.first_name() for _ in range(size)]
+        self.last_names = [fake.last_name() for _ in range(size)]
+        self.user_names = [fake.user_name() for _ in range(size)]
+        self.email_domains = sorted({fake.free_email_domain() for _ in range(50)})
+        self.phones = [fake.phone_number()[:20] for _ in range(size)]
+        self.streets = [fake.street_name() for _ in range(size)]
+        self.addresses = [fake.address() for _ in range(size)]
+        self.sentences = [fake.sentence() for _ in range(size)]
+        self.texts = [fake.text(max_nb_chars=200) for _ in range(size)]
+
+
+def scale_sizes(scale: int) -> dict[str, int]:
+    """Число строк в таблицах для масштаба scale"""
+    return {
+        "item_categories": min(NUM_CATEGORIES, len(CATEGORY_PRODUCTS)),
+        "warehouses": NUM_WAREHOUSES * scale,
+        "employees": NUM_EMPLOYEES * scale,
+        "couriers": NUM_COURIERS * scale,
+        "items": NUM_ITEMS * scale,
+    }
+
+
+def category_rows(pools: ValuePools, rng: random.Random, start: int, end: int, sizes: dict) -> Iterator[tuple]:
+    categories = list(CATEGORY_PRODUCTS)
+    for i in range(start, end):
+        yield i + 1, categories[i], rng.choice(pools.sentences)
+
+
+def warehouse_rows(pools: ValuePools, rng: random.Random, start: int, end: int, sizes: dict) -> Iterator[tuple]:
+    working_hours = DataGenerator.generate_working_hours()
+    for i in range(start, end):
+        yield (
+            i + 1,
+            f"Склад {rng.choice(pools.streets)}",
+            rng.choice(pools.addresses),
+            rng.choice(pools.phones),
+            working_hours,
+            rng.randint(1000, 5000),
+            rng.random() < 0.5,
+        )
+
+
+def employee_rows(pools: ValuePools, rng: random.Random, start: int, end: int, sizes: dict) -> Iterator[tuple]:
+    # Курьеры — последние NUM_COURIERS * scale сотрудников, как в DataGenerator
+    first_courier = sizes["employees"] - sizes["couriers"]
+    for i in range(start, end):
+        yield (
+            i + 1,
+            rng.choice(pools.first_names),
+            rng.choice(pools.last_names),
+            f"{rng.choice(pools.user_names)}.{i + 1}@{rng.choice(pools.email_domains)}",
+            rng.choice(pools.phones),
+            "courier" if i >= first_courier else rng.choice(EMPLOYEE_POSITIONS),
+            rng.randint(1, sizes["warehouses"]),
+        )
+
+
+def item_rows(pools: ValuePools, rng: random.Random, start: int, end: int, sizes: dict) -> Iterator[tuple]:
+    products = list(CATEGORY_PRODUCTS.values())[:sizes["item_categories"]]
+    for i in range(start, end):
+        category = rng.randrange(len(products))
+        yield (
+            i + 1,
+            rng.choice(products[category]),
+            rng.choice(pools.texts),
+            ean13(i + 1),
+            category + 1,
+            round(rng.uniform(0.1, 50.0), 2),
+            rng.randint(1, sizes["warehouses"]),
+            rng.randint(10, 100),
+        )
+
+
+ROW_GENERATORS: dict[str, Callable[..., Iterator[tuple]]] = {
+    "item_categories": category_rows,
+    "warehouses": warehouse_rows,
+    "employees": employee_rows,
+    "items": item_rows,
+}
+
+
+# Состояние процесса-загрузчика: соединение и пулы создаются один раз на процесс
+_worker: dict = {}
+
+
+def _init_worker(seed: int, sizes: dict) -> None:
+    _worker["seed"] = seed
+    _worker["sizes"] = sizes
+    _worker["pools"] = ValuePools(seed)
+    _worker["conn"] = psycopg2.connect(**DB_CONFIG)
+
+
+def _load_chunk(task: tuple[str, int, int]) -> tuple[str, int]:
+    """
+    Генерирует и загружает через COPY строки [start, end) таблицы. Случайность задаётся
+    seed, таблицей и началом пачки, поэтому данные не зависят от числа процессов.
+    """
+    table, start, end = task
+    rng = random.Random(f"{_worker['seed']}:{table}:{start}")
+    buffer = io.StringIO()
+    for row in ROW_GENERATORS[table](_worker["pools"], rng, start, end, _worker["sizes"]):
+        buffer.write(copy_line(row))
+    buffer.seek(0)
+
+    conn = _worker["conn"]
+    with conn.cursor() as cur:
+        cur.copy_expert(f"COPY {table} ({', '.join(COPY_COLUMNS[table])}) FROM STDIN", buffer)
+    conn.commit()
+    return table, end - start
+
+
+def defer_indexes(conn, tables: list[str]) -> list[str]:
+    """
+    Удаляет внешние ключи, ограничения UNIQUE и обычные индексы таблиц на время загрузки
+    (первичные ключи остаются: они нужны логической репликации).
+    Возвращает команды для их восстановления.
+    """
+    with conn.cursor() as cur:
+        cur.execute(
+            """
+            SELECT conrelid::regclass::text, conname, pg_get_constraintdef(oid), contype
+            FROM pg_constraint
+            WHERE conrelid = ANY(%s::regclass[]) AND contype IN ('f', 'u')
+            ORDER BY contype = 'f' DESC
+            """,
+            (tables,)
+        )
+        constraints = cur.fetchall()
+        cur.execute(
+            """
+            SELECT i.indexrelid::regclass::text, pg_get_indexdef(i.indexrelid)
+            FROM pg_index i
+            WHERE i.indrelid = ANY(%s::regclass[])
+              AND NOT EXISTS (SELECT 1 FROM pg_constraint c WHERE c.conindid = i.indexrelid)
+            """,
+            (tables,)
+        )
+        indexes = cur.fetchall()
+
+        restore = []
+        for table, name, _, _ in constraints:
+            cur.execute(f'ALTER TABLE {table} DROP CONSTRAINT "{name}"')
+        for name, definition in indexes:
+            cur.execute(f"DROP INDEX {name}")
+            restore.append(definition)
+        # Сначала UNIQUE (на них могут ссылаться внешние ключи), затем внешние ключи
+        for table, name, definition, contype in sorted(constraints, key=lambda c: c[3] == 'f'):
+            restore.append(f'ALTER TABLE {table} ADD CONSTRAINT "{name}" {definition}')
+    conn.commit()
+    print(f"Отложено ограничений и индексов: {len(restore)}")
+    return restore
+
+
+def restore_indexes(conn, statements: list[str]) -> None:
+    print("Восстановление ограничений и индексов...")
+    with conn.cursor() as cur:
+        for statement in statements:
+            cur.execute(statement)
+    conn.commit()
+
+
+class ScaleLoader:
+    """
+    Загрузка данных заданного масштаба, как pgbench -i: таблицы очищаются,
+    строки генерируются пачками в нескольких процессах и грузятся через COPY.
+    Идентификаторы задаются явно, последовательности выставляются после загрузки.
+    """
+
+    def __init__(self, scale: int, workers: int, seed: int = 0, defer_indexes: bool = False):
+        self.scale = scale
+        self.workers = workers
+        self.seed = seed
+        self.defer_indexes = defer_indexes
+        self.sizes = scale_sizes(scale)
+        self.conn = psycopg2.connect(**DB_CONFIG)
+        self.cur = self.conn.cursor()
+
+    def run(self) -> None:
+        started = time.time()
+        print(f"Масштаб {self.scale}: " + ", ".join(
+            f"{table} — {self.sizes[table]}" for table in COPY_COLUMNS
+        ))
+        print(f"Очистка таблиц: {', '.join(TRUNCATE_TABLES)}")
+        self.cur.execute(f"TRUNCATE {', '.join(TRUNCATE_TABLES)} RESTART IDENTITY")
+        self.conn.commit()
+
+        deferred = defer_indexes(self.conn, list(COPY_COLUMNS)) if self.defer_indexes else []
+
+        with multiprocessing.Pool(self.workers, _init_worker, (self.seed, self.sizes)) as pool:
+            # Справочники грузятся до сотрудников и товаров, которые на них ссылаются
+            self.load(pool, ["item_categories", "warehouses"])
+            self.load(pool, ["employees", "items"])
+
+        if deferred:
+            restore_indexes(self.conn, deferred)
+        self.finish()
+        print(f"Загрузка завершена за {time.time() - started:.1f} с")
+
+    def load(self, pool: multiprocessing.Pool, tables: list[str]) -> None:
+        tasks = [
+            (table, start, min(start + CHUNK_ROWS, self.sizes[table]))
+            for table in tables
+            for start in range(0, self.sizes[table], CHUNK_ROWS)
+        ]
+        loaded = dict.fromkeys(tables, 0)
+        for table, count in pool.imap_unordered(_load_chunk, tasks):
+            loaded[table] += count
+            progress = ", ".join(f"{name}: {loaded[name]}/{self.sizes[name]}" for name in tables)
+            print(f"\r{progress}", end="", flush=True)
+        print()
+
+    def finish(self) -> None:
+        """Выставляет последовательности id после явно заданных идентификаторов и собирает статистику"""
+        for table in COPY_COLUMNS:
+            self.cur.execute(
+                f"SELECT setval(pg_get_serial_sequence('{table}', 'id'), GREATEST(MAX(id), 1)) FROM {table}"
+            )
+        self.conn.commit()
+        self.conn.autocommit = True
+        self.cur.execute(f"ANALYZE {', '.join(COPY_COLUMNS)}")
+        self.conn.autocommit = False
+
+
+def parse_args() -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Генерация тестовых данных")
+    parser.add_argument("--scale", type=int, help="масштаб данных (как у pgbench -i); без него — прежняя генерация")
+    parser.add_argument("--workers", type=int, default=multiprocessing.cpu_count(), help="число процессов загрузки")
+    parser.add_argument("--seed", type=int, default=0, help="seed генерации (данные воспроизводимы)")
+    parser.add_argument("--defer-indexes", action="store_true",
+                        help="удалить индексы и ограничения на время загрузки и создать их после")
+    return parser.parse_args()
+
+
 if __name__ == "__main__":
-    generator = DataGenerator()
-    generator.generate_all_data()
+    args = parse_args()
+    if args.scale:
+        ScaleLoader(args.scale, args.workers, args.seed, args.defer_indexes).run()
+    else:
+        generator = DataGenerator()
+        generator.generate_all_data()